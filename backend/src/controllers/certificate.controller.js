@@ -124,6 +124,8 @@ export const uploadCertificate = async (req, res, next) => {
 
     // Call ML service for fraud detection (async, non-blocking)
     const ML_SERVICE_URL = process.env.ML_SERVICE_URL || 'http://ml-service:8000';
+    // Give up after this long; the ML service drops work queued past the same deadline
+    const ML_SERVICE_TIMEOUT_MS = parseInt(process.env.ML_SERVICE_TIMEOUT_MS || '5000', 10);
     
     try {
       // Generate sample features for fraud detection (replace with actual feature extraction)
@@ -142,11 +144,16 @@ export const uploadCertificate = async (req, res, next) => {
 
       const fraudResponse = await fetch(`${ML_SERVICE_URL}/fraud-detection`, {
         method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
+        headers: {
+          'Content-Type': 'application/json',
+          'X-Request-Priority': 'interactive',
+          'X-Request-Deadline-Ms': String(ML_SERVICE_TIMEOUT_MS)
+        },
         body: JSON.stringify({ 
           features,
           certificate_id: certificate.id.toString()
-        })
+        }),
+        signal: AbortSignal.timeout(ML_SERVICE_TIMEOUT_MS)
       });
 
       if (fraudResponse.ok) {
@@ -1,13 +1,43 @@
-from fastapi import FastAPI, HTTPException, UploadFile, File
+from fastapi import (
+    FastAPI, HTTPException, UploadFile, File, Depends, Header, BackgroundTasks, Response, WebSocket,
+)
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from fastapi.routing import APIRoute
 from pydantic import BaseModel
 from typing import Optional, List
-import joblib
+from functools import partial
+from itertools import islice
+import asyncio
+import hmac
+import io
+import json
+import os
 import numpy as np
 import pandas as pd
 from pathlib import Path
 import logging
 
+from batching import MicroBatcher
+from body_limit import BodyLimitMiddleware
+from codec import (
+    CONTENT_TYPES, FRAME, MSGPACK, CodecError, UnsupportedEncoding, decode_frame, decode_msgpack, encode_frame,
+    encode_msgpack, media_format, msgpack_matrix, response_format,
+)
+from drift import REFERENCE_FILE, DriftMonitor, load_references
+from forest_engine import DispatchForest, FlatForest, as_flat_forest
+from features import ImageTooLarge, crop_glyphs, extract_features, feature_set_for, open_image, segment_glyphs
+from inference_pool import (
+    OUTCOMES, DeadlineExceeded, InferencePool, PoolSaturated, SchedulingMiddleware, current_scheduling,
+    parse_scheduling, reset_scheduling, set_scheduling,
+)
+from jobs import FINISHED_STATES, JobRunner, load_job_store, progress
+from metrics import SIZE_BUCKETS, Metrics, MetricsMiddleware, SamplingProfiler
+from model_registry import ModelNotAvailable, ModelVersions, ReloadInProgress
+from prediction_cache import PredictionCache, load_backend
+from shadow import ShadowEvaluator
+from streaming import ScoringStream
+
 # Setup logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -27,13 +57,259 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Global models storage
-models = {}
+class BinaryBodyRoute(APIRoute):
+    """
+    Route that hands frame / msgpack request bodies (see codec.py) to the
+    binary handler registered for its path in BINARY_HANDLERS; JSON and
+    every other request go through FastAPI's normal body parsing.
+    """
+
+    def get_route_handler(self):
+        json_handler = super().get_route_handler()
+
+        async def route_handler(request):
+            handler = BINARY_HANDLERS.get(self.path)
+            if handler is not None:
+                fmt = media_format(request.headers.get("content-type"))
+                if fmt in (FRAME, MSGPACK):
+                    return await handler(request, fmt)
+            return await json_handler(request)
+
+        return route_handler
+
+# Must be set before the routes below are declared
+app.router.route_class = BinaryBodyRoute
+
+# Model registry: artifacts are loaded lazily on first use. Models listed in
+# ML_WARM_MODELS (comma separated, or "all") are loaded at startup instead.
+# Each release lives in models/<version>/ (artifacts directly in models/ are
+# served as version 1.0.0); see /admin/models/* for reload and rollback.
+MODEL_ARTIFACTS = {
+    'fraud_classifier': 'fraud_classifier.pkl',
+    'fraud_scaler': 'fraud_scaler.pkl',
+    'ocr_classifier': 'ocr_classifier.pkl',
+    'ocr_scaler': 'ocr_scaler.pkl',
+    'ocr_label_encoder': 'ocr_label_encoder.pkl',
+    'coursera_regressor': 'coursera_regressor.pkl',
+    'coursera_scaler': 'coursera_scaler.pkl',
+    'classifier': 'classifier.pkl',
+    'regressor': 'regressor.pkl',
+}
+# Compiled artifacts written by scripts/export_models.py; when present they
+# are served in place of the pickle, first match wins (disable with
+# ML_USE_COMPILED_MODELS=false). Single-feature forests collapse to a
+# breakpoint lookup table (.lookup.joblib).
+COMPILED_ARTIFACTS = {
+    'fraud_classifier': ['fraud_classifier.flat.joblib'],
+    'ocr_classifier': ['ocr_classifier.flat.joblib'],
+    'classifier': ['classifier.flat.joblib'],
+    'coursera_regressor': ['coursera_regressor.lookup.joblib', 'coursera_regressor.flat.joblib'],
+    'regressor': ['regressor.lookup.joblib', 'regressor.flat.joblib'],
+}
+MODELS_DIR = Path(os.getenv("ML_MODELS_DIR", "models"))
+MODELS_MMAP_MODE = os.getenv("ML_MODELS_MMAP_MODE", "r") or None
+USE_COMPILED_MODELS = os.getenv("ML_USE_COMPILED_MODELS", "true").lower() in ("1", "true", "yes")
+# Compiled forests only serve calls up to this many rows; larger batches go to
+# the sklearn model, which is faster there (bench_flat_forest.py crossover is
+# ~150-500 rows depending on the model). 0 serves every call with the compiled one.
+FLAT_FOREST_MAX_ROWS = int(os.getenv("ML_FLAT_FOREST_MAX_ROWS", "128"))
+WARM_MODELS = os.getenv("ML_WARM_MODELS", "")
+# Poll the models directory for new versions / retrained files (0 = off)
+MODEL_WATCH_SECONDS = float(os.getenv("ML_MODEL_WATCH_SECONDS", "0"))
+# Required in the X-Admin-Token header of admin endpoints when set
+ADMIN_TOKEN = os.getenv("ML_ADMIN_TOKEN", "")
+def dispatch_by_rows(model, load_default):
+    """Registry compose hook: pair a compiled FlatForest with its sklearn original"""
+    if not isinstance(model, FlatForest) or FLAT_FOREST_MAX_ROWS <= 0:
+        return model
+    original = load_default()
+    return model if original is None else DispatchForest(model, original, FLAT_FOREST_MAX_ROWS)
+
+model_versions = ModelVersions(
+    MODELS_DIR,
+    MODEL_ARTIFACTS,
+    mmap_mode=MODELS_MMAP_MODE,
+    alternatives=COMPILED_ARTIFACTS if USE_COMPILED_MODELS else None,
+    compose=dispatch_by_rows,
+)
+# Active registry; replaced as a whole on a version swap
+models = model_versions.active
+
+# Fraud scoring settings
+FRAUD_THRESHOLD = 70.0
+FRAUD_BATCH_MAX_SIZE = int(os.getenv("ML_FRAUD_BATCH_MAX_SIZE", "10000"))
+# Early-exit forest inference (FlatForest.predict_proba_early_exit): requests
+# with early_exit (default ML_FRAUD_EARLY_EXIT) stop evaluating trees once the
+# threshold decision is settled. Without ML_FRAUD_EARLY_EXIT_DELTA the exact
+# bound is used and decisions always match full evaluation; scores of rows
+# that stop early are estimates. Measure with scripts/evaluate_early_exit.py.
+FRAUD_EARLY_EXIT = os.getenv("ML_FRAUD_EARLY_EXIT", "false").lower() in ("1", "true", "yes")
+FRAUD_EARLY_EXIT_CHUNK_TREES = int(os.getenv("ML_FRAUD_EARLY_EXIT_CHUNK_TREES", "10"))
+FRAUD_EARLY_EXIT_DELTA = float(os.getenv("ML_FRAUD_EARLY_EXIT_DELTA", "0")) or None
+
+# Dynamic micro-batching (opt-in), configured per model:
+#   ML_BATCH_<MODEL>_MAX_SIZE and ML_BATCH_<MODEL>_MAX_WAIT_MS
+BATCHING_ENABLED = os.getenv("ML_BATCHING_ENABLED", "false").lower() in ("1", "true", "yes")
+batchers = {}
+
+# Streaming scoring over WebSocket (/ws/score, see streaming.py). Pipelined
+# stream requests are always micro-batched: through the shared queues above
+# when batching is enabled, otherwise through stream-only queues with the
+# same ML_BATCH_* settings, so they do not hit the pool one row at a time.
+STREAM_MAX_IN_FLIGHT = int(os.getenv("ML_STREAM_MAX_IN_FLIGHT", "256"))
+stream_batchers = {}
+
+# Asynchronous bulk scoring jobs (/jobs, see jobs.py). ML_JOBS_BACKEND is
+# "sqlite" (ML_JOBS_DB, shared by pre-forked workers), "memory" or
+# "package.module:ClassName". Chunks only run while an inference worker is idle.
+JOBS_ENABLED = os.getenv("ML_JOBS_ENABLED", "true").lower() in ("1", "true", "yes")
+JOBS_BACKEND = os.getenv("ML_JOBS_BACKEND", "sqlite")
+JOBS_DB = os.getenv("ML_JOBS_DB", ".cache/jobs.sqlite3")
+JOBS_WORKERS = int(os.getenv("ML_JOBS_WORKERS", "1"))
+JOBS_CHUNK_SIZE = int(os.getenv("ML_JOBS_CHUNK_SIZE", "500"))
+JOBS_MAX_ROWS = int(os.getenv("ML_JOBS_MAX_ROWS", "1000000"))
+JOBS_MAX_UPLOAD_BYTES = int(os.getenv("ML_JOBS_MAX_UPLOAD_BYTES", str(256 * 1024 * 1024)))
+JOBS_TTL_SECONDS = float(os.getenv("ML_JOBS_TTL_SECONDS", "86400"))
+# A claimed chunk is only re-queued once its worker has died or this expires
+JOBS_LEASE_SECONDS = float(os.getenv("ML_JOBS_LEASE_SECONDS", "600"))
+job_runner = None
+
+# Worker pool for blocking inference (thread or process), bounded queue
+INFERENCE_EXECUTOR = os.getenv("ML_INFERENCE_EXECUTOR", "thread")
+INFERENCE_WORKERS = int(os.getenv("ML_INFERENCE_WORKERS", "0")) or None
+INFERENCE_MAX_QUEUE = int(os.getenv("ML_INFERENCE_MAX_QUEUE", "64"))
+INFERENCE_RETRY_AFTER = int(os.getenv("ML_INFERENCE_RETRY_AFTER", "1"))
+# Waiting calls beyond which "batch" priority work is shed (default: half of the queue).
+# Clients set the priority and a time budget with the X-Request-Priority and
+# X-Request-Deadline-Ms headers; expired work is dropped before it runs.
+INFERENCE_LOW_PRIORITY_QUEUE = os.getenv("ML_INFERENCE_LOW_PRIORITY_QUEUE")
+inference_pool = None
+
+# Prediction cache for repeated verification of the same certificate.
+# ML_CACHE_BACKEND is "local" or "package.module:ClassName" for a shared store.
+CACHE_ENABLED = os.getenv("ML_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+CACHE_BACKEND = os.getenv("ML_CACHE_BACKEND", "local")
+CACHE_MAX_BYTES = int(os.getenv("ML_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+CACHE_TTL_SECONDS = float(os.getenv("ML_CACHE_TTL_SECONDS", "300"))
+# Models behind each cached endpoint; reloading any of them invalidates its entries
+CACHE_DEPENDENCIES = {
+    'fraud': ['fraud_scaler', 'fraud_classifier'],
+    'fraud_early_exit': ['fraud_scaler', 'fraud_classifier'],
+    'ocr': ['ocr_scaler', 'ocr_classifier', 'ocr_label_encoder'],
+    'classify': ['classifier'],
+}
+prediction_cache = None
+
+# Shadow / canary evaluation of a candidate fraud model version (off unless
+# ML_SHADOW_VERSION names a version in the models directory)
+SHADOW_VERSION = os.getenv("ML_SHADOW_VERSION", "")
+SHADOW_SAMPLE_RATE = float(os.getenv("ML_SHADOW_SAMPLE_RATE", "1.0"))
+SHADOW_MAX_QUEUE = int(os.getenv("ML_SHADOW_MAX_QUEUE", "256"))
+SHADOW_WORKERS = int(os.getenv("ML_SHADOW_WORKERS", "1"))
+CANARY_PERCENT = float(os.getenv("ML_CANARY_PERCENT", "0"))
+shadow = None
+
+# Feature-drift monitoring of live fraud / OCR inputs against the reference
+# profiles scripts/train_models.py saves next to the models (drift.py)
+DRIFT_ENABLED = os.getenv("ML_DRIFT_ENABLED", "true").lower() in ("1", "true", "yes")
+DRIFT_SAMPLE_RATE = float(os.getenv("ML_DRIFT_SAMPLE_RATE", "1.0"))
+DRIFT_WINDOW_ROWS = int(os.getenv("ML_DRIFT_WINDOW_ROWS", "50000"))
+DRIFT_SKETCH_K = int(os.getenv("ML_DRIFT_SKETCH_K", "200"))
+DRIFT_FLUSH_SECONDS = float(os.getenv("ML_DRIFT_FLUSH_SECONDS", "1.0"))
+DRIFT_MAX_PENDING = int(os.getenv("ML_DRIFT_MAX_PENDING", "10000"))
+DRIFT_MIN_ROWS = int(os.getenv("ML_DRIFT_MIN_ROWS", "1000"))
+DRIFT_PSI_WARNING = float(os.getenv("ML_DRIFT_PSI_WARNING", "0.1"))
+DRIFT_PSI_ALERT = float(os.getenv("ML_DRIFT_PSI_ALERT", "0.25"))
+DRIFT_KS_ALERT = float(os.getenv("ML_DRIFT_KS_ALERT", "0.1"))
+# Scoring model -> monitored feature space (early-exit fraud sees the same inputs)
+DRIFT_MODELS = {'fraud': 'fraud', 'fraud_early_exit': 'fraud', 'ocr': 'ocr'}
+drift_monitor = None
+
+# Metrics: Prometheus text format at /metrics, switchable at runtime via
+# /metrics/config. The sampling profiler is off unless ML_PROFILER_ENABLED.
+METRICS_ENABLED = os.getenv("ML_METRICS_ENABLED", "true").lower() in ("1", "true", "yes")
+PROFILER_ENABLED = os.getenv("ML_PROFILER_ENABLED", "false").lower() in ("1", "true", "yes")
+PROFILER_INTERVAL_MS = float(os.getenv("ML_PROFILER_INTERVAL_MS", "10"))
+metrics = Metrics(enabled=METRICS_ENABLED)
+REQUEST_SECONDS = metrics.histogram(
+    "ml_request_duration_seconds", "HTTP request latency by route", ["endpoint", "method", "status"]
+)
+REQUESTS_IN_FLIGHT = metrics.gauge("ml_requests_in_flight", "HTTP requests currently being handled")
+STAGE_SECONDS = metrics.histogram(
+    "ml_stage_duration_seconds", "Inference stage latency (parse, scale, predict, decode, ...)", ["model", "stage"]
+)
+BATCH_ROWS = metrics.histogram("ml_batch_rows", "Rows per inference call", ["model"], buckets=SIZE_BUCKETS)
+TREES_EVALUATED = metrics.histogram(
+    "ml_trees_evaluated", "Mean trees evaluated per row in early-exit inference calls", ["model"],
+    buckets=(1, 5, 10, 20, 30, 40, 50, 60, 70, 80, 90, 100, 200, 500),
+)
+ERRORS = metrics.counter("ml_errors", "Failed requests by endpoint and exception type", ["endpoint", "type"])
+MODEL_LOAD_SECONDS = metrics.histogram(
+    "ml_model_load_duration_seconds", "Model artifact load time", ["model"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0),
+)
+MODELS_LOADED = metrics.gauge("ml_models_loaded", "Models currently loaded")
+POOL_PENDING = metrics.gauge("ml_inference_pool_pending", "Inference tasks running or queued", ["state"])
+POOL_REJECTED = metrics.gauge("ml_inference_pool_rejected", "Inference tasks rejected since startup")
+CACHE_LOOKUPS = metrics.gauge("ml_cache_lookups", "Prediction cache lookups since startup", ["result"])
+STREAM_CONNECTIONS = metrics.gauge("ml_stream_connections", "Open /ws/score connections")
+STREAM_REQUESTS = metrics.counter("ml_stream_requests", "Streamed scoring requests by model and status", ["model", "status"])
+DRIFT_PSI = metrics.gauge("ml_feature_drift_psi", "Largest per-feature PSI of recent inputs vs training", ["model"])
+DRIFT_KS = metrics.gauge("ml_feature_drift_ks", "Largest per-feature KS distance of recent inputs vs training", ["model"])
+profiler = SamplingProfiler(interval=PROFILER_INTERVAL_MS / 1000)
+SCHEDULED_REQUESTS = metrics.counter(
+    "ml_scheduled_requests",
+    "HTTP requests by priority and outcome (completed, late, expired, shed, failed)",
+    ["priority", "outcome"],
+)
+INFERENCE_CALLS = metrics.gauge(
+    "ml_inference_calls",
+    "Inference pool calls since startup by priority and outcome (completed, failed, expired, shed, rejected)",
+    ["priority", "outcome"],
+)
+
+def record_scheduled_response(scheduling, status, late):
+    """SchedulingMiddleware hook: count each response by priority and what became of it"""
+    if status == 504:
+        outcome = "expired"
+    elif status == 503:
+        outcome = "shed"
+    elif status >= 400:
+        outcome = "failed"
+    else:
+        # Completed after the client's deadline: work nobody was waiting for
+        outcome = "late" if late else "completed"
+    metrics.inc(SCHEDULED_REQUESTS, scheduling.priority, outcome)
+
+# Image OCR limits, keeping /ocr/image latency bounded
+OCR_IMAGE_MAX_BYTES = int(os.getenv("ML_OCR_IMAGE_MAX_BYTES", str(5 * 1024 * 1024)))
+OCR_IMAGE_MAX_PIXELS = int(os.getenv("ML_OCR_IMAGE_MAX_PIXELS", str(4000 * 4000)))
+OCR_MAX_GLYPHS = int(os.getenv("ML_OCR_MAX_GLYPHS", "256"))
+OCR_UPLOAD_CHUNK_BYTES = 64 * 1024
+# Glyphs further apart than this fraction of the line height are separated by a space
+OCR_SPACE_GAP_RATIO = float(os.getenv("ML_OCR_SPACE_GAP_RATIO", "0.5"))
+
+# Multipart headers and boundaries on top of the file itself
+UPLOAD_OVERHEAD_BYTES = 64 * 1024
+
+# Oversized uploads are refused before the multipart parser spools them
+app.add_middleware(BodyLimitMiddleware, limits={
+    "/ocr/image": OCR_IMAGE_MAX_BYTES + UPLOAD_OVERHEAD_BYTES,
+    "/jobs/upload": JOBS_MAX_UPLOAD_BYTES + UPLOAD_OVERHEAD_BYTES,
+})
+# Scheduling headers apply to scoring routes; health, metrics and admin routes ignore them
+SCHEDULED_PATHS = (
+    "/fraud-detection", "/fraud-detection/batch", "/ocr", "/ocr/image", "/predict-rating", "/classify",
+    "/ws/score", "/jobs", "/jobs/upload",
+)
+app.add_middleware(SchedulingMiddleware, paths=SCHEDULED_PATHS, on_response=record_scheduled_response)
+app.add_middleware(MetricsMiddleware, metrics=metrics, latency=REQUEST_SECONDS, in_flight=REQUESTS_IN_FLIGHT)
 
 # Pydantic models
 class FraudDetectionRequest(BaseModel):
     features: List[float]
     certificate_id: Optional[str] = None
+    early_exit: Optional[bool] = None  # None: ML_FRAUD_EARLY_EXIT
 
 class FraudDetectionResponse(BaseModel):
     certificate_id: Optional[str]
@@ -41,6 +317,16 @@ class FraudDetectionResponse(BaseModel):
     is_fraudulent: bool
     confidence: float
     model_version: str
+    trees_evaluated: Optional[int] = None  # early-exit scoring only; omitted otherwise (exclude_unset)
+
+class FraudDetectionBatchRequest(BaseModel):
+    features: List[List[float]]
+    certificate_ids: Optional[List[Optional[str]]] = None
+    early_exit: Optional[bool] = None
+
+class FraudDetectionBatchResponse(BaseModel):
+    results: List[FraudDetectionResponse]
+    count: int
 
 class OCRRequest(BaseModel):
     features: List[float]
@@ -49,6 +335,33 @@ class OCRResponse(BaseModel):
     extracted_text: str
     confidence: float
 
+class OCRCharacter(BaseModel):
+    character: str
+    confidence: float
+    box: List[int]  # x0, y0, x1, y1 in image pixels
+    line: int
+
+class OCRImageResponse(BaseModel):
+    extracted_text: str
+    confidence: float
+    characters: List[OCRCharacter]
+    glyph_count: int
+    feature_set: str
+
+class MetricsConfig(BaseModel):
+    enabled: Optional[bool] = None
+    profiler: Optional[bool] = None
+    reset_profile: bool = False
+
+class ShadowConfig(BaseModel):
+    version: Optional[str] = None  # None disables shadow and canary
+    sample_rate: float = 1.0
+    canary_percent: float = 0.0
+
+class ModelReloadRequest(BaseModel):
+    version: Optional[str] = None  # default: models/CURRENT, else the newest version
+    wait: bool = False
+
 class CourseRatingRequest(BaseModel):
     feature: float
 
@@ -59,6 +372,8 @@ class CourseRatingResponse(BaseModel):
 class HealthResponse(BaseModel):
     status: str
     models_loaded: int
+    models_available: int
+    model_version: Optional[str] = None
     service: str
     version: str
 
@@ -67,47 +382,300 @@ class ModelInfo(BaseModel):
     type: str
     loaded: bool
 
-def load_models():
-    """Load all ML models on startup"""
-    models_dir = Path("models")
-    
+class JobRequest(BaseModel):
+    features: List[List[float]]
+    certificate_ids: Optional[List[Optional[str]]] = None
+    priority: int = 0  # higher runs first
+    chunk_size: Optional[int] = None
+
+def load_models(names=None):
+    """Eagerly load models (default: every available artifact)"""
+    failed = models.warm_up(names)
+    logger.info(f"🎉 Total models loaded: {len(models)}")
+    return not failed
+
+def warm_model_names():
+    """Models to load at startup, from ML_WARM_MODELS"""
+    if WARM_MODELS.strip().lower() == "all":
+        return None
+    return [name.strip() for name in WARM_MODELS.split(",") if name.strip()]
+
+def setup_inference_pool():
+    """Create the bounded worker pool used for all model inference"""
+    global inference_pool
+    inference_pool = InferencePool(
+        kind=INFERENCE_EXECUTOR,
+        workers=INFERENCE_WORKERS,
+        max_queue=INFERENCE_MAX_QUEUE,
+        retry_after=INFERENCE_RETRY_AFTER,
+        low_priority_queue=int(INFERENCE_LOW_PRIORITY_QUEUE) if INFERENCE_LOW_PRIORITY_QUEUE else None,
+    )
+    logger.info(
+        f"✅ Inference pool ready ({inference_pool.kind}, workers={inference_pool.workers}, "
+        f"max_queue={inference_pool.max_queue}, low_priority_queue={inference_pool.low_priority_queue})"
+    )
+
+def setup_prediction_cache():
+    """Create the prediction cache and invalidate it whenever a model changes"""
+    global prediction_cache
+    if not CACHE_ENABLED or prediction_cache is not None:
+        return
+    prediction_cache = PredictionCache(load_backend(CACHE_BACKEND, CACHE_MAX_BYTES), ttl_seconds=CACHE_TTL_SECONDS)
+    model_versions.add_listener(invalidate_cached_predictions)
+    logger.info(f"✅ Prediction cache ready ({CACHE_BACKEND}, ttl={CACHE_TTL_SECONDS}s)")
+
+def invalidate_cached_predictions(model_name, registry=None):
+    """Registry listener: drop cached responses computed with a changed model"""
+    for endpoint, dependencies in CACHE_DEPENDENCIES.items():
+        if model_name in dependencies:
+            prediction_cache.invalidate(endpoint)
+
+def record_model_load(model_name, registry):
+    """Registry listener: record the load time of a freshly loaded model"""
+    load_seconds = registry.info(model_name).get("load_seconds")
+    if load_seconds is not None:
+        metrics.observe(MODEL_LOAD_SECONDS, load_seconds, model_name)
+
+model_versions.add_listener(record_model_load)
+
+def on_model_swap(registry, previous):
+    """Version swap listener: serve the new registry from now on"""
+    global models
+    models = registry
+    if prediction_cache is not None:
+        # Keys already include the model version; this just frees the space
+        for endpoint in CACHE_DEPENDENCIES:
+            prediction_cache.invalidate(endpoint)
+    if inference_pool is not None and inference_pool.kind == "process":
+        replace_inference_pool()
+    if drift_monitor is not None:
+        # Each version carries the reference profiles of its own training data
+        drift_monitor.set_references(drift_references(registry))
+
+model_versions.add_swap_listener(on_model_swap)
+
+def replace_inference_pool():
+    """Process workers hold fork-time copies of the models: start fresh ones"""
+    global inference_pool
+    old_pool = inference_pool
+    setup_inference_pool()
+    for batcher in [*batchers.values(), *stream_batchers.values()]:
+        batcher.execute = inference_pool.run
+    # Tasks already queued on the old workers still complete
+    old_pool.shutdown(cancel_pending=False)
+
+def warm_registry(registry):
+    """Run one sample prediction per model family against a freshly loaded version"""
+    if 'fraud_classifier' in registry and 'fraud_scaler' in registry:
+        n_features = registry['fraud_scaler'].n_features_in_
+        score_fraud_batch(np.zeros((1, n_features)), registry=registry)
+    if 'ocr_classifier' in registry:
+        n_features = ocr_model_input(registry).n_features_in_
+        ocr_batch(np.zeros((1, n_features)), registry=registry)
+    if 'classifier' in registry:
+        classify_batch(np.zeros((1, registry['classifier'].n_features_in_)), registry=registry)
+    if 'coursera_regressor' in registry:
+        predict_rating_batch([0.0], registry=registry)
+
+def setup_shadow(version, sample_rate=SHADOW_SAMPLE_RATE, canary_percent=CANARY_PERCENT):
+    """Load and warm a candidate version, then start shadow scoring against it"""
+    global shadow
+    if not 0.0 <= sample_rate <= 1.0 or not 0.0 <= canary_percent <= 100.0:
+        raise ValueError("sample_rate must be within 0..1 and canary_percent within 0..100")
+    candidate = model_versions.registry_for(version)
+    candidate.warm_up(['fraud_scaler', 'fraud_classifier'])
+    if 'fraud_classifier' not in candidate or 'fraud_scaler' not in candidate:
+        raise ModelNotAvailable(f"Version '{version}' has no fraud model")
+    score_fraud_batch(np.zeros((1, candidate['fraud_scaler'].n_features_in_)), registry=candidate, label='fraud_shadow')
+
+    previous = shadow
+    shadow = ShadowEvaluator(
+        candidate,
+        partial(score_fraud_batch, registry=candidate, label='fraud_shadow'),
+        sample_rate=sample_rate,
+        canary_percent=canary_percent,
+        max_queue=SHADOW_MAX_QUEUE,
+        workers=SHADOW_WORKERS,
+    )
+    if previous is not None:
+        previous.stop()
+    logger.info(f"✅ Shadow evaluation of '{version}' (sample_rate={sample_rate}, canary={canary_percent}%)")
+
+async def submit_shadow(evaluator, features, result):
+    """Background task: enqueue a shadow comparison (async, so no threadpool hop)"""
+    evaluator.submit(features, result)
+
+def stop_shadow():
+    global shadow
+    if shadow is not None:
+        shadow.stop()
+        shadow = None
+
+def drift_references(registry):
+    """Reference profiles saved with a model version ({} when it has none)"""
     try:
-        # Fraud detection models
-        models['fraud_classifier'] = joblib.load(models_dir / "fraud_classifier.pkl")
-        models['fraud_scaler'] = joblib.load(models_dir / "fraud_scaler.pkl")
-        logger.info("✅ Fraud detection models loaded")
-        
-        # OCR models
-        models['ocr_classifier'] = joblib.load(models_dir / "ocr_classifier.pkl")
-        models['ocr_scaler'] = joblib.load(models_dir / "ocr_scaler.pkl")
-        models['ocr_label_encoder'] = joblib.load(models_dir / "ocr_label_encoder.pkl")
-        logger.info("✅ OCR models loaded")
-        
-        # Course rating models
-        models['coursera_regressor'] = joblib.load(models_dir / "coursera_regressor.pkl")
-        models['coursera_scaler'] = joblib.load(models_dir / "coursera_scaler.pkl")
-        logger.info("✅ Course rating models loaded")
-        
-        # Additional models
-        models['classifier'] = joblib.load(models_dir / "classifier.pkl")
-        models['regressor'] = joblib.load(models_dir / "regressor.pkl")
-        logger.info("✅ Additional models loaded")
-        
-        logger.info(f"🎉 Total models loaded: {len(models)}")
-        return True
-        
-    except Exception as e:
-        logger.error(f"❌ Error loading models: {e}")
-        return False
+        return load_references(registry.models_dir / REFERENCE_FILE)
+    except (OSError, ValueError) as e:
+        logger.error(f"❌ Drift reference profiles not loaded: {e}")
+        return {}
+
+def setup_drift_monitor():
+    global drift_monitor
+    references = drift_references(models)
+    drift_monitor = DriftMonitor(
+        references,
+        sample_rate=DRIFT_SAMPLE_RATE,
+        window_rows=DRIFT_WINDOW_ROWS,
+        k=DRIFT_SKETCH_K,
+        flush_seconds=DRIFT_FLUSH_SECONDS,
+        max_pending=DRIFT_MAX_PENDING,
+        min_rows=DRIFT_MIN_ROWS,
+        psi_warning=DRIFT_PSI_WARNING,
+        psi_alert=DRIFT_PSI_ALERT,
+        ks_alert=DRIFT_KS_ALERT,
+    )
+    logger.info(f"✅ Drift monitor ready (references: {', '.join(sorted(references)) or 'none'})")
+
+def record_drift(model, features):
+    """Queue one input row for drift monitoring (a deque append; scored off the request path)"""
+    if drift_monitor is not None and model in DRIFT_MODELS:
+        drift_monitor.record(DRIFT_MODELS[model], features)
+
+async def require_admin(x_admin_token: Optional[str] = Header(None)):
+    """Admin endpoint guard, active when ML_ADMIN_TOKEN is set"""
+    if ADMIN_TOKEN and not hmac.compare_digest(x_admin_token or "", ADMIN_TOKEN):
+        raise HTTPException(status_code=401, detail="Invalid admin token")
+
+def collect_runtime_metrics():
+    """Refresh gauges mirroring pool, cache and registry state at scrape time"""
+    MODELS_LOADED.set(len(models))
+    if inference_pool is not None:
+        pool = inference_pool.stats()
+        POOL_PENDING.set(pool["in_flight"], "running")
+        POOL_PENDING.set(pool["queued"], "queued")
+        POOL_REJECTED.set(pool["rejected"])
+        for priority, outcomes in pool["by_priority"].items():
+            for outcome in OUTCOMES:
+                INFERENCE_CALLS.set(outcomes[outcome], priority, outcome)
+    if prediction_cache is not None:
+        CACHE_LOOKUPS.set(prediction_cache.hits, "hit")
+        CACHE_LOOKUPS.set(prediction_cache.misses, "miss")
+    if drift_monitor is not None:
+        for model, scores in drift_monitor.scores().items():
+            if "psi" in scores:
+                DRIFT_PSI.set(scores["psi"], model)
+                DRIFT_KS.set(scores["ks"], model)
+
+metrics.add_collector(collect_runtime_metrics)
+
+def record_error(endpoint, error):
+    """Count a failed request by exception type"""
+    metrics.inc(ERRORS, endpoint, type(error).__name__)
+
+async def run_in_pool(fn, *args, priority=None):
+    """inference_pool.run, resolving the pool at call time (it is replaced on process-pool swaps)"""
+    return await inference_pool.run(fn, *args, priority=priority)
+
+def inference_busy():
+    """True while every inference worker already has a request: job chunks wait"""
+    return inference_pool.stats()["in_flight"] >= inference_pool.workers
+
+def setup_job_runner():
+    """Open the job store and start the background chunk workers"""
+    global job_runner
+    if job_runner is not None:
+        return
+    job_runner = JobRunner(
+        load_job_store(JOBS_BACKEND, JOBS_DB, lease_seconds=JOBS_LEASE_SECONDS),
+        score_fraud_batch,
+        # Bulk re-scoring: queued behind interactive requests and shed first
+        execute=partial(run_in_pool, priority="batch"),
+        workers=JOBS_WORKERS,
+        busy=inference_busy,
+        retry_on=(PoolSaturated,),
+        ttl_seconds=JOBS_TTL_SECONDS,
+    )
+    job_runner.start()
+    logger.info(f"✅ Job queue ready ({JOBS_BACKEND}, workers={JOBS_WORKERS}, chunk_size={JOBS_CHUNK_SIZE})")
+
+def setup_batchers(queues, label=""):
+    """Create one micro-batching queue per batchable model in queues"""
+    for name, run_batch in BATCH_FUNCTIONS.items():
+        prefix = f"ML_BATCH_{name.upper()}_"
+        queues[name] = MicroBatcher(
+            name,
+            run_batch,
+            max_batch_size=int(os.getenv(prefix + "MAX_SIZE", "32")),
+            max_wait_ms=float(os.getenv(prefix + "MAX_WAIT_MS", "2")),
+            execute=inference_pool.run,
+            passthrough=(PoolSaturated, DeadlineExceeded),
+        )
+        logger.info(
+            f"✅ Micro-batching enabled for '{name}'{label} "
+            f"(max_batch_size={queues[name].max_batch_size}, max_wait_ms={queues[name].max_wait * 1000})"
+        )
 
 @app.on_event("startup")
 async def startup_event():
     """Load models when the application starts"""
     logger.info("🚀 Starting ML Service...")
-    if load_models():
-        logger.info("✅ ML Service ready!")
+    available = models.available_names()
+    if not available:
+        logger.error(f"❌ No model artifacts found in {MODELS_DIR}")
+    # Already-loaded models (e.g. pre-forked by serve.py) are not reloaded
+    elif load_models(warm_model_names()):
+        logger.info(f"✅ ML Service ready! {len(available)} models available, {len(models)} loaded")
     else:
-        logger.error("❌ Failed to load models")
+        logger.error("❌ Failed to warm up some models")
+    setup_inference_pool()
+    setup_prediction_cache()
+    if BATCHING_ENABLED:
+        setup_batchers(batchers)
+    else:
+        setup_batchers(stream_batchers, " (streams only)")
+    if SHADOW_VERSION:
+        try:
+            setup_shadow(SHADOW_VERSION)
+        except Exception as e:
+            logger.error(f"❌ Shadow evaluation not started: {e}")
+    if DRIFT_ENABLED and drift_monitor is None:
+        setup_drift_monitor()
+    if JOBS_ENABLED:
+        setup_job_runner()
+    if MODEL_WATCH_SECONDS > 0:
+        model_versions.start_watcher(MODEL_WATCH_SECONDS, warm=warm_registry)
+        logger.info(f"✅ Watching {MODELS_DIR} for new model versions every {MODEL_WATCH_SECONDS}s")
+    if PROFILER_ENABLED:
+        profiler.start()
+        logger.info(f"✅ Sampling profiler running (every {PROFILER_INTERVAL_MS} ms)")
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop inference workers"""
+    if job_runner is not None:
+        await job_runner.stop()
+    if inference_pool is not None:
+        inference_pool.shutdown()
+    model_versions.stop_watcher()
+    stop_shadow()
+    if drift_monitor is not None:
+        drift_monitor.stop()
+    profiler.stop()
+
+@app.exception_handler(PoolSaturated)
+async def pool_saturated_handler(request, exc: PoolSaturated):
+    """Fail fast when the inference queue is full"""
+    record_error(getattr(request.scope.get("route"), "path", request.url.path), exc)
+    return JSONResponse(
+        status_code=503,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+@app.exception_handler(DeadlineExceeded)
+async def deadline_exceeded_handler(request, exc: DeadlineExceeded):
+    """The client's X-Request-Deadline-Ms passed while the request was queued"""
+    return JSONResponse(status_code=504, content={"detail": str(exc)})
 
 @app.get("/", response_model=HealthResponse)
 async def root():
@@ -115,6 +683,8 @@ async def root():
     return {
         "status": "ok",
         "models_loaded": len(models),
+        "models_available": len(models.available_names()),
+        "model_version": models.model_version,
         "service": "BCVS ML Service",
         "version": "1.0.0"
     }
@@ -122,9 +692,12 @@ async def root():
 @app.get("/health", response_model=HealthResponse)
 async def health_check():
     """Health check endpoint"""
+    available = len(models.available_names())
     return {
-        "status": "healthy" if len(models) > 0 else "unhealthy",
+        "status": "healthy" if available > 0 else "unhealthy",
         "models_loaded": len(models),
+        "models_available": available,
+        "model_version": models.model_version,
         "service": "BCVS ML Service",
         "version": "1.0.0"
     }
@@ -150,16 +723,449 @@ async def get_models_info():
         model_info.append({
             "name": name,
             "type": model_type,
-            "loaded": name in models
+            **models.info(name)
         })
     
     return {
+        "model_version": models.model_version,
         "total_models": len(models),
+        "available_models": len(models.available_names()),
         "models": model_info
     }
 
-@app.post("/fraud-detection", response_model=FraudDetectionResponse)
-async def detect_fraud(request: FraudDetectionRequest):
+def score_fraud_batch(features, certificate_ids=None, registry=None, early_exit=False, label='fraud'):
+    """
+    Score a batch of certificates with a single scaler and forest pass
+
+    Rows are stacked into one contiguous float32 matrix, scaled once and
+    passed to predict_proba once. Returns one response dict per row.
+    registry defaults to the active model version, captured once per call
+    so a concurrent version swap never mixes models within a batch.
+    With early_exit (and a random forest model) each row only evaluates the
+    trees needed to settle the threshold decision, and every response
+    reports trees_evaluated. label is the model label of the stage and
+    batch-size metrics ('fraud_shadow' for shadow scoring, so candidate load
+    never shows up in the primary path's numbers).
+    """
+    if registry is None:
+        registry = models
+    # Prepare features
+    with metrics.time(STAGE_SECONDS, label, 'parse'):
+        features_array = np.ascontiguousarray(features, dtype=np.float32)
+        if features_array.ndim != 2:
+            raise ValueError("Features must be a 2D matrix of shape (n_certificates, n_features)")
+        if certificate_ids is None:
+            certificate_ids = [None] * len(features_array)
+    metrics.observe(BATCH_ROWS, len(features_array), label)
+
+    # Scale features
+    with metrics.time(STAGE_SECONDS, label, 'scale'):
+        scaled_features = registry['fraud_scaler'].transform(features_array)
+
+    # Predict
+    trees_evaluated = None
+    forest = as_flat_forest(registry['fraud_classifier']) if early_exit else None
+    with metrics.time(STAGE_SECONDS, label, 'predict'):
+        if forest is not None:
+            probabilities, trees_evaluated = forest.predict_proba_early_exit(
+                scaled_features,
+                FRAUD_THRESHOLD / 100,
+                chunk_trees=FRAUD_EARLY_EXIT_CHUNK_TREES,
+                delta=FRAUD_EARLY_EXIT_DELTA,
+            )
+            metrics.observe(TREES_EVALUATED, float(trees_evaluated.mean()), label)
+        else:
+            probabilities = registry['fraud_classifier'].predict_proba(scaled_features)
+
+    with metrics.time(STAGE_SECONDS, label, 'decode'):
+        # Calculate fraud scores (0-100)
+        fraud_scores = probabilities[:, 1] * 100  # Probability of fraud class
+        confidences = probabilities.max(axis=1) * 100
+
+        results = [
+            {
+                "certificate_id": certificate_id,
+                "fraud_score": round(float(fraud_score), 2),
+                "is_fraudulent": bool(fraud_score > FRAUD_THRESHOLD),
+                "confidence": round(float(confidence), 2),
+                "model_version": registry.model_version
+            }
+            for certificate_id, fraud_score, confidence in zip(certificate_ids, fraud_scores, confidences)
+        ]
+        if trees_evaluated is not None:
+            for result, trees in zip(results, trees_evaluated.tolist()):
+                result["trees_evaluated"] = trees
+        return results
+
+def ocr_batch(features, registry=None):
+    """Decode a batch of glyph feature vectors with one predict_proba call"""
+    if registry is None:
+        registry = models
+    # Prepare features
+    with metrics.time(STAGE_SECONDS, 'ocr', 'parse'):
+        features_array = np.ascontiguousarray(features, dtype=np.float32)
+    metrics.observe(BATCH_ROWS, len(features_array), 'ocr')
+
+    # Scale if scaler available
+    if 'ocr_scaler' in registry:
+        with metrics.time(STAGE_SECONDS, 'ocr', 'scale'):
+            features_array = registry['ocr_scaler'].transform(features_array)
+
+    # Predict
+    with metrics.time(STAGE_SECONDS, 'ocr', 'predict'):
+        classifier = registry['ocr_classifier']
+        probabilities = classifier.predict_proba(features_array)
+        predictions = classifier.classes_.take(np.argmax(probabilities, axis=1))
+
+    with metrics.time(STAGE_SECONDS, 'ocr', 'decode'):
+        # Decode if label encoder available
+        if 'ocr_label_encoder' in registry:
+            predictions = registry['ocr_label_encoder'].inverse_transform(predictions)
+
+        return [
+            {
+                "extracted_text": str(prediction),
+                "confidence": round(float(confidence) * 100, 2)
+            }
+            for prediction, confidence in zip(predictions, probabilities.max(axis=1))
+        ]
+
+def ocr_model_input(registry):
+    """First OCR model applied to features (the scaler if there is one)"""
+    return registry['ocr_scaler'] if 'ocr_scaler' in registry else registry['ocr_classifier']
+
+def ocr_feature_set(registry):
+    """Feature set the loaded OCR model was trained on, from its input width"""
+    n_features = getattr(ocr_model_input(registry), 'n_features_in_', None)
+    feature_set = feature_set_for(n_features)
+    if feature_set is None:
+        raise RuntimeError(f"OCR model expects {n_features} features; no matching image feature set")
+    return feature_set
+
+def ocr_image(source, max_pixels=None, max_glyphs=None):
+    """
+    Read the text in an image: decode, segment, then classify every glyph at once
+
+    Runs in the inference pool. All glyph crops go through one batched
+    feature extraction and one ocr_batch (predict_proba) call.
+    """
+    registry = models
+    with metrics.time(STAGE_SECONDS, 'ocr_image', 'image_decode'):
+        gray = open_image(source, max_pixels=max_pixels)
+    with metrics.time(STAGE_SECONDS, 'ocr_image', 'segment'):
+        boxes = segment_glyphs(gray, max_glyphs=max_glyphs)
+    feature_set = ocr_feature_set(registry)
+    with metrics.time(STAGE_SECONDS, 'ocr_image', 'extract'):
+        glyph_features = extract_features(crop_glyphs(gray, boxes), feature_set)
+    predictions = ocr_batch(glyph_features, registry=registry) if boxes else []
+    # No-op in process-pool workers: only glyphs classified by thread workers are monitored
+    if drift_monitor is not None and boxes:
+        drift_monitor.record_batch('ocr', glyph_features)
+
+    text = []
+    characters = []
+    previous = None
+    for (line, x0, y0, x1, y1), prediction in zip(boxes, predictions):
+        if previous is not None:
+            if line != previous[0]:
+                text.append("\n")
+            elif x0 - previous[3] > OCR_SPACE_GAP_RATIO * max(y1 - y0, previous[4] - previous[2]):
+                text.append(" ")
+        text.append(prediction["extracted_text"])
+        characters.append({
+            "character": prediction["extracted_text"],
+            "confidence": prediction["confidence"],
+            "box": [x0, y0, x1, y1],
+            "line": line,
+        })
+        previous = (line, x0, y0, x1, y1)
+
+    confidences = [c["confidence"] for c in characters]
+    return {
+        "extracted_text": "".join(text),
+        "confidence": round(float(np.mean(confidences)), 2) if confidences else 0.0,
+        "characters": characters,
+        "glyph_count": len(characters),
+        "feature_set": feature_set,
+    }
+
+async def read_upload(upload, max_bytes, what="Image"):
+    """
+    Read an already-received upload in chunks, rejecting it once it exceeds max_bytes
+
+    The request body itself is capped by BodyLimitMiddleware before parsing;
+    this enforces the limit on the file rather than on the whole form.
+    """
+    buffer = bytearray()
+    while True:
+        chunk = await upload.read(OCR_UPLOAD_CHUNK_BYTES)
+        if not chunk:
+            return bytes(buffer)
+        buffer += chunk
+        if len(buffer) > max_bytes:
+            raise HTTPException(status_code=413, detail=f"{what} too large: more than {max_bytes} bytes")
+
+def classify_batch(features, registry=None):
+    """Classify a batch of feature vectors with one predict_proba call"""
+    if registry is None:
+        registry = models
+    with metrics.time(STAGE_SECONDS, 'classify', 'parse'):
+        features_array = np.ascontiguousarray(features, dtype=np.float32)
+    metrics.observe(BATCH_ROWS, len(features_array), 'classify')
+
+    with metrics.time(STAGE_SECONDS, 'classify', 'predict'):
+        classifier = registry['classifier']
+        probabilities = classifier.predict_proba(features_array)
+        predictions = classifier.classes_.take(np.argmax(probabilities, axis=1))
+
+    with metrics.time(STAGE_SECONDS, 'classify', 'decode'):
+        return [
+            {
+                "prediction": int(prediction),
+                "probability": round(float(probability) * 100, 2)
+            }
+            for prediction, probability in zip(predictions, probabilities.max(axis=1))
+        ]
+
+def predict_rating_batch(values, registry=None):
+    """Predict course ratings for a batch of single-feature inputs"""
+    if registry is None:
+        registry = models
+    # Prepare feature
+    with metrics.time(STAGE_SECONDS, 'rating', 'parse'):
+        feature_array = np.asarray(values, dtype=np.float64).reshape(-1, 1)
+    metrics.observe(BATCH_ROWS, len(feature_array), 'rating')
+
+    # Scale if available
+    if 'coursera_scaler' in registry:
+        with metrics.time(STAGE_SECONDS, 'rating', 'scale'):
+            feature_array = registry['coursera_scaler'].transform(feature_array)
+
+    # Predict
+    with metrics.time(STAGE_SECONDS, 'rating', 'predict'):
+        predictions = registry['coursera_regressor'].predict(feature_array)
+
+    with metrics.time(STAGE_SECONDS, 'rating', 'decode'):
+        # Clamp rating between 0 and 5
+        ratings = np.clip(predictions, 0.0, 5.0)
+
+        return [
+            {
+                "predicted_rating": round(float(rating), 2),
+                "confidence": 85.0  # Based on model RMSE of 0.159
+            }
+            for rating in ratings
+        ]
+
+# Row-batch inference functions, one per batchable model
+BATCH_FUNCTIONS = {
+    'fraud': score_fraud_batch,
+    'fraud_early_exit': partial(score_fraud_batch, early_exit=True),
+    'ocr': ocr_batch,
+    'classify': classify_batch,
+}
+
+def cache_version(model):
+    """Combined version of the models behind an endpoint, or None until they are loaded"""
+    versions = []
+    for name in CACHE_DEPENDENCIES[model]:
+        version = models.version(name)
+        if version is None:
+            if name in models:
+                return None
+            version = "-"  # optional model without an artifact
+        versions.append(version)
+    return ".".join(versions)
+
+async def predict_one(model, features, queues=None):
+    """
+    Score one row, coalescing it with concurrent requests when batching is enabled
+
+    queues: micro-batching queues to use instead of the shared ones (streams)
+    """
+    queues = batchers if queues is None else queues
+    record_drift(model, features)
+    key = None
+    if prediction_cache is not None:
+        version = cache_version(model)
+        if version is None:
+            # Not loaded yet: nothing can be cached, but the request still missed
+            prediction_cache.record_miss()
+        else:
+            key = prediction_cache.key(model, version, features)
+            cached = prediction_cache.get(key)
+            if cached is not None:
+                return cached
+
+    if model in queues:
+        result = await queues[model].submit(features)
+    else:
+        result = (await inference_pool.run(BATCH_FUNCTIONS[model], [features]))[0]
+
+    # A reload or rollback while scoring means the result may not come from `version`
+    if key is not None and cache_version(model) == version:
+        prediction_cache.set(key, result)
+    return result
+
+@app.get("/cache/stats")
+async def get_cache_stats():
+    """Prediction cache hit/miss/eviction counters"""
+    if prediction_cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **prediction_cache.stats()}
+
+@app.get("/inference/stats")
+async def get_inference_stats():
+    """Worker pool utilisation and rejection counters"""
+    return inference_pool.stats() if inference_pool is not None else {}
+
+@app.get("/batching/stats")
+async def get_batching_stats():
+    """Per-queue micro-batching metrics"""
+    return {
+        "enabled": BATCHING_ENABLED,
+        "queues": {name: batcher.stats() for name, batcher in batchers.items()},
+        "stream_queues": {name: batcher.stats() for name, batcher in stream_batchers.items()},
+    }
+
+@app.get("/metrics")
+async def get_metrics():
+    """Prometheus metrics for this process"""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+@app.post("/metrics/config", dependencies=[Depends(require_admin)])
+async def configure_metrics(config: MetricsConfig):
+    """Switch metric collection and the sampling profiler on or off at runtime"""
+    if config.enabled is not None:
+        metrics.enabled = config.enabled
+    if config.reset_profile:
+        profiler.reset()
+    if config.profiler is True:
+        profiler.start()
+    elif config.profiler is False:
+        profiler.stop()
+    return {"metrics_enabled": metrics.enabled, "profiler": profiler.stats()}
+
+@app.get("/debug/profile", dependencies=[Depends(require_admin)])
+async def get_profile(top: int = 50, format: str = "json"):
+    """Most frequent sampled stacks; format=collapsed returns flamegraph.pl input"""
+    if format == "collapsed":
+        return PlainTextResponse(profiler.collapsed(top))
+    return {
+        **profiler.stats(),
+        "stacks": [{"stack": stack, "count": count} for stack, count in profiler.snapshot(top)],
+    }
+
+@app.get("/admin/models/versions", dependencies=[Depends(require_admin)])
+async def get_model_versions():
+    """Available model versions, the active and previous one, and reload status"""
+    return model_versions.info()
+
+def log_reload_result(task):
+    if not task.cancelled() and task.exception() is not None:
+        logger.error(f"❌ Model reload failed: {task.exception()}")
+
+@app.post("/admin/models/reload", dependencies=[Depends(require_admin)])
+async def reload_models(request: ModelReloadRequest):
+    """
+    Load a model version in the background, warm it up and swap it in
+
+    Requests keep being served by the current version until the swap.
+    Returns 202 immediately unless wait is set.
+    """
+    version = request.version or model_versions.target_version()
+    if version not in model_versions.versions():
+        raise HTTPException(status_code=404, detail=f"Unknown model version: {version}")
+    if model_versions.status.get("state") == "loading":
+        raise HTTPException(status_code=409, detail="A model version change is already in progress")
+
+    loop = asyncio.get_running_loop()
+    task = loop.run_in_executor(None, partial(model_versions.activate, version, warm=warm_registry, persist=True))
+    if not request.wait:
+        task.add_done_callback(log_reload_result)
+        return JSONResponse(status_code=202, content={"status": "loading", "version": version})
+
+    try:
+        await task
+    except ReloadInProgress as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except Exception as e:
+        logger.error(f"❌ Model reload failed: {e}")
+        raise HTTPException(status_code=500, detail=f"Model reload failed: {e}")
+    return model_versions.info()
+
+@app.post("/admin/models/rollback", dependencies=[Depends(require_admin)])
+async def rollback_models():
+    """Swap back to the previously served version (kept loaded, so this is immediate)"""
+    try:
+        model_versions.rollback(persist=True)
+    except (ReloadInProgress, ModelNotAvailable) as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return model_versions.info()
+
+@app.get("/shadow/stats")
+async def get_shadow_stats():
+    """Candidate vs primary comparison: score deltas, disagreements, drops"""
+    if shadow is None:
+        return {"enabled": False}
+    return {"enabled": True, "primary_version": models.model_version, **shadow.stats()}
+
+@app.get("/drift")
+async def get_drift(model: Optional[str] = None, details: bool = False):
+    """
+    Feature drift of recent fraud / OCR inputs against the training data
+
+    Per model: the largest per-feature PSI and KS distance over the recent
+    window, a status (ok / warning / drift, or no_reference /
+    insufficient_data) and the most shifted features; details=true lists
+    every feature.
+    """
+    if drift_monitor is None:
+        return {"enabled": False}
+    scores = await asyncio.to_thread(drift_monitor.scores, model, details)
+    if model is not None and model not in scores:
+        raise HTTPException(status_code=404, detail=f"No drift data for model '{model}'")
+    return {"enabled": True, "model_version": models.model_version, "models": scores,
+            "monitor": drift_monitor.stats()}
+
+@app.post("/admin/shadow", dependencies=[Depends(require_admin)])
+async def configure_shadow(config: ShadowConfig):
+    """Start (or replace) shadow/canary evaluation of a candidate version, or stop it"""
+    if config.version is None:
+        stop_shadow()
+        return {"enabled": False}
+    if config.version not in model_versions.versions():
+        raise HTTPException(status_code=404, detail=f"Unknown model version: {config.version}")
+    loop = asyncio.get_running_loop()
+    try:
+        await loop.run_in_executor(None, partial(setup_shadow, config.version, config.sample_rate, config.canary_percent))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except ModelNotAvailable as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return {"enabled": True, **shadow.stats()}
+
+def use_early_exit(requested):
+    return FRAUD_EARLY_EXIT if requested is None else requested
+
+async def score_fraud_one(features, background_tasks=None, queues=None, early_exit=False):
+    """Score one certificate: canary routing, micro-batching and shadow sampling"""
+    evaluator = shadow
+    if evaluator is not None and evaluator.route_to_canary():
+        record_drift('fraud', features)
+        return (await inference_pool.run(score_fraud_batch, [features], None, evaluator.registry, early_exit))[0]
+    result = await predict_one('fraud_early_exit' if early_exit else 'fraud', features, queues)
+    # Early-exit scores are estimates, so only full scores are compared in shadow mode
+    if evaluator is not None and not early_exit:
+        if background_tasks is None:
+            evaluator.submit(features, result)
+        else:
+            # Runs after the response is sent; only enqueues, never waits
+            background_tasks.add_task(submit_shadow, evaluator, features, result)
+    return result
+
+@app.post("/fraud-detection", response_model=FraudDetectionResponse, response_model_exclude_unset=True)
+async def detect_fraud(request: FraudDetectionRequest, background_tasks: BackgroundTasks):
     """
     Detect fraud in certificate
     
@@ -169,32 +1175,55 @@ async def detect_fraud(request: FraudDetectionRequest):
         if 'fraud_classifier' not in models or 'fraud_scaler' not in models:
             raise HTTPException(status_code=500, detail="Fraud detection models not loaded")
         
-        # Prepare features
-        features_array = np.array(request.features).reshape(1, -1)
-        
-        # Scale features
-        scaled_features = models['fraud_scaler'].transform(features_array)
-        
-        # Predict
-        prediction = models['fraud_classifier'].predict(scaled_features)[0]
-        probability = models['fraud_classifier'].predict_proba(scaled_features)[0]
-        
-        # Calculate fraud score (0-100)
-        fraud_score = float(probability[1] * 100)  # Probability of fraud class
-        is_fraudulent = fraud_score > 70.0  # Threshold at 70%
-        
-        return {
-            "certificate_id": request.certificate_id,
-            "fraud_score": round(fraud_score, 2),
-            "is_fraudulent": is_fraudulent,
-            "confidence": round(float(max(probability)) * 100, 2),
-            "model_version": "1.0.0"
-        }
+        result = await score_fraud_one(request.features, background_tasks, early_exit=use_early_exit(request.early_exit))
+        return {**result, "certificate_id": request.certificate_id}
         
+    except (HTTPException, PoolSaturated, DeadlineExceeded):
+        raise
     except Exception as e:
+        record_error('/fraud-detection', e)
         logger.error(f"Fraud detection error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/fraud-detection/batch", response_model=FraudDetectionBatchResponse, response_model_exclude_unset=True)
+async def detect_fraud_batch(request: FraudDetectionBatchRequest):
+    """
+    Detect fraud in a batch of certificates
+
+    Accepts N feature vectors (and optionally N certificate IDs) and scores
+    them in one vectorized pass. Results are returned in request order.
+    """
+    try:
+        if 'fraud_classifier' not in models or 'fraud_scaler' not in models:
+            raise HTTPException(status_code=500, detail="Fraud detection models not loaded")
+
+        if len(request.features) > FRAUD_BATCH_MAX_SIZE:
+            raise HTTPException(
+                status_code=413,
+                detail=f"Batch too large: {len(request.features)} > {FRAUD_BATCH_MAX_SIZE}"
+            )
+        if request.certificate_ids is not None and len(request.certificate_ids) != len(request.features):
+            raise HTTPException(status_code=400, detail="certificate_ids must match the number of feature vectors")
+        if len(request.features) == 0:
+            return {"results": [], "count": 0}
+
+        if drift_monitor is not None:
+            drift_monitor.record_batch('fraud', request.features)
+        results = await inference_pool.run(
+            score_fraud_batch, request.features, request.certificate_ids, None, use_early_exit(request.early_exit)
+        )
+        return {"results": results, "count": len(results)}
+
+    except (HTTPException, PoolSaturated, DeadlineExceeded):
+        raise
+    except ValueError as e:
+        record_error('/fraud-detection/batch', e)
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        record_error('/fraud-detection/batch', e)
+        logger.error(f"Batch fraud detection error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.post("/ocr", response_model=OCRResponse)
 async def perform_ocr(request: OCRRequest):
     """
@@ -206,32 +1235,52 @@ async def perform_ocr(request: OCRRequest):
         if 'ocr_classifier' not in models:
             raise HTTPException(status_code=500, detail="OCR models not loaded")
         
-        # Prepare features
-        features_array = np.array(request.features).reshape(1, -1)
-        
-        # Scale if scaler available
-        if 'ocr_scaler' in models:
-            features_array = models['ocr_scaler'].transform(features_array)
-        
-        # Predict
-        prediction = models['ocr_classifier'].predict(features_array)[0]
-        probability = models['ocr_classifier'].predict_proba(features_array)[0]
-        
-        # Decode if label encoder available
-        if 'ocr_label_encoder' in models:
-            extracted_text = str(models['ocr_label_encoder'].inverse_transform([prediction])[0])
-        else:
-            extracted_text = str(prediction)
-        
-        return {
-            "extracted_text": extracted_text,
-            "confidence": round(float(max(probability)) * 100, 2)
-        }
+        return await predict_one('ocr', request.features)
         
+    except (HTTPException, PoolSaturated, DeadlineExceeded):
+        raise
     except Exception as e:
+        record_error('/ocr', e)
         logger.error(f"OCR error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/ocr/image", response_model=OCRImageResponse)
+async def perform_ocr_image(file: UploadFile = File(...)):
+    """
+    Perform OCR on an uploaded certificate image
+
+    The image is segmented into glyphs in the service and every glyph is
+    classified in one batch. Returns the text with per-character confidences.
+    """
+    try:
+        if 'ocr_classifier' not in models:
+            raise HTTPException(status_code=500, detail="OCR models not loaded")
+
+        if file.size is not None and file.size > OCR_IMAGE_MAX_BYTES:
+            raise HTTPException(status_code=413, detail=f"Image too large: more than {OCR_IMAGE_MAX_BYTES} bytes")
+
+        # BodyLimitMiddleware capped the request before it was parsed; this checks the file itself
+        if inference_pool.kind == "thread" and file.size is not None:
+            # Let the worker decode straight from the spooled upload file
+            source = file.file
+        else:
+            source = await read_upload(file, OCR_IMAGE_MAX_BYTES)
+
+        return await inference_pool.run(ocr_image, source, OCR_IMAGE_MAX_PIXELS, OCR_MAX_GLYPHS)
+
+    except (HTTPException, PoolSaturated, DeadlineExceeded):
+        raise
+    except ImageTooLarge as e:
+        record_error('/ocr/image', e)
+        raise HTTPException(status_code=413, detail=str(e))
+    except ValueError as e:
+        record_error('/ocr/image', e)
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        record_error('/ocr/image', e)
+        logger.error(f"Image OCR error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.post("/predict-rating", response_model=CourseRatingResponse)
 async def predict_course_rating(request: CourseRatingRequest):
     """
@@ -241,25 +1290,12 @@ async def predict_course_rating(request: CourseRatingRequest):
         if 'coursera_regressor' not in models:
             raise HTTPException(status_code=500, detail="Rating prediction model not loaded")
         
-        # Prepare feature
-        feature_array = np.array([[request.feature]])
-        
-        # Scale if available
-        if 'coursera_scaler' in models:
-            feature_array = models['coursera_scaler'].transform(feature_array)
-        
-        # Predict
-        prediction = models['coursera_regressor'].predict(feature_array)[0]
-        
-        # Clamp rating between 0 and 5
-        rating = max(0.0, min(5.0, float(prediction)))
-        
-        return {
-            "predicted_rating": round(rating, 2),
-            "confidence": 85.0  # Based on model RMSE of 0.159
-        }
+        return (await inference_pool.run(predict_rating_batch, [request.feature]))[0]
         
+    except (HTTPException, PoolSaturated, DeadlineExceeded):
+        raise
     except Exception as e:
+        record_error('/predict-rating', e)
         logger.error(f"Rating prediction error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -270,19 +1306,361 @@ async def classify_certificate(features: List[float]):
         if 'classifier' not in models:
             raise HTTPException(status_code=500, detail="Classifier not loaded")
         
-        features_array = np.array(features).reshape(1, -1)
-        prediction = models['classifier'].predict(features_array)[0]
-        probability = models['classifier'].predict_proba(features_array)[0]
-        
-        return {
-            "prediction": int(prediction),
-            "probability": round(float(max(probability)) * 100, 2)
-        }
+        return await predict_one('classify', features)
         
+    except (HTTPException, PoolSaturated, DeadlineExceeded):
+        raise
     except Exception as e:
+        record_error('/classify', e)
         logger.error(f"Classification error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+# Binary request bodies (codec.py): the same scoring as the JSON endpoints
+# above, with the feature matrix decoded straight from the request bytes
+
+FRAUD_COLUMNS = ["fraud_score", "is_fraudulent", "confidence"]
+
+def fraud_columns(results):
+    """Framed fraud columns, plus trees_evaluated for early-exit results"""
+    return FRAUD_COLUMNS + ["trees_evaluated"] if results and "trees_evaluated" in results[0] else FRAUD_COLUMNS
+CLASSIFY_COLUMNS = ["prediction", "probability"]
+
+async def read_matrix(request, fmt, max_rows=None):
+    """(feature matrix, decoded msgpack map or {}) from a frame or msgpack body"""
+    body = await request.body()
+    if fmt == FRAME:
+        matrix, _ = decode_frame(body, max_rows)
+        return matrix, {}
+    payload = decode_msgpack(body)
+    return msgpack_matrix(payload, max_rows=max_rows), payload
+
+def binary_response(request, fmt, payload, rows, columns=None, background=None):
+    """Encode payload in the negotiated format; frames carry `columns` of `rows`"""
+    out = response_format(fmt, request.headers.get("accept"), numeric=columns is not None)
+    if out == FRAME:
+        matrix = np.array([[float(row[c]) for c in columns] for row in rows], dtype=np.float32)
+        body = encode_frame(matrix.reshape(len(rows), len(columns)), columns)
+    elif out == MSGPACK:
+        body = encode_msgpack(payload)
+    else:
+        return JSONResponse(payload, background=background)
+    return Response(body, media_type=CONTENT_TYPES[out], background=background,
+                    headers={"X-Model-Version": str(models.model_version)})
+
+async def handle_binary(endpoint, score):
+    """Common error mapping for the binary handlers"""
+    try:
+        return await score()
+    except (HTTPException, PoolSaturated, DeadlineExceeded):
+        raise
+    except UnsupportedEncoding as e:
+        record_error(endpoint, e)
+        raise HTTPException(status_code=415, detail=str(e))
+    except ValueError as e:
+        # CodecError, and feature widths the model rejects
+        record_error(endpoint, e)
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        record_error(endpoint, e)
+        logger.error(f"Binary scoring error ({endpoint}): {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+def single_row(matrix):
+    if len(matrix) != 1:
+        raise CodecError(f"Expected one feature vector, got {len(matrix)}")
+    return matrix[0]
+
+async def detect_fraud_binary(request, fmt):
+    async def score():
+        if 'fraud_classifier' not in models or 'fraud_scaler' not in models:
+            raise HTTPException(status_code=500, detail="Fraud detection models not loaded")
+        matrix, payload = await read_matrix(request, fmt, max_rows=1)
+        background_tasks = BackgroundTasks()
+        result = await score_fraud_one(single_row(matrix), background_tasks,
+                                       early_exit=use_early_exit(payload.get("early_exit")))
+        result = {**result, "certificate_id": payload.get("certificate_id")}
+        return binary_response(request, fmt, result, [result], fraud_columns([result]), background_tasks)
+    return await handle_binary('/fraud-detection', score)
+
+async def detect_fraud_batch_binary(request, fmt):
+    async def score():
+        if 'fraud_classifier' not in models or 'fraud_scaler' not in models:
+            raise HTTPException(status_code=500, detail="Fraud detection models not loaded")
+        try:
+            matrix, payload = await read_matrix(request, fmt, max_rows=FRAUD_BATCH_MAX_SIZE)
+        except CodecError as e:
+            status = 413 if str(e).startswith("Too many rows") else 400
+            raise HTTPException(status_code=status, detail=str(e))
+        certificate_ids = payload.get("certificate_ids")
+        if certificate_ids is not None and len(certificate_ids) != len(matrix):
+            raise HTTPException(status_code=400, detail="certificate_ids must match the number of feature vectors")
+        early_exit = use_early_exit(payload.get("early_exit"))
+        if drift_monitor is not None and len(matrix):
+            drift_monitor.record_batch('fraud', matrix)
+        results = await inference_pool.run(score_fraud_batch, matrix, certificate_ids, None, early_exit) if len(matrix) else []
+        return binary_response(request, fmt, {"results": results, "count": len(results)}, results,
+                               fraud_columns(results))
+    return await handle_binary('/fraud-detection/batch', score)
+
+async def perform_ocr_binary(request, fmt):
+    async def score():
+        if 'ocr_classifier' not in models:
+            raise HTTPException(status_code=500, detail="OCR models not loaded")
+        matrix, _ = await read_matrix(request, fmt, max_rows=1)
+        result = await predict_one('ocr', single_row(matrix))
+        # Text results cannot be framed: answered in msgpack (or JSON)
+        return binary_response(request, fmt, result, [result])
+    return await handle_binary('/ocr', score)
+
+async def classify_binary(request, fmt):
+    async def score():
+        if 'classifier' not in models:
+            raise HTTPException(status_code=500, detail="Classifier not loaded")
+        matrix, _ = await read_matrix(request, fmt, max_rows=1)
+        result = await predict_one('classify', single_row(matrix))
+        return binary_response(request, fmt, result, [result], CLASSIFY_COLUMNS)
+    return await handle_binary('/classify', score)
+
+BINARY_HANDLERS = {
+    '/fraud-detection': detect_fraud_binary,
+    '/fraud-detection/batch': detect_fraud_batch_binary,
+    '/ocr': perform_ocr_binary,
+    '/classify': classify_binary,
+}
+
+# Streaming scoring (streaming.py): requests pipelined over one WebSocket and
+# scored through the same registry, cache and micro-batching as the REST API
+
+STREAM_MODELS = {
+    'fraud': ['fraud_scaler', 'fraud_classifier'],
+    'ocr': ['ocr_classifier'],
+    'classify': ['classifier'],
+    'rating': ['coursera_regressor'],
+}
+
+def stream_features(request):
+    features = request.get("features")
+    if not isinstance(features, list) or not all(
+        isinstance(value, (int, float)) and not isinstance(value, bool) for value in features
+    ):
+        raise ValueError("'features' must be a list of numbers")
+    return features
+
+async def score_stream_request(request):
+    """
+    Score one streamed request like the matching REST endpoint would
+
+    Optional "priority" and "deadline_ms" fields schedule the request like
+    the X-Request-Priority / X-Request-Deadline-Ms headers do over HTTP.
+    """
+    priority, deadline_ms = request.get("priority"), request.get("deadline_ms")
+    if priority is not None and not isinstance(priority, str):
+        raise ValueError("'priority' must be a string")
+    if deadline_ms is not None and (not isinstance(deadline_ms, (int, float)) or isinstance(deadline_ms, bool)):
+        raise ValueError("'deadline_ms' must be a number")
+    scheduling = parse_scheduling(priority or current_scheduling().priority, deadline_ms)
+    token = set_scheduling(scheduling)
+    try:
+        return await score_stream_model(request)
+    finally:
+        reset_scheduling(token)
+
+async def score_stream_model(request):
+    model = request.get("model", "fraud")
+    if model not in STREAM_MODELS:
+        raise HTTPException(status_code=400, detail=f"Unknown model '{model}' (choose from {', '.join(STREAM_MODELS)})")
+    if any(name not in models for name in STREAM_MODELS[model]):
+        raise HTTPException(status_code=500, detail=f"Models for '{model}' not loaded")
+
+    queues = batchers or stream_batchers
+    if model == 'fraud':
+        result = await score_fraud_one(stream_features(request), queues=queues,
+                                       early_exit=use_early_exit(request.get("early_exit")))
+        result = {**result, "certificate_id": request.get("certificate_id")}
+    elif model == 'rating':
+        feature = request.get("feature")
+        if not isinstance(feature, (int, float)) or isinstance(feature, bool):
+            raise ValueError("'feature' must be a number")
+        result = (await inference_pool.run(predict_rating_batch, [feature]))[0]
+    else:
+        result = await predict_one(model, stream_features(request), queues)
+    metrics.inc(STREAM_REQUESTS, model, "200")
+    return result
+
+def stream_error(error, request):
+    """(status, detail) for a failed streamed request, mirroring the REST status codes"""
+    if isinstance(error, HTTPException):
+        status, detail = error.status_code, error.detail
+    elif isinstance(error, PoolSaturated):
+        status, detail = 503, str(error)
+    elif isinstance(error, DeadlineExceeded):
+        status, detail = 504, str(error)
+    elif isinstance(error, ValueError):
+        status, detail = 400, str(error)
+    else:
+        status, detail = 500, str(error)
+        logger.error(f"Stream scoring error: {error}")
+    if status >= 500:
+        record_error('/ws/score', error)
+    model = request.get("model", "fraud")
+    metrics.inc(STREAM_REQUESTS, model if model in STREAM_MODELS else "unknown", str(status))
+    return status, detail
+
+@app.websocket("/ws/score")
+async def score_stream(websocket: WebSocket):
+    """
+    Persistent scoring stream
+
+    Send request objects (or lists of them) as JSON text or msgpack binary
+    messages; responses arrive as each request completes, tagged with the
+    request's "id". See streaming.py for the message format.
+    """
+    await websocket.accept()
+    STREAM_CONNECTIONS.inc()
+    try:
+        await ScoringStream(websocket, score_stream_request, STREAM_MAX_IN_FLIGHT, stream_error).run()
+    finally:
+        STREAM_CONNECTIONS.dec()
+
+# Asynchronous bulk scoring jobs (jobs.py): submit rows, poll progress,
+# read results as NDJSON
+
+def require_jobs():
+    if job_runner is None:
+        raise HTTPException(status_code=503, detail="Job queue disabled (ML_JOBS_ENABLED=false)")
+    return job_runner
+
+def job_matrix(features, n_features):
+    """Feature rows of a job as a validated (rows, n_features) float64 matrix"""
+    try:
+        matrix = np.asarray(features, dtype=np.float64)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Feature vectors must all have the same length: {e}")
+    if matrix.ndim != 2 or matrix.shape[1] != n_features:
+        raise HTTPException(status_code=400, detail=f"Expected {n_features} features per row")
+    return matrix
+
+async def submit_job(features, certificate_ids, priority, chunk_size, meta):
+    """Validate a bulk scoring request and queue it; returns the 202 response"""
+    runner = require_jobs()
+    if 'fraud_classifier' not in models or 'fraud_scaler' not in models:
+        raise HTTPException(status_code=500, detail="Fraud detection models not loaded")
+    if len(features) == 0:
+        raise HTTPException(status_code=400, detail="A job needs at least one feature vector")
+    if len(features) > JOBS_MAX_ROWS:
+        raise HTTPException(status_code=413, detail=f"Job too large: {len(features)} > {JOBS_MAX_ROWS} rows")
+    if certificate_ids is not None and len(certificate_ids) != len(features):
+        raise HTTPException(status_code=400, detail="certificate_ids must match the number of feature vectors")
+    # Up to JOBS_MAX_ROWS rows: converted off the event loop
+    matrix = await asyncio.to_thread(job_matrix, features, models['fraud_scaler'].n_features_in_)
+    chunk_size = min(max(1, chunk_size or JOBS_CHUNK_SIZE), FRAUD_BATCH_MAX_SIZE)
+    meta = {**meta, "model_version": models.model_version}
+    job = await runner.submit(matrix, certificate_ids, priority, chunk_size, meta)
+    return JSONResponse(status_code=202, content=progress(job), headers={"Location": f"/jobs/{job['job_id']}"})
+
+def parse_job_file(data, filename):
+    """(features, certificate_ids or None) from a CSV or NDJSON file of feature rows"""
+    if filename.lower().endswith((".ndjson", ".jsonl")):
+        rows = [json.loads(line) for line in data.splitlines() if line.strip()]
+        features = [row["features"] if isinstance(row, dict) else row for row in rows]
+        ids = [row.get("certificate_id") for row in rows if isinstance(row, dict)]
+        return features, ids if len(ids) == len(rows) and any(ids) else None
+    frame = pd.read_csv(io.BytesIO(data))
+    ids = None
+    if "certificate_id" in frame.columns:
+        ids = frame.pop("certificate_id").astype(str).tolist()
+    return frame.to_numpy(dtype=np.float64), ids
+
+@app.post("/jobs", status_code=202)
+async def create_job(request: JobRequest):
+    """
+    Queue a bulk fraud scoring job
+
+    Returns the job record with its job_id right away; poll GET /jobs/{id}
+    and read results from GET /jobs/{id}/results.
+    """
+    return await submit_job(request.features, request.certificate_ids, request.priority, request.chunk_size,
+                            {"source": "json"})
+
+@app.post("/jobs/upload", status_code=202)
+async def create_job_from_file(file: UploadFile = File(...), priority: int = 0, chunk_size: Optional[int] = None):
+    """
+    Queue a bulk fraud scoring job from a file of feature rows
+
+    CSV: one numeric column per feature plus an optional certificate_id
+    column. NDJSON (.ndjson / .jsonl): one {"features": [...],
+    "certificate_id": ...} object or bare feature list per line.
+    """
+    require_jobs()
+    data = await read_upload(file, JOBS_MAX_UPLOAD_BYTES, what="File")
+    try:
+        features, certificate_ids = await asyncio.to_thread(parse_job_file, data, file.filename or "")
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Could not parse {file.filename}: {e}")
+    return await submit_job(features, certificate_ids, priority, chunk_size,
+                            {"source": "upload", "filename": file.filename})
+
+@app.get("/jobs")
+async def list_jobs(limit: int = 50):
+    """Most recent jobs and queue statistics"""
+    runner = require_jobs()
+    jobs = await asyncio.to_thread(runner.store.list, min(max(1, limit), 1000))
+    return {"jobs": [progress(job) for job in jobs], "stats": await asyncio.to_thread(runner.stats)}
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str, wait: float = 0.0):
+    """Job status and progress; wait > 0 long-polls up to that many seconds (max 30) for progress"""
+    runner = require_jobs()
+    job = await asyncio.to_thread(runner.store.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job: {job_id}")
+    if wait > 0 and job["status"] not in FINISHED_STATES:
+        await runner.wait_for_change(min(wait, 30.0))
+        job = await asyncio.to_thread(runner.store.get, job_id)
+    return progress(job)
+
+async def job_result_lines(runner, job_id, follow):
+    """NDJSON lines of completed chunks in row order; with follow, until the job finishes"""
+    start = 0
+    while True:
+        ready = await asyncio.to_thread(lambda: list(islice(runner.store.results(job_id, start), 16)))
+        for index, results in ready:
+            yield "".join(json.dumps(result, separators=(",", ":")) + "\n" for result in results)
+            start = index + 1
+        if ready:
+            continue
+        job = await asyncio.to_thread(runner.store.get, job_id)
+        if not follow or job is None or job["status"] in FINISHED_STATES:
+            return
+        await runner.wait_for_change(1.0)
+
+@app.get("/jobs/{job_id}/results")
+async def get_job_results(job_id: str, follow: bool = False):
+    """
+    Results as NDJSON, one line per row in submission order
+
+    Without follow only the rows completed so far are returned; with
+    follow=true the response stays open and streams rows as chunks finish.
+    """
+    runner = require_jobs()
+    job = await asyncio.to_thread(runner.store.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job: {job_id}")
+    return StreamingResponse(
+        job_result_lines(runner, job_id, follow),
+        media_type="application/x-ndjson",
+        headers={"X-Job-Status": job["status"], "X-Rows-Done": str(job["rows_done"])},
+    )
+
+@app.delete("/jobs/{job_id}")
+async def cancel_job(job_id: str):
+    """Cancel a queued or running job; completed chunks stay readable"""
+    runner = require_jobs()
+    job = await asyncio.to_thread(runner.store.cancel, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job: {job_id}")
+    return progress(job)
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -0,0 +1,193 @@
+"""
+Dynamic micro-batching for single-item inference requests
+
+Concurrent requests for the same model are queued and flushed together
+when the queue reaches max_batch_size or the oldest request has waited
+max_wait_ms, whichever comes first. One vectorized call serves the whole
+batch and results are fanned back out to the waiting futures.
+
+Each row keeps the scheduling context (priority, deadline) it was
+submitted with: rows whose deadline has passed are dropped before the
+batch runs, and the batch itself runs at the most urgent priority and the
+latest deadline among its rows.
+"""
+
+import asyncio
+import logging
+import time
+from collections import deque
+
+from inference_pool import PRIORITIES, DeadlineExceeded, Scheduling, current_scheduling, reset_scheduling, set_scheduling
+
+logger = logging.getLogger(__name__)
+
+
+class MicroBatcher:
+    """Coalesce concurrent single-row requests for one model into batches"""
+
+    def __init__(self, name, run_batch, max_batch_size=32, max_wait_ms=2.0, stats_window=1024,
+                 execute=None, passthrough=()):
+        """
+        name: model/queue name used in stats
+        run_batch: callable taking a list of rows and returning one result per row
+        execute: optional coroutine function execute(fn, rows) used to run batches
+                 (e.g. a worker pool); batches run inline when omitted
+        passthrough: exception types that fail the whole batch without a
+                     per-item retry (e.g. pool saturation)
+        """
+        self.name = name
+        self.run_batch = run_batch
+        self.execute = execute
+        self.passthrough = tuple(passthrough)
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+
+        self._pending = []
+        self._timer = None
+
+        # Metrics
+        self._max_depth = 0
+        self._batches = 0
+        self._items = 0
+        self._errors = 0
+        self._expired = 0
+        self._flush_reasons = {"size": 0, "deadline": 0}
+        self._batch_sizes = deque(maxlen=stats_window)
+        self._waits = deque(maxlen=stats_window)
+
+    async def submit(self, row):
+        """Queue one row and wait for its result"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((row, future, time.perf_counter(), current_scheduling()))
+        self._max_depth = max(self._max_depth, len(self._pending))
+
+        if len(self._pending) >= self.max_batch_size:
+            self._flush("size")
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._flush, "deadline")
+
+        return await future
+
+    def _flush(self, reason):
+        """Take up to max_batch_size queued rows and process them as one batch"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        while self._pending:
+            batch = self._pending[:self.max_batch_size]
+            del self._pending[:self.max_batch_size]
+            self._flush_reasons[reason] += 1
+            asyncio.get_running_loop().create_task(self._process(batch))
+            # A deadline flush drains everything; a size flush only full batches
+            if reason == "size" and len(self._pending) < self.max_batch_size:
+                break
+
+        if self._pending and self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.max_wait, self._flush, "deadline")
+
+    async def _process(self, batch):
+        """Run the batch and resolve every waiting future"""
+        started = time.perf_counter()
+        batch = self._drop_expired(batch)
+        if not batch:
+            return
+        rows = [row for row, _, _, _ in batch]
+
+        self._batches += 1
+        self._items += len(batch)
+        self._batch_sizes.append(len(batch))
+        self._waits.extend(started - enqueued for _, _, enqueued, _ in batch)
+
+        token = set_scheduling(self._batch_scheduling(batch))
+        try:
+            results = await self._execute(rows)
+        except self.passthrough as e:
+            self._errors += len(batch)
+            for _, future, _, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        except Exception as e:
+            # Isolate the failure: one bad row must not fail its neighbours
+            logger.warning(f"Batch of {len(rows)} failed for '{self.name}', retrying per item: {e}")
+            await self._process_individually(batch)
+            return
+        finally:
+            reset_scheduling(token)
+
+        for (_, future, _, _), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    def _drop_expired(self, batch):
+        """Fail rows whose deadline passed while queued; returns the rest"""
+        now = time.monotonic()
+        live = []
+        for item in batch:
+            deadline = item[3].deadline
+            if deadline is not None and deadline <= now:
+                self._expired += 1
+                if not item[1].done():
+                    item[1].set_exception(DeadlineExceeded())
+            else:
+                live.append(item)
+        return live
+
+    @staticmethod
+    def _batch_scheduling(batch):
+        """Most urgent priority and latest deadline (None if any row has none) of the batch's rows"""
+        schedulings = [scheduling for _, _, _, scheduling in batch]
+        priority = min((s.priority for s in schedulings), key=PRIORITIES.index)
+        deadlines = [s.deadline for s in schedulings]
+        return Scheduling(priority, None if None in deadlines else max(deadlines))
+
+    async def _process_individually(self, batch):
+        for row, future, _, scheduling in batch:
+            token = set_scheduling(scheduling)
+            try:
+                result = (await self._execute([row]))[0]
+            except Exception as e:
+                self._errors += 1
+                if not future.done():
+                    future.set_exception(e)
+            else:
+                if not future.done():
+                    future.set_result(result)
+            finally:
+                reset_scheduling(token)
+
+    async def _execute(self, rows):
+        if self.execute is not None:
+            return await self.execute(self.run_batch, rows)
+        return self.run_batch(rows)
+
+    def stats(self):
+        """Queue depth, realized batch size and wait time statistics"""
+        batch_sizes = list(self._batch_sizes)
+        waits_ms = sorted(w * 1000 for w in self._waits)
+
+        def percentile(values, q):
+            if not values:
+                return 0.0
+            return round(values[min(len(values) - 1, int(q * len(values)))], 3)
+
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000,
+            "queue_depth": len(self._pending),
+            "max_queue_depth": self._max_depth,
+            "batches": self._batches,
+            "items": self._items,
+            "errors": self._errors,
+            "expired": self._expired,
+            "flush_reasons": dict(self._flush_reasons),
+            "mean_batch_size": round(sum(batch_sizes) / len(batch_sizes), 2) if batch_sizes else 0.0,
+            "wait_ms": {
+                "p50": percentile(waits_ms, 0.50),
+                "p95": percentile(waits_ms, 0.95),
+                "p99": percentile(waits_ms, 0.99),
+                "max": round(waits_ms[-1], 3) if waits_ms else 0.0,
+            },
+        }
@@ -0,0 +1,143 @@
+"""
+Request Encoding Benchmark
+Compares the cost of turning a batch request body into a feature matrix
+for JSON (json + pydantic + ndarray), msgpack with nested lists, msgpack
+with raw float32 bytes and the binary frame, then times the same batch
+end to end against /fraud-detection/batch in-process (ASGI transport).
+
+Run from the ml-service directory:
+    python benchmarks/bench_codec.py
+    python benchmarks/bench_codec.py --rows 100 10000 --skip-endpoint
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import numpy as np
+from pathlib import Path
+
+SERVICE_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(SERVICE_DIR))
+os.chdir(SERVICE_DIR)
+
+import codec  # noqa: E402
+
+
+def time_call(fn, min_seconds=1.0):
+    """Run fn repeatedly for at least min_seconds, return seconds per call"""
+    fn()  # warm-up
+    calls = 0
+    start = time.perf_counter()
+    while True:
+        fn()
+        calls += 1
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_seconds:
+            return elapsed / calls
+
+
+def encodings(matrix):
+    """name -> (body, content type, decoder returning the feature matrix)"""
+    from app import FraudDetectionBatchRequest
+
+    def from_json(body):
+        request = FraudDetectionBatchRequest(**json.loads(body))
+        return np.asarray(request.features, dtype=np.float64)
+
+    out = {"json": (json.dumps({"features": matrix.tolist()}).encode(), "application/json", from_json)}
+    if codec.msgpack is not None:
+        out["msgpack-lists"] = (
+            codec.encode_msgpack({"features": matrix.tolist()}),
+            codec.MSGPACK_CONTENT_TYPE,
+            lambda body: codec.msgpack_matrix(codec.decode_msgpack(body)),
+        )
+        out["msgpack-bytes"] = (
+            codec.encode_msgpack({"features": matrix.tobytes(), "shape": list(matrix.shape)}),
+            codec.MSGPACK_CONTENT_TYPE,
+            lambda body: codec.msgpack_matrix(codec.decode_msgpack(body)),
+        )
+    out["frame"] = (codec.encode_frame(matrix), codec.FRAME_CONTENT_TYPE, lambda body: codec.decode_frame(body)[0])
+    return out
+
+
+async def endpoint_seconds(bodies, min_seconds):
+    """Seconds per /fraud-detection/batch request for each encoding, frame responses where possible"""
+    import httpx
+    import app
+
+    await app.startup_event()
+    results = {}
+    try:
+        transport = httpx.ASGITransport(app=app.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            for name, (body, content_type, _) in bodies.items():
+                headers = {"content-type": content_type}
+                if name == "frame":
+                    headers["accept"] = codec.FRAME_CONTENT_TYPE
+
+                async def post():
+                    response = await client.post("/fraud-detection/batch", content=body, headers=headers)
+                    response.raise_for_status()
+
+                await post()  # warm-up
+                calls = 0
+                start = time.perf_counter()
+                while True:
+                    await post()
+                    calls += 1
+                    elapsed = time.perf_counter() - start
+                    if elapsed >= min_seconds:
+                        break
+                results[name] = elapsed / calls
+    finally:
+        await app.shutdown_event()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark request body encodings")
+    parser.add_argument("--rows", type=int, nargs="+", default=[1, 100, 10000])
+    parser.add_argument("--features", type=int, default=10)
+    parser.add_argument("--min-seconds", type=float, default=1.0)
+    parser.add_argument("--skip-endpoint", action="store_true", help="Only measure decoding")
+    args = parser.parse_args()
+
+    if codec.msgpack is None:
+        print("[!] msgpack is not installed; msgpack encodings are skipped")
+
+    rng = np.random.default_rng(42)
+    print("=" * 72)
+    print("Batch Request Decoding (body -> feature matrix)")
+    print("=" * 72)
+    print(f"{'rows':>8} {'encoding':<16} {'bytes':>12} {'decode us':>12} {'rows/s':>14} {'vs json':>8}")
+
+    largest = None
+    for rows in args.rows:
+        matrix = rng.standard_normal((rows, args.features)).astype(np.float32)
+        bodies = encodings(matrix)
+        baseline = None
+        for name, (body, _, decode) in bodies.items():
+            seconds = time_call(lambda: decode(body), args.min_seconds)
+            baseline = baseline or seconds
+            print(f"{rows:>8} {name:<16} {len(body):>12,} {seconds * 1e6:>12,.1f} "
+                  f"{rows / seconds:>14,.0f} {baseline / seconds:>7.1f}x")
+        largest = bodies
+
+    if args.skip_endpoint:
+        return
+
+    rows = args.rows[-1]
+    print("\n" + "=" * 72)
+    print(f"/fraud-detection/batch end to end, {rows} rows (in-process)")
+    print("=" * 72)
+    print(f"{'encoding':<16} {'ms/request':>12} {'rows/s':>14} {'vs json':>8}")
+    timings = asyncio.run(endpoint_seconds(largest, args.min_seconds))
+    for name, seconds in timings.items():
+        print(f"{name:<16} {seconds * 1e3:>12,.2f} {rows / seconds:>14,.0f} {timings['json'] / seconds:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+"""
+Drift Monitor Overhead Benchmark
+Measures what feature-drift monitoring (drift.py) costs:
+
+  record        per-request cost on the request path (DriftMonitor.record,
+                a bounded deque append), against an empty call
+  update        background flush throughput (sketch + histogram update)
+                for the fraud and OCR input widths, by rows per flush
+  endpoint      /fraud-detection latency percentiles in-process with the
+                monitor off and on (--endpoint-requests 0 to skip)
+
+Run from the ml-service directory:
+    python benchmarks/bench_drift.py
+    python benchmarks/bench_drift.py --calls 1000000 --endpoint-requests 5000
+"""
+
+import os
+import sys
+import time
+import asyncio
+import argparse
+import numpy as np
+from pathlib import Path
+
+SERVICE_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(SERVICE_DIR))
+os.chdir(SERVICE_DIR)
+
+from drift import DriftMonitor, ModelDrift, reference_profile  # noqa: E402
+
+
+def record_overhead(calls, n_features):
+    """(ns per record() call, ns per empty call)"""
+    # No background flushes while timing: they would compete for the GIL
+    monitor = DriftMonitor(flush_seconds=3600, max_pending=calls + 1)
+    row = np.random.default_rng(0).standard_normal(n_features).tolist()
+    record = monitor.record
+
+    def noop(model, features):
+        return True
+
+    timings = {}
+    for label, fn in (("empty", noop), ("record", record)):
+        best = float("inf")
+        for _ in range(3):
+            started = time.perf_counter()
+            for _ in range(calls):
+                fn("fraud", row)
+            best = min(best, time.perf_counter() - started)
+            monitor.flush()
+        timings[label] = best / calls * 1e9
+    monitor.stop()
+    return timings["record"], timings["empty"]
+
+
+def update_throughput(n_features, flush_rows, total_rows, k):
+    """(rows per second, bytes held, seconds to compute scores) for one model's background updates"""
+    rng = np.random.default_rng(1)
+    reference = reference_profile(rng.standard_normal((20000, n_features)))
+    state = ModelDrift("bench", reference, k=k, window_rows=50000)
+    X = rng.standard_normal((total_rows, n_features))
+    started = time.perf_counter()
+    for start in range(0, total_rows, flush_rows):
+        state.update(X[start:start + flush_rows])
+    seconds = time.perf_counter() - started
+    score_started = time.perf_counter()
+    state.scores()
+    return total_rows / seconds, state.nbytes(), time.perf_counter() - score_started
+
+
+async def endpoint_latency(requests, concurrency):
+    import httpx
+    import app
+
+    await app.startup_event()
+    monitor = app.drift_monitor
+    n_features = app.models['fraud_scaler'].n_features_in_
+    rng = np.random.default_rng(2)
+
+    async def run(client):
+        payloads = rng.standard_normal((requests, n_features)).tolist()
+        latencies = []
+        next_index = iter(range(requests))
+
+        async def worker():
+            for i in next_index:
+                started = time.perf_counter()
+                response = await client.post("/fraud-detection", json={"features": payloads[i]})
+                response.raise_for_status()
+                latencies.append((time.perf_counter() - started) * 1000)
+
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        return {q: float(np.percentile(latencies, q)) for q in (50, 99)}
+
+    results = {}
+    try:
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app.app), base_url="http://bench") as client:
+            app.drift_monitor = None
+            await run(client)  # warm-up
+            results["monitor off"] = await run(client)
+            app.drift_monitor = monitor
+            results["monitor on"] = await run(client)
+    finally:
+        app.drift_monitor = monitor
+        await app.shutdown_event()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark drift monitoring overhead")
+    parser.add_argument("--calls", type=int, default=200000, help="record() calls timed")
+    parser.add_argument("--widths", type=int, nargs="+", default=[10, 100], help="Feature counts (fraud, OCR)")
+    parser.add_argument("--flush-rows", type=int, nargs="+", default=[1, 100, 1000])
+    parser.add_argument("--rows", type=int, default=100000, help="Rows per update throughput run")
+    parser.add_argument("--k", type=int, default=200)
+    parser.add_argument("--endpoint-requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    args = parser.parse_args()
+
+    print("=" * 64)
+    print("Drift monitor: request-path cost")
+    print("=" * 64)
+    for width in args.widths:
+        record_ns, empty_ns = record_overhead(args.calls, width)
+        print(f"{width:>4} features: record() {record_ns:>6.0f} ns/call "
+              f"({record_ns - empty_ns:.0f} ns over an empty call)")
+
+    print("\n" + "=" * 64)
+    print(f"Background updates (k={args.k})")
+    print("=" * 64)
+    print(f"{'features':>8} {'rows/flush':>10} {'rows/s':>12} {'us/row':>8} {'memory KB':>10} {'scores ms':>10}")
+    for width in args.widths:
+        for flush_rows in args.flush_rows:
+            rows = min(args.rows, flush_rows * 2000)
+            rate, nbytes, score_seconds = update_throughput(width, flush_rows, rows, args.k)
+            print(f"{width:>8} {flush_rows:>10} {rate:>12,.0f} {1e6 / rate:>8.2f} {nbytes / 1024:>10.1f} "
+                  f"{score_seconds * 1000:>10.2f}")
+
+    if args.endpoint_requests:
+        results = asyncio.run(endpoint_latency(args.endpoint_requests, args.concurrency))
+        print("\n" + "=" * 64)
+        print(f"/fraud-detection, {args.endpoint_requests} requests x {args.concurrency} clients (in-process)")
+        print("=" * 64)
+        for label, latency in results.items():
+            print(f"{label:<12} p50 {latency[50]:>7.2f} ms   p99 {latency[99]:>7.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
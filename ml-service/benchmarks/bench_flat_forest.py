@@ -0,0 +1,76 @@
+"""
+Flat Forest Benchmark
+Compares sklearn predict_proba against the flat array engine
+(forest_engine.FlatForest) at batch sizes from 1 to 10k rows, and checks
+that both produce identical probabilities.
+
+Run from the ml-service directory:
+    python benchmarks/bench_flat_forest.py --model fraud_classifier
+"""
+
+import sys
+import time
+import argparse
+import warnings
+import numpy as np
+from pathlib import Path
+import joblib
+
+SERVICE_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(SERVICE_DIR))
+
+from forest_engine import FlatForest  # noqa: E402
+
+
+def time_call(fn, min_seconds=0.5):
+    """Run fn repeatedly for at least min_seconds, return seconds per call"""
+    fn()  # warm-up
+    calls = 0
+    start = time.perf_counter()
+    while True:
+        fn()
+        calls += 1
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_seconds:
+            return elapsed / calls
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark flat forest inference against sklearn")
+    parser.add_argument("--model", default="fraud_classifier")
+    parser.add_argument("--models-dir", default=str(SERVICE_DIR / "models"))
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 10, 100, 1000, 10000])
+    parser.add_argument("--min-seconds", type=float, default=0.5)
+    args = parser.parse_args()
+
+    warnings.filterwarnings("ignore")
+    forest = joblib.load(Path(args.models_dir) / f"{args.model}.pkl")
+    flat = FlatForest.from_sklearn(forest)
+    predict = "predict_proba" if flat.kind == "classifier" else "predict"
+
+    # Same forest with a fixed accumulation order, for the exactness check
+    serial = joblib.load(Path(args.models_dir) / f"{args.model}.pkl")
+    serial.n_jobs = 1
+
+    rng = np.random.default_rng(42)
+
+    print("=" * 76)
+    print(f"{args.model}: {flat.n_estimators} trees, {flat.n_nodes} nodes, depth {flat.max_depth}")
+    print(f"sklearn n_jobs={forest.n_jobs}; latency per call (ms) and rows/sec")
+    print("=" * 76)
+    print(f"{'batch':>7} {'sklearn ms':>11} {'flat ms':>9} {'sklearn rows/s':>15} {'flat rows/s':>13} {'speedup':>8} {'equal':>6}")
+
+    for batch_size in args.batch_sizes:
+        X = rng.standard_normal((batch_size, flat.n_features_in_)).astype(np.float32)
+
+        equal = np.array_equal(getattr(serial, predict)(X), getattr(flat, predict)(X))
+        sklearn_seconds = time_call(lambda: getattr(forest, predict)(X), args.min_seconds)
+        flat_seconds = time_call(lambda: getattr(flat, predict)(X), args.min_seconds)
+
+        print(f"{batch_size:>7} {sklearn_seconds * 1000:>11.3f} {flat_seconds * 1000:>9.3f} "
+              f"{batch_size / sklearn_seconds:>15,.0f} {batch_size / flat_seconds:>13,.0f} "
+              f"{sklearn_seconds / flat_seconds:>7.1f}x {str(equal):>6}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Fraud Batch Scoring Benchmark
+Compares per-certificate scoring against the vectorized batch path.
+
+Run from the ml-service directory:
+    python benchmarks/bench_fraud_batch.py
+"""
+
+import os
+import sys
+import time
+import argparse
+import numpy as np
+from pathlib import Path
+
+SERVICE_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(SERVICE_DIR))
+os.chdir(SERVICE_DIR)
+
+import app  # noqa: E402
+
+
+def time_call(fn, min_seconds=1.0):
+    """Run fn repeatedly for at least min_seconds, return seconds per call"""
+    fn()  # warm-up
+    calls = 0
+    start = time.perf_counter()
+    while True:
+        fn()
+        calls += 1
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_seconds:
+            return elapsed / calls
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark batch fraud scoring")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 32, 256, 4096])
+    parser.add_argument("--min-seconds", type=float, default=1.0)
+    args = parser.parse_args()
+
+    if not app.load_models():
+        print("[-] Could not load models")
+        sys.exit(1)
+
+    n_features = app.models['fraud_scaler'].n_features_in_
+    rng = np.random.default_rng(42)
+
+    print("=" * 60)
+    print("Fraud Scoring Throughput (certificates/sec)")
+    print("=" * 60)
+    print(f"{'batch':>8} {'per-row':>14} {'batched':>14} {'speedup':>10}")
+
+    for batch_size in args.batch_sizes:
+        rows = rng.standard_normal((batch_size, n_features)).tolist()
+        ids = [f"cert-{i}" for i in range(batch_size)]
+
+        def per_row():
+            for row, certificate_id in zip(rows, ids):
+                app.score_fraud_batch([row], [certificate_id])
+
+        def batched():
+            app.score_fraud_batch(rows, ids)
+
+        # Keep the per-row baseline bounded for large batches
+        per_row_seconds = time_call(per_row, args.min_seconds) if batch_size <= 256 else None
+        batched_seconds = time_call(batched, args.min_seconds)
+
+        batched_rate = batch_size / batched_seconds
+        if per_row_seconds is not None:
+            per_row_rate = batch_size / per_row_seconds
+            print(f"{batch_size:>8} {per_row_rate:>14,.0f} {batched_rate:>14,.0f} {batched_rate / per_row_rate:>9.1f}x")
+        else:
+            print(f"{batch_size:>8} {'-':>14} {batched_rate:>14,.0f} {'-':>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+"""
+Deadline-Aware Scheduling Benchmark
+Measures goodput under overload with and without request scheduling
+(inference_pool.py): interactive /fraud-detection requests arrive open-loop
+at a multiple of the measured capacity, each client giving up after
+--deadline-ms, while closed-loop bulk clients keep /fraud-detection/batch
+busy.
+
+  off   no scheduling headers: one FIFO queue, work runs for clients that
+        already gave up, bulk batches compete with interactive requests
+  on    interactive requests send X-Request-Deadline-Ms, bulk clients send
+        X-Request-Priority: batch, so expired work is dropped and bulk
+        work is queued behind (and shed before) interactive requests
+
+Goodput is interactive responses received with status 200 before the
+client's deadline, per second. A client that gives up does not cancel its
+request; the server keeps working on it, as it would behind a real
+load balancer.
+
+Run from the ml-service directory:
+    python benchmarks/bench_scheduling.py
+    python benchmarks/bench_scheduling.py --overload 3 --deadline-ms 100 --duration 20
+    python benchmarks/bench_scheduling.py --url http://localhost:8000
+"""
+
+import os
+import sys
+import time
+import asyncio
+import argparse
+import numpy as np
+from pathlib import Path
+
+SERVICE_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(SERVICE_DIR))
+os.chdir(SERVICE_DIR)
+
+
+async def calibrate(client, features, seconds):
+    """Sequential interactive requests per second: the service's capacity for this traffic"""
+    done = 0
+    started = time.perf_counter()
+    while time.perf_counter() - started < seconds:
+        response = await client.post("/fraud-detection", json={"features": next(features)})
+        response.raise_for_status()
+        done += 1
+    return done / (time.perf_counter() - started)
+
+
+async def overload(client, features, rate, duration, deadline_ms, bulk_clients, bulk_rows, scheduled):
+    """One open-loop run; returns goodput and outcome counts"""
+    deadline = deadline_ms / 1000.0
+    interactive_headers = {"X-Request-Deadline-Ms": str(deadline_ms)} if scheduled else {}
+    bulk_headers = {"X-Request-Priority": "batch"} if scheduled else {}
+    counts = dict.fromkeys(("on_time", "late", "gave_up", "expired", "shed", "error"), 0)
+    latencies = []
+    bulk = {"rows": 0, "shed": 0}
+    server_tasks = []
+    stop = time.perf_counter() + duration
+
+    async def interactive():
+        started = time.perf_counter()
+        task = asyncio.ensure_future(
+            client.post("/fraud-detection", json={"features": next(features)}, headers=interactive_headers)
+        )
+        server_tasks.append(task)
+        done, _ = await asyncio.wait([task], timeout=deadline)
+        if not done:
+            counts["gave_up"] += 1
+            return
+        status = task.result().status_code
+        elapsed = time.perf_counter() - started
+        if status == 200:
+            counts["on_time" if elapsed <= deadline else "late"] += 1
+            latencies.append(elapsed * 1000)
+        elif status == 504:
+            counts["expired"] += 1
+        elif status == 503:
+            counts["shed"] += 1
+        else:
+            counts["error"] += 1
+
+    async def bulk_client():
+        while time.perf_counter() < stop:
+            rows = [next(features) for _ in range(bulk_rows)]
+            response = await client.post("/fraud-detection/batch", json={"features": rows}, headers=bulk_headers)
+            if response.status_code == 200:
+                bulk["rows"] += bulk_rows
+            else:
+                bulk["shed"] += 1
+                await asyncio.sleep(0.05)
+
+    bulk_tasks = [asyncio.ensure_future(bulk_client()) for _ in range(bulk_clients)]
+    arrivals = []
+    interval = 1.0 / rate
+    next_arrival = time.perf_counter()
+    while next_arrival < stop:
+        arrivals.append(asyncio.ensure_future(interactive()))
+        next_arrival += interval
+        await asyncio.sleep(max(0.0, next_arrival - time.perf_counter()))
+    await asyncio.gather(*arrivals)
+    await asyncio.gather(*bulk_tasks)
+    # Drain work the clients abandoned so it does not spill into the next run
+    await asyncio.gather(*server_tasks, return_exceptions=True)
+
+    return {
+        "sent": len(arrivals),
+        "goodput": counts["on_time"] / duration,
+        "p50_ms": float(np.percentile(latencies, 50)) if latencies else 0.0,
+        "bulk_rows_per_sec": bulk["rows"] / duration,
+        "bulk_shed": bulk["shed"],
+        **counts,
+    }
+
+
+async def run(args):
+    import httpx
+
+    rng = np.random.default_rng(0)
+    service = None
+    if args.url:
+        transport, base_url = None, args.url
+        n_features = args.features
+    else:
+        import app as service
+
+        await service.startup_event()
+        transport, base_url = httpx.ASGITransport(app=service.app), "http://bench"
+        n_features = service.models['fraud_scaler'].n_features_in_
+
+    # Fresh rows every request so the prediction cache does not hide the load
+    features = iter(lambda: rng.standard_normal(n_features).tolist(), None)
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url=base_url, timeout=60, limits=limits) as client:
+            await calibrate(client, features, 1.0)  # warm-up
+            capacity = await calibrate(client, features, args.calibrate_seconds)
+            rate = capacity * args.overload
+            print("=" * 78)
+            print(f"Capacity {capacity:,.0f} req/s; interactive arrivals {rate:,.0f} req/s "
+                  f"(x{args.overload}), deadline {args.deadline_ms} ms,")
+            print(f"{args.bulk_clients} bulk clients x {args.bulk_rows} rows, {args.duration:.0f} s per run"
+                  f" ({'live ' + args.url if args.url else 'in-process'})")
+            print("=" * 78)
+            print(f"{'scheduling':>10} {'sent':>7} {'goodput/s':>10} {'on time':>8} {'late':>6} {'gave up':>8} "
+                  f"{'expired':>8} {'shed':>6} {'p50 ms':>8} {'bulk rows/s':>12}")
+            for scheduled in (False, True):
+                result = await overload(client, features, rate, args.duration, args.deadline_ms,
+                                        args.bulk_clients, args.bulk_rows, scheduled)
+                print(f"{'on' if scheduled else 'off':>10} {result['sent']:>7} {result['goodput']:>10,.1f} "
+                      f"{result['on_time']:>8} {result['late']:>6} {result['gave_up']:>8} {result['expired']:>8} "
+                      f"{result['shed']:>6} {result['p50_ms']:>8.1f} {result['bulk_rows_per_sec']:>12,.0f}")
+    finally:
+        if service is not None:
+            await service.shutdown_event()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark goodput under overload with deadline-aware scheduling")
+    parser.add_argument("--url", help="Benchmark a running service instead of an in-process one")
+    parser.add_argument("--features", type=int, default=10, help="Fraud features per row (with --url)")
+    parser.add_argument("--overload", type=float, default=2.0, help="Arrival rate as a multiple of capacity")
+    parser.add_argument("--deadline-ms", type=int, default=200, help="Interactive client timeout")
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds per run")
+    parser.add_argument("--calibrate-seconds", type=float, default=3.0)
+    parser.add_argument("--bulk-clients", type=int, default=2)
+    parser.add_argument("--bulk-rows", type=int, default=64)
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
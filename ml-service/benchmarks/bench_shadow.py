@@ -0,0 +1,146 @@
+"""
+Shadow Scoring Load Benchmark
+Checks that shadow evaluation never adds latency to the primary fraud
+scoring path: the same concurrent load is run without a shadow model and
+with a deliberately slow candidate, and primary latency percentiles are
+compared. With a slow candidate the bounded shadow queue fills up and
+samples are dropped instead of delaying responses.
+
+The service runs in-process (ASGI transport). A temporary models directory
+serves the current fraud model as the primary and a copy of it as the
+candidate version.
+
+Run from the ml-service directory:
+    python benchmarks/bench_shadow.py --requests 2000 --concurrency 16 --candidate-cost-ms 20
+"""
+
+import os
+import sys
+import time
+import shutil
+import asyncio
+import argparse
+import tempfile
+import numpy as np
+from pathlib import Path
+
+SERVICE_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(SERVICE_DIR))
+
+CANDIDATE_VERSION = "candidate"
+
+
+def prepare_models_dir(source_dir):
+    """Temporary models root: fraud artifacts as the primary plus a candidate version"""
+    root = Path(tempfile.mkdtemp(prefix="bench_shadow_"))
+    (root / CANDIDATE_VERSION).mkdir()
+    for name in ("fraud_classifier.pkl", "fraud_scaler.pkl"):
+        shutil.copy(source_dir / name, root / name)
+        shutil.copy(source_dir / name, root / CANDIDATE_VERSION / name)
+    (root / "CURRENT").write_text("1.0.0\n")
+    return root
+
+
+def slow(score_batch, cost_ms, kind):
+    """Wrap the candidate scorer with extra per-call cost (sleep, or CPU holding the GIL)"""
+    def wrapped(rows):
+        if kind == "cpu":
+            deadline = time.perf_counter() + cost_ms / 1000
+            while time.perf_counter() < deadline:
+                pass
+        else:
+            time.sleep(cost_ms / 1000)
+        return score_batch(rows)
+    return wrapped
+
+
+async def run_load(app, httpx, n_requests, concurrency, n_features, seed):
+    """Send n_requests from `concurrency` clients, return per-request latencies (ms)"""
+    rng = np.random.default_rng(seed)
+    payloads = rng.standard_normal((n_requests, n_features)).tolist()
+    latencies = []
+    errors = 0
+    next_index = iter(range(n_requests))
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app.app), base_url="http://bench") as client:
+        async def worker():
+            nonlocal errors
+            for i in next_index:
+                started = time.perf_counter()
+                response = await client.post("/fraud-detection", json={"features": payloads[i]})
+                latencies.append((time.perf_counter() - started) * 1000)
+                if response.status_code != 200:
+                    errors += 1
+
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return np.array(latencies), errors
+
+
+def summarize(latencies):
+    return {q: float(np.percentile(latencies, q)) for q in (50, 95, 99)}
+
+
+async def main_async(args):
+    import httpx
+    import app
+
+    await app.startup_event()
+    n_features = app.models['fraud_scaler'].n_features_in_
+
+    # Warm-up, then the baseline without a shadow model
+    await run_load(app, httpx, min(200, args.requests), args.concurrency, n_features, seed=0)
+    baseline, baseline_errors = await run_load(app, httpx, args.requests, args.concurrency, n_features, seed=1)
+
+    app.setup_shadow(CANDIDATE_VERSION, sample_rate=args.sample_rate, canary_percent=0.0)
+    app.shadow.score_batch = slow(app.shadow.score_batch, args.candidate_cost_ms, args.candidate_cost_kind)
+    shadowed, shadowed_errors = await run_load(app, httpx, args.requests, args.concurrency, n_features, seed=1)
+    stats = app.shadow.stats()
+    await app.shutdown_event()
+    return baseline, baseline_errors, shadowed, shadowed_errors, stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Verify shadow scoring adds no primary latency under load")
+    parser.add_argument("--models-dir", default=str(SERVICE_DIR / "models"))
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--sample-rate", type=float, default=1.0)
+    parser.add_argument("--candidate-cost-ms", type=float, default=20.0,
+                        help="Extra time per candidate call, to make the shadow model slower than the primary")
+    parser.add_argument("--candidate-cost-kind", choices=["sleep", "cpu"], default="sleep")
+    parser.add_argument("--shadow-queue", type=int, default=64)
+    parser.add_argument("--max-p99-ratio", type=float, default=1.5,
+                        help="Fail if shadowed p99 exceeds baseline p99 by more than this factor")
+    args = parser.parse_args()
+
+    root = prepare_models_dir(Path(args.models_dir))
+    os.environ["ML_MODELS_DIR"] = str(root)
+    os.environ["ML_CACHE_ENABLED"] = "false"
+    os.environ["ML_SHADOW_MAX_QUEUE"] = str(args.shadow_queue)
+    try:
+        baseline, baseline_errors, shadowed, shadowed_errors, stats = asyncio.run(main_async(args))
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+    base, shad = summarize(baseline), summarize(shadowed)
+    print("=" * 64)
+    print(f"Primary /fraud-detection latency, {args.requests} requests x {args.concurrency} clients")
+    print(f"candidate +{args.candidate_cost_ms} ms ({args.candidate_cost_kind}), sample rate {args.sample_rate}, "
+          f"shadow queue {args.shadow_queue}")
+    print("=" * 64)
+    print(f"{'':>10} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7}")
+    print(f"{'baseline':>10} {base[50]:>9.2f} {base[95]:>9.2f} {base[99]:>9.2f} {baseline_errors:>7}")
+    print(f"{'shadowed':>10} {shad[50]:>9.2f} {shad[95]:>9.2f} {shad[99]:>9.2f} {shadowed_errors:>7}")
+    print(f"\nShadow: sampled {stats['sampled']}, scored {stats['scored']}, dropped {stats['dropped']}, "
+          f"max queue depth {stats['max_depth']}/{stats['max_queue']}")
+
+    ratio = shad[99] / base[99] if base[99] > 0 else 1.0
+    if ratio <= args.max_p99_ratio and shadowed_errors == 0:
+        print(f"[+] Primary p99 ratio {ratio:.2f} <= {args.max_p99_ratio}: shadow path stayed off the critical path")
+    else:
+        print(f"[-] Primary p99 ratio {ratio:.2f} > {args.max_p99_ratio} or errors: shadow path added latency")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
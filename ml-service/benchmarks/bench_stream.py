@@ -0,0 +1,112 @@
+"""
+Streaming Scoring Benchmark
+Compares scoring N certificates with one POST /fraud-detection per
+certificate (sequential, and with --concurrency requests in flight)
+against pipelining them over one /ws/score connection, one request per
+message and --per-message requests per message.
+
+By default everything runs in-process (ASGI transport and
+streaming.InProcessConnection, no network); with --url the same runs go
+to a live server, e.g. one started with `python serve.py`.
+
+Run from the ml-service directory:
+    python benchmarks/bench_stream.py
+    python benchmarks/bench_stream.py --url http://localhost:8000 --requests 20000
+"""
+
+import os
+import sys
+import time
+import asyncio
+import argparse
+import numpy as np
+from pathlib import Path
+
+SERVICE_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(SERVICE_DIR))
+os.chdir(SERVICE_DIR)
+
+import httpx  # noqa: E402
+
+from streaming import StreamClient  # noqa: E402
+
+
+async def rest_run(client, rows, concurrency):
+    """Seconds to score rows with one POST each, at most concurrency in flight"""
+    slots = asyncio.Semaphore(concurrency)
+
+    async def post(row):
+        async with slots:
+            response = await client.post("/fraud-detection", json={"features": row})
+            response.raise_for_status()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(post(row) for row in rows))
+    return time.perf_counter() - started
+
+
+async def stream_run(client, rows, per_message):
+    started = time.perf_counter()
+    await client.score_many(rows, per_message=per_message)
+    return time.perf_counter() - started
+
+
+async def run(args):
+    rows = np.random.default_rng(42).standard_normal((args.requests, args.features)).tolist()
+    if args.url:
+        http = httpx.AsyncClient(base_url=args.url, timeout=60)
+        ws_url = args.url.replace("http", "ws", 1).rstrip("/") + "/ws/score"
+        make_stream = lambda binary: StreamClient.connect(ws_url, binary)  # noqa: E731
+        app = None
+    else:
+        import app
+        await app.startup_event()
+        http = httpx.AsyncClient(transport=httpx.ASGITransport(app=app.app), base_url="http://bench", timeout=60)
+        make_stream = lambda binary: StreamClient.in_process(app.app, binary=binary)  # noqa: E731
+
+    # Distinct rows per run, so the prediction cache does not answer repeats
+    def fresh(rows):
+        return (np.asarray(rows) + np.random.default_rng().standard_normal() * 1e-3).tolist()
+
+    timings = {}
+    try:
+        async with http:
+            await rest_run(http, rows[:10], 1)  # warm-up
+            timings["REST sequential"] = await rest_run(http, fresh(rows), 1)
+            timings[f"REST x{args.concurrency} concurrent"] = await rest_run(http, fresh(rows), args.concurrency)
+        async with make_stream(False) as client:
+            await stream_run(client, rows[:10], 1)
+            timings["stream JSON"] = await stream_run(client, fresh(rows), 1)
+            timings[f"stream JSON x{args.per_message}/message"] = await stream_run(client, fresh(rows), args.per_message)
+        async with make_stream(True) as client:
+            timings[f"stream msgpack x{args.per_message}/message"] = await stream_run(
+                client, fresh(rows), args.per_message
+            )
+    finally:
+        if app is not None:
+            await app.shutdown_event()
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark REST vs streaming fraud scoring")
+    parser.add_argument("--url", default=None, help="Live server base URL (default: in-process)")
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--features", type=int, default=10)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--per-message", type=int, default=100)
+    args = parser.parse_args()
+
+    timings = asyncio.run(run(args))
+
+    baseline = next(iter(timings.values()))
+    print("=" * 64)
+    print(f"Fraud scoring, {args.requests} certificates ({args.url or 'in-process'})")
+    print("=" * 64)
+    print(f"{'mode':<32} {'seconds':>9} {'req/s':>10} {'speedup':>9}")
+    for mode, seconds in timings.items():
+        print(f"{mode:<32} {seconds:>9.2f} {args.requests / seconds:>10,.0f} {baseline / seconds:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+"""
+Multi-Worker Serving Benchmark
+Measures per-worker memory and requests/sec as workers go from 1 to the
+core count, for the pre-fork launcher (serve.py) and, for comparison,
+`uvicorn --workers N` which loads models separately in every worker.
+
+Memory is read from /proc/<pid>/smaps_rollup (Linux only):
+  RSS  - resident pages, shared pages counted in full for every worker
+  PSS  - shared pages divided between the processes that map them
+  USS  - pages private to the worker (what an extra worker really costs)
+
+Run from the ml-service directory:
+    python benchmarks/bench_workers.py --mode prefork uvicorn
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import http.client
+import subprocess
+from multiprocessing import Pool
+from pathlib import Path
+
+SERVICE_DIR = Path(__file__).resolve().parents[1]
+
+PAYLOAD = json.dumps({"features": [0.5, 1.2, -0.8, 0.3, 1.1, -0.2, 0.7, 1.8, -1.0, 0.4]})
+
+
+def read_memory(pid):
+    """Return RSS/PSS/USS in MB for one process"""
+    values = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) >= 2 and parts[0].endswith(":") and parts[1].isdigit():
+                values[parts[0][:-1]] = int(parts[1])
+    uss = values.get("Private_Clean", 0) + values.get("Private_Dirty", 0)
+    return {
+        "rss_mb": round(values.get("Rss", 0) / 1024, 1),
+        "pss_mb": round(values.get("Pss", 0) / 1024, 1),
+        "uss_mb": round(uss / 1024, 1),
+    }
+
+
+def child_pids(parent):
+    children = []
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                # Field 4 is the parent pid; the command name may contain spaces
+                fields = f.read().rsplit(")", 1)[1].split()
+            if int(fields[1]) == parent:
+                children.append(int(entry))
+        except (OSError, IndexError, ValueError):
+            continue
+    return children
+
+
+def wait_healthy(port, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=2)
+            conn.request("GET", "/health")
+            if conn.getresponse().status == 200:
+                return True
+        except OSError:
+            pass
+        time.sleep(0.25)
+    return False
+
+
+def client_loop(args):
+    """One load-generating client: sequential keep-alive requests"""
+    port, duration = args
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+    headers = {"Content-Type": "application/json"}
+    done = 0
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        conn.request("POST", "/fraud-detection", body=PAYLOAD, headers=headers)
+        response = conn.getresponse()
+        response.read()
+        if response.status == 200:
+            done += 1
+    return done
+
+
+def start_server(mode, workers, port):
+    if mode == "prefork":
+        command = [sys.executable, "serve.py", "--workers", str(workers), "--port", str(port), "--log-level", "warning"]
+    else:
+        command = [sys.executable, "-m", "uvicorn", "app:app", "--workers", str(workers),
+                   "--port", str(port), "--log-level", "warning"]
+    return subprocess.Popen(command, cwd=SERVICE_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def measure(mode, workers, port, clients, duration):
+    server = start_server(mode, workers, port)
+    try:
+        if not wait_healthy(port):
+            raise RuntimeError(f"{mode} server with {workers} workers did not become healthy")
+        # Let every worker finish startup before sampling memory
+        time.sleep(2)
+
+        with Pool(clients) as pool:
+            counts = pool.map(client_loop, [(port, duration)] * clients)
+
+        worker_memory = [read_memory(pid) for pid in child_pids(server.pid)]
+        worker_memory = [m for m in worker_memory if m["rss_mb"] > 20]  # skip helper processes
+        parent_memory = read_memory(server.pid)
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+    if not worker_memory:
+        # `uvicorn --workers 1` serves from the parent process itself
+        worker_memory, parent_memory = [parent_memory], {"rss_mb": 0.0, "pss_mb": 0.0, "uss_mb": 0.0}
+
+    n = len(worker_memory)
+    return {
+        "mode": mode,
+        "workers": workers,
+        "requests_per_sec": round(sum(counts) / duration, 1),
+        "parent": parent_memory,
+        "worker_rss_mb": round(sum(m["rss_mb"] for m in worker_memory) / n, 1),
+        "worker_pss_mb": round(sum(m["pss_mb"] for m in worker_memory) / n, 1),
+        "worker_uss_mb": round(sum(m["uss_mb"] for m in worker_memory) / n, 1),
+        "total_pss_mb": round(parent_memory["pss_mb"] + sum(m["pss_mb"] for m in worker_memory), 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark multi-worker serving")
+    parser.add_argument("--mode", nargs="+", default=["prefork", "uvicorn"], choices=["prefork", "uvicorn"])
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count())
+    parser.add_argument("--clients", type=int, default=2 * (os.cpu_count() or 1))
+    parser.add_argument("--duration", type=float, default=5.0)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--output", help="Write results as JSON")
+    args = parser.parse_args()
+
+    if not Path("/proc/self/smaps_rollup").exists():
+        print("[-] /proc/<pid>/smaps_rollup not available; this benchmark needs Linux")
+        sys.exit(1)
+
+    worker_counts = sorted({1, 2, 4, 8, 16, 32, args.max_workers} & set(range(1, args.max_workers + 1)))
+    results = []
+
+    print("=" * 78)
+    print("Multi-Worker Serving: memory per worker and throughput")
+    print("=" * 78)
+    print(f"{'mode':>8} {'workers':>8} {'req/s':>10} {'RSS/wkr':>10} {'PSS/wkr':>10} {'USS/wkr':>10} {'total PSS':>10}")
+
+    for mode in args.mode:
+        for workers in worker_counts:
+            result = measure(mode, workers, args.port, args.clients, args.duration)
+            results.append(result)
+            print(f"{mode:>8} {workers:>8} {result['requests_per_sec']:>10,.1f} "
+                  f"{result['worker_rss_mb']:>9.1f}M {result['worker_pss_mb']:>9.1f}M "
+                  f"{result['worker_uss_mb']:>9.1f}M {result['total_pss_mb']:>9.1f}M")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\n[+] Results: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
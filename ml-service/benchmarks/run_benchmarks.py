@@ -0,0 +1,365 @@
+"""
+Service Benchmark Suite
+Load test of the scoring endpoints plus model-level microbenchmarks, with
+results stored as JSON and compared against a baseline run.
+
+Load test: closed-loop clients send a weighted mix of /fraud-detection,
+/ocr, /classify and /predict-rating requests for a fixed duration at each
+concurrency level, and throughput and p50/p95/p99 latency are reported
+overall and per endpoint. The service runs either in-process (ASGI
+transport, no network) or as a subprocess (serve.py or uvicorn) driven
+over HTTP.
+
+Microbenchmarks: scaler transform + predict_proba (predict for the rating
+regressor) per batch size, on the same artifacts the service loads.
+
+With --baseline, every latency that grew, or throughput that dropped, by
+more than --max-regression is reported and the exit status is 1, so a
+retrain or dependency upgrade can be checked before deploy.
+
+Run from the ml-service directory:
+    python benchmarks/run_benchmarks.py --output bench.json
+    python benchmarks/run_benchmarks.py --mode subprocess --workers 2 --baseline bench.json
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import logging
+import asyncio
+import argparse
+import platform
+import subprocess
+import numpy as np
+from pathlib import Path
+
+SERVICE_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(SERVICE_DIR))
+
+ENDPOINTS = ["/fraud-detection", "/ocr", "/classify", "/predict-rating"]
+DEFAULT_MIX = "fraud-detection=70,ocr=10,classify=10,predict-rating=10"
+
+# family -> (scaler artifact or None, model artifact, method)
+MICRO_MODELS = {
+    "fraud": ("fraud_scaler", "fraud_classifier", "predict_proba"),
+    "ocr": ("ocr_scaler", "ocr_classifier", "predict_proba"),
+    "classify": (None, "classifier", "predict_proba"),
+    "rating": ("coursera_scaler", "coursera_regressor", "predict"),
+}
+
+
+def parse_mix(text):
+    """'fraud-detection=70,ocr=10' -> {'/fraud-detection': 70.0, '/ocr': 10.0}"""
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        endpoint = "/" + name.strip().lstrip("/")
+        if endpoint not in ENDPOINTS:
+            raise ValueError(f"Unknown endpoint in mix: {name} (choose from {', '.join(ENDPOINTS)})")
+        mix[endpoint] = float(weight or 1)
+    return mix
+
+
+def input_width(model):
+    return getattr(model, "n_features_in_", None)
+
+
+def payload_factory(registry, seed):
+    """Callable(endpoint) -> JSON body with a random input of the width each model expects"""
+    rng = np.random.default_rng(seed)
+    widths = {
+        "/fraud-detection": input_width(registry.get("fraud_scaler") or registry.get("fraud_classifier")),
+        "/ocr": input_width(registry.get("ocr_scaler") or registry.get("ocr_classifier")),
+        "/classify": input_width(registry.get("classifier")),
+    }
+
+    def make(endpoint):
+        if endpoint == "/predict-rating":
+            return {"feature": float(rng.uniform(0, 5))}
+        row = rng.standard_normal(widths[endpoint] or 10).round(6).tolist()
+        # /classify takes the feature list itself as the body
+        return row if endpoint == "/classify" else {"features": row}
+
+    return make
+
+
+def summarize(latencies, errors, duration):
+    latencies = np.asarray(latencies)
+    if len(latencies) == 0:
+        return {"requests": 0, "errors": errors, "throughput_rps": 0.0}
+    return {
+        "requests": int(len(latencies)),
+        "errors": errors,
+        "throughput_rps": round(len(latencies) / duration, 1),
+        "mean_ms": round(float(latencies.mean()), 3),
+        "p50_ms": round(float(np.percentile(latencies, 50)), 3),
+        "p95_ms": round(float(np.percentile(latencies, 95)), 3),
+        "p99_ms": round(float(np.percentile(latencies, 99)), 3),
+        "max_ms": round(float(latencies.max()), 3),
+    }
+
+
+async def run_load(client, mix, make_payload, concurrency, duration, seed):
+    """Closed-loop load: `concurrency` clients send requests back to back for `duration` seconds"""
+    endpoints, weights = list(mix), list(mix.values())
+    latencies = {endpoint: [] for endpoint in endpoints}
+    errors = {endpoint: 0 for endpoint in endpoints}
+    chooser = random.Random(seed)
+    deadline = time.perf_counter() + duration
+
+    async def worker():
+        while time.perf_counter() < deadline:
+            endpoint = chooser.choices(endpoints, weights)[0]
+            body = make_payload(endpoint)
+            started = time.perf_counter()
+            try:
+                response = await client.post(endpoint, json=body)
+                ok = response.status_code == 200
+            except Exception:
+                ok = False
+            if ok:
+                latencies[endpoint].append((time.perf_counter() - started) * 1000)
+            else:
+                errors[endpoint] += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    everything = [value for values in latencies.values() for value in values]
+    return {
+        "concurrency": concurrency,
+        "duration_s": round(elapsed, 2),
+        "overall": summarize(everything, sum(errors.values()), elapsed),
+        "endpoints": {endpoint: summarize(latencies[endpoint], errors[endpoint], elapsed) for endpoint in endpoints},
+    }
+
+
+def wait_healthy(base_url, timeout=60):
+    import httpx
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if httpx.get(f"{base_url}/health", timeout=2).status_code == 200:
+                return True
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.25)
+    return False
+
+
+def start_server(server, workers, port):
+    if server == "prefork":
+        command = [sys.executable, "serve.py", "--workers", str(workers), "--port", str(port), "--log-level", "warning"]
+    else:
+        command = [sys.executable, "-m", "uvicorn", "app:app", "--workers", str(workers),
+                   "--port", str(port), "--log-level", "warning"]
+    return subprocess.Popen(command, cwd=SERVICE_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+async def load_suite(args, service, mix):
+    import httpx
+
+    limits = httpx.Limits(max_connections=max(args.concurrency), max_keepalive_connections=max(args.concurrency))
+    if args.mode == "inprocess":
+        await service.startup_event()
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=service.app), base_url="http://bench")
+    else:
+        client = httpx.AsyncClient(base_url=f"http://127.0.0.1:{args.port}", limits=limits, timeout=30)
+
+    make_payload = payload_factory(service.models, args.seed)
+    runs = []
+    try:
+        async with client:
+            if args.warmup > 0:
+                await run_load(client, mix, make_payload, max(args.concurrency), args.warmup, args.seed)
+            for concurrency in args.concurrency:
+                run = await run_load(client, mix, make_payload, concurrency, args.duration, args.seed)
+                runs.append(run)
+                overall = run["overall"]
+                print(f"  c={concurrency:<4} {overall.get('throughput_rps', 0):>9.1f} req/s  "
+                      f"p50 {overall.get('p50_ms', 0):>8.2f}  p95 {overall.get('p95_ms', 0):>8.2f}  "
+                      f"p99 {overall.get('p99_ms', 0):>8.2f} ms  errors {overall['errors']}")
+    finally:
+        if args.mode == "inprocess":
+            await service.shutdown_event()
+    return runs
+
+
+def time_call(fn, min_seconds=0.5):
+    """Run fn repeatedly for at least min_seconds, return seconds per call"""
+    fn()  # warm-up
+    calls = 0
+    start = time.perf_counter()
+    while True:
+        fn()
+        calls += 1
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_seconds:
+            return elapsed / calls
+
+
+def micro_suite(registry, batch_sizes, min_seconds, seed):
+    """Scaler + model call per batch size for every loaded model family"""
+    rng = np.random.default_rng(seed)
+    results = []
+    for family, (scaler_name, model_name, method) in MICRO_MODELS.items():
+        if model_name not in registry:
+            print(f"  {family:<9} skipped ({model_name} not available)")
+            continue
+        scaler = registry[scaler_name] if scaler_name and scaler_name in registry else None
+        model = registry[model_name]
+        width = input_width(scaler or model) or 10
+        predict = getattr(model, method)
+        for batch_size in batch_sizes:
+            X = rng.standard_normal((batch_size, width))
+
+            def call():
+                predict(scaler.transform(X) if scaler is not None else X)
+
+            seconds = time_call(call, min_seconds)
+            results.append({
+                "model": family,
+                "batch_size": batch_size,
+                "ms_per_call": round(seconds * 1000, 4),
+                "us_per_row": round(seconds * 1e6 / batch_size, 3),
+                "rows_per_s": round(batch_size / seconds, 1),
+            })
+            print(f"  {family:<9} batch {batch_size:>6}  {seconds * 1000:>10.3f} ms/call  "
+                  f"{seconds * 1e6 / batch_size:>9.2f} us/row")
+    return results
+
+
+def environment(args):
+    import sklearn
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=SERVICE_DIR,
+                                capture_output=True, text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "git_commit": commit,
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "scikit_learn": sklearn.__version__,
+        "cpu_count": os.cpu_count(),
+        "mode": args.mode,
+        "server": args.server if args.mode == "subprocess" else None,
+        "workers": args.workers if args.mode == "subprocess" else None,
+        "mix": args.mix,
+    }
+
+
+def compare(current, baseline, max_regression):
+    """Regressions beyond max_regression (fraction) as human-readable lines"""
+    problems = []
+
+    def check(label, new, old, higher_is_worse=True):
+        if new is None or old is None or old <= 0:
+            return
+        change = (new - old) / old if higher_is_worse else (old - new) / old
+        if change > max_regression:
+            problems.append(f"{label}: {old} -> {new} ({change:+.0%})")
+
+    base_runs = {run["concurrency"]: run for run in baseline.get("load", [])}
+    for run in current.get("load", []):
+        old_run = base_runs.get(run["concurrency"])
+        if old_run is None:
+            continue
+        for endpoint, stats in [("overall", run["overall"]), *run["endpoints"].items()]:
+            old = old_run["overall"] if endpoint == "overall" else old_run["endpoints"].get(endpoint)
+            if not old:
+                continue
+            prefix = f"c={run['concurrency']} {endpoint}"
+            check(f"{prefix} p99_ms", stats.get("p99_ms"), old.get("p99_ms"))
+            check(f"{prefix} p50_ms", stats.get("p50_ms"), old.get("p50_ms"))
+            check(f"{prefix} throughput_rps", stats.get("throughput_rps"), old.get("throughput_rps"),
+                  higher_is_worse=False)
+
+    base_micro = {(m["model"], m["batch_size"]): m for m in baseline.get("micro", [])}
+    for entry in current.get("micro", []):
+        old = base_micro.get((entry["model"], entry["batch_size"]))
+        if old:
+            check(f"micro {entry['model']} batch {entry['batch_size']} ms_per_call",
+                  entry["ms_per_call"], old["ms_per_call"])
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the ML service and benchmark its models")
+    parser.add_argument("--mode", choices=["inprocess", "subprocess"], default="inprocess")
+    parser.add_argument("--server", choices=["prefork", "uvicorn"], default="prefork",
+                        help="Launcher for --mode subprocess")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds per concurrency level")
+    parser.add_argument("--warmup", type=float, default=2.0)
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="Weighted endpoint mix, e.g. fraud-detection=1,ocr=1")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 8, 64, 512, 4096])
+    parser.add_argument("--min-seconds", type=float, default=0.5, help="Minimum time per microbenchmark")
+    parser.add_argument("--skip-load", action="store_true")
+    parser.add_argument("--skip-micro", action="store_true")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None, help="Write results as JSON")
+    parser.add_argument("--baseline", default=None, help="Previous results JSON to compare against")
+    parser.add_argument("--max-regression", type=float, default=0.15,
+                        help="Allowed relative slowdown before a metric counts as a regression")
+    args = parser.parse_args()
+    mix = parse_mix(args.mix)
+
+    os.chdir(SERVICE_DIR)
+    if args.mode == "inprocess":
+        # Measure the models, not the cache: repeated payloads would be served from it
+        os.environ.setdefault("ML_CACHE_ENABLED", "false")
+    import app as service
+
+    # httpx logs every request at INFO under the service's logging config
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    results = {"environment": environment(args), "load": [], "micro": []}
+    server = None
+    try:
+        if not args.skip_load:
+            print("=" * 72)
+            print(f"Load test ({args.mode}), {args.duration:.0f}s per level, mix {args.mix}")
+            print("=" * 72)
+            if args.mode == "subprocess":
+                server = start_server(args.server, args.workers, args.port)
+                if not wait_healthy(f"http://127.0.0.1:{args.port}"):
+                    raise RuntimeError(f"{args.server} server did not become healthy")
+            results["load"] = asyncio.run(load_suite(args, service, mix))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=30)
+
+    # After the server has stopped, so it does not compete for cores
+    if not args.skip_micro:
+        print("\n" + "=" * 72)
+        print("Model microbenchmarks (scaler + model call)")
+        print("=" * 72)
+        results["micro"] = micro_suite(service.models, args.batch_sizes, args.min_seconds, args.seed)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\n[+] Results: {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        problems = compare(results, baseline, args.max_regression)
+        print(f"\nCompared with {args.baseline} (commit {baseline['environment'].get('git_commit')}), "
+              f"threshold {args.max_regression:.0%}")
+        if problems:
+            for line in problems:
+                print(f"[-] {line}")
+            sys.exit(1)
+        print("[+] No regressions")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+"""
+Compact request/response encodings for the scoring endpoints
+
+JSON stays the default. High-volume clients can instead send:
+
+  application/vnd.bcvs.frame   a little-endian numeric matrix behind a
+                               16-byte header, decoded with np.frombuffer
+                               as a read-only view of the request body
+                               (no per-float parsing or copying)
+  application/msgpack          a msgpack map with the same fields as the
+                               JSON body; "features" may also be raw
+                               float32 bytes plus a "shape"
+
+Frame layout (all little-endian):
+
+  offset  size  field
+  0       4     magic b"BCVF"
+  4       1     format version (1)
+  5       1     dtype code: 1 = float32, 2 = float64
+  6       2     length of the column-name block in bytes (0 = none)
+  8       4     rows
+  12      4     columns
+  16      n     column names, UTF-8, comma separated (optional)
+  16 + n        rows * columns values, row-major
+
+Responses use the request's encoding unless the Accept header names
+another supported one. Frames carry numeric columns only, so endpoints
+with text results (OCR) answer frame requests in msgpack, or in JSON
+when msgpack is not installed.
+"""
+
+import json
+import struct
+
+import numpy as np
+
+try:
+    import msgpack
+except ImportError:  # optional: only needed for application/msgpack bodies
+    msgpack = None
+
+JSON = "json"
+FRAME = "frame"
+MSGPACK = "msgpack"
+
+FRAME_CONTENT_TYPE = "application/vnd.bcvs.frame"
+MSGPACK_CONTENT_TYPE = "application/msgpack"
+CONTENT_TYPES = {
+    JSON: "application/json",
+    FRAME: FRAME_CONTENT_TYPE,
+    MSGPACK: MSGPACK_CONTENT_TYPE,
+}
+_MEDIA_TYPES = {
+    "application/json": JSON,
+    FRAME_CONTENT_TYPE: FRAME,
+    MSGPACK_CONTENT_TYPE: MSGPACK,
+    "application/x-msgpack": MSGPACK,
+}
+
+MAGIC = b"BCVF"
+VERSION = 1
+HEADER = struct.Struct("<4sBBHII")
+DTYPES = {1: np.dtype("<f4"), 2: np.dtype("<f8")}
+DTYPE_CODES = {dtype: code for code, dtype in DTYPES.items()}
+
+
+class CodecError(ValueError):
+    """Malformed binary payload"""
+
+
+class UnsupportedEncoding(CodecError):
+    """Payload encoding that this service cannot read (e.g. msgpack not installed)"""
+
+
+def media_format(content_type):
+    """JSON, FRAME or MSGPACK for a Content-Type header value, None if unknown"""
+    if not content_type:
+        return JSON
+    media = content_type.split(";", 1)[0].strip().lower()
+    if media.endswith("+json"):
+        return JSON
+    return _MEDIA_TYPES.get(media)
+
+
+def response_format(request_format, accept, numeric=True):
+    """
+    Encoding of the response: the first supported type in Accept, else the
+    request's own. Non-numeric results cannot be framed.
+    """
+    chosen = request_format
+    for part in (accept or "").split(","):
+        candidate = media_format(part) if part.strip() and "*" not in part else None
+        if candidate is not None:
+            chosen = candidate
+            break
+    if chosen == MSGPACK and msgpack is None:
+        chosen = JSON
+    if chosen == FRAME and not numeric:
+        chosen = MSGPACK if msgpack is not None else JSON
+    return chosen
+
+
+def decode_frame(body, max_rows=None):
+    """(matrix, column names or None) from a frame; the matrix is a view of body"""
+    if len(body) < HEADER.size:
+        raise CodecError(f"Frame too short: {len(body)} bytes")
+    magic, version, dtype_code, names_length, rows, cols = HEADER.unpack_from(body)
+    if magic != MAGIC:
+        raise CodecError("Not a frame: bad magic")
+    if version != VERSION:
+        raise CodecError(f"Unsupported frame version {version}")
+    dtype = DTYPES.get(dtype_code)
+    if dtype is None:
+        raise CodecError(f"Unsupported frame dtype code {dtype_code}")
+    if max_rows is not None and rows > max_rows:
+        raise CodecError(f"Too many rows: {rows} > {max_rows}")
+    offset = HEADER.size + names_length
+    expected = offset + rows * cols * dtype.itemsize
+    if len(body) != expected:
+        raise CodecError(f"Frame length {len(body)} does not match header ({expected} bytes)")
+    columns = bytes(body[HEADER.size:offset]).decode("utf-8").split(",") if names_length else None
+    matrix = np.frombuffer(body, dtype=dtype, count=rows * cols, offset=offset).reshape(rows, cols)
+    return matrix, columns
+
+
+def encode_frame(matrix, columns=None, dtype=np.float32):
+    """Frame bytes for a 2-D numeric matrix"""
+    dtype = np.dtype(dtype).newbyteorder("<")
+    matrix = np.ascontiguousarray(matrix, dtype=dtype)
+    if matrix.ndim != 2:
+        raise CodecError("Frames hold 2-D matrices")
+    names = ",".join(columns).encode("utf-8") if columns else b""
+    header = HEADER.pack(MAGIC, VERSION, DTYPE_CODES[dtype], len(names), matrix.shape[0], matrix.shape[1])
+    return b"".join([header, names, matrix.tobytes()])
+
+
+def decode_msgpack(body, allow_list=False):
+    """Decoded msgpack map (or, with allow_list, a list of maps)"""
+    if msgpack is None:
+        raise UnsupportedEncoding("msgpack bodies need the msgpack package (pip install msgpack)")
+    try:
+        payload = msgpack.unpackb(body, raw=False)
+    except Exception as e:
+        raise CodecError(f"Invalid msgpack body: {e}") from e
+    if not isinstance(payload, dict) and not (allow_list and isinstance(payload, list)):
+        raise CodecError("msgpack body must be a map")
+    return payload
+
+
+def encode_msgpack(payload):
+    return msgpack.packb(payload, use_bin_type=True)
+
+
+def msgpack_matrix(payload, key="features", max_rows=None):
+    """
+    Feature matrix from a decoded msgpack map
+
+    payload[key] is either nested lists (like JSON) or raw little-endian
+    bytes with payload["shape"] = [rows, cols] and optional payload["dtype"]
+    ("float32" default, or "float64"); the bytes form is decoded without copying.
+    """
+    value = payload.get(key)
+    if value is None:
+        raise CodecError(f"Missing '{key}'")
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        shape = payload.get("shape")
+        if not isinstance(shape, (list, tuple)) or len(shape) != 2:
+            raise CodecError("Binary features need a 'shape' of [rows, cols]")
+        try:
+            rows, cols = (int(n) for n in shape)
+            dtype = np.dtype(payload.get("dtype", "float32")).newbyteorder("<")
+        except (TypeError, ValueError) as e:
+            raise CodecError(f"Invalid 'shape' or 'dtype': {e}") from e
+        if rows < 0 or cols < 0:
+            raise CodecError("'shape' must not be negative")
+        if dtype not in DTYPE_CODES:
+            raise CodecError(f"Unsupported dtype {payload.get('dtype')}")
+        if len(value) != rows * cols * dtype.itemsize:
+            raise CodecError("Binary features do not match 'shape'")
+        matrix = np.frombuffer(value, dtype=dtype).reshape(rows, cols)
+    else:
+        try:
+            matrix = np.asarray(value, dtype=np.float32)
+        except (TypeError, ValueError) as e:
+            raise CodecError(f"'{key}' must be numeric: {e}") from e
+        if matrix.ndim == 1:
+            matrix = matrix.reshape(1, -1)
+    if matrix.ndim != 2:
+        raise CodecError(f"'{key}' must be a vector or a 2-D matrix")
+    if max_rows is not None and len(matrix) > max_rows:
+        raise CodecError(f"Too many rows: {len(matrix)} > {max_rows}")
+    return matrix
+
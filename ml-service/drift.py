@@ -0,0 +1,528 @@
+"""
+Online feature-drift monitoring
+
+Live feature vectors are compared, per model, against a reference profile
+of the training features saved by scripts/train_models.py, in bounded
+memory:
+
+  QuantileSketch   a KLL-style mergeable quantile sketch over every column
+                   of a feature matrix at once. Level h holds items of
+                   weight 2**h; a full level is sorted (per column) and
+                   every other item is promoted to the next level, so a
+                   sketch keeps about 3k values per feature however many
+                   rows it has seen, with a rank error of a few 1/k.
+  histograms       exact counts over the reference's quantile bins, plus
+                   one bin for NaN, for the population stability index.
+
+PSI comes from the histograms; KS is the largest gap between the live CDF
+(from the sketch) and the reference CDF over the reference's quantile
+grid.
+
+DriftMonitor keeps this work off the request path: record() only appends
+the feature vector to a bounded deque (when it is full the sample is
+dropped), and a background thread drains it every flush interval,
+stacking the rows of each model and updating its sketch and histograms in
+a few vectorized calls. Scores cover the current window of rows plus the
+previous one, i.e. between window_rows and 2 * window_rows recent rows.
+"""
+
+import json
+import logging
+import math
+import os
+import random
+import threading
+import time
+from collections import deque
+from pathlib import Path
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+PROFILE_VERSION = 1
+REFERENCE_FILE = "drift_reference.json"
+# Floor for empty bins, so PSI stays finite
+PSI_EPSILON = 1e-4
+SUMMARY_QUANTILES = {"p05": 0.05, "p50": 0.50, "p95": 0.95}
+
+
+class QuantileSketch:
+    """KLL-style quantile sketch over the columns of a (rows, n_features) matrix"""
+
+    def __init__(self, n_features, k=200, seed=None):
+        self.n_features = int(n_features)
+        self.k = int(k)
+        self.count = 0
+        self.levels = [np.empty((0, self.n_features))]
+        self._rng = np.random.default_rng(seed)
+
+    def _capacity(self, level):
+        depth = len(self.levels) - 1 - level
+        return max(2, int(math.ceil(self.k * (2 / 3) ** depth)))
+
+    def update(self, X):
+        X = np.asarray(X, dtype=np.float64).reshape(-1, self.n_features)
+        if len(X):
+            self.levels[0] = np.concatenate([self.levels[0], X])
+            self.count += len(X)
+            self._compress()
+
+    def merge(self, other):
+        """Add the contents of another sketch of the same width (in place)"""
+        for level, items in enumerate(other.levels):
+            if level == len(self.levels):
+                self.levels.append(np.empty((0, self.n_features)))
+            self.levels[level] = np.concatenate([self.levels[level], items])
+        self.count += other.count
+        self._compress()
+        return self
+
+    def copy(self):
+        sketch = QuantileSketch(self.n_features, self.k)
+        sketch.count = self.count
+        sketch.levels = [items.copy() for items in self.levels]
+        return sketch
+
+    def _compress(self):
+        level = 0
+        while level < len(self.levels):
+            items = self.levels[level]
+            if len(items) <= self._capacity(level):
+                level += 1
+                continue
+            if level + 1 == len(self.levels):
+                self.levels.append(np.empty((0, self.n_features)))
+            # Sorting every column on its own keeps the columns independent sketches
+            items = np.sort(items, axis=0)
+            paired = len(items) - len(items) % 2
+            offset = int(self._rng.integers(2))
+            self.levels[level + 1] = np.concatenate([self.levels[level + 1], items[offset:paired:2]])
+            self.levels[level] = items[paired:]
+            # A new top level lowers the capacity of the ones below: recheck from the bottom
+            level = 0
+
+    def nbytes(self):
+        return sum(items.nbytes for items in self.levels)
+
+    def weighted(self):
+        """WeightedColumns view for CDF and quantile queries"""
+        items = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(level), 2.0 ** h) for h, level in enumerate(self.levels)])
+        return WeightedColumns(items, weights)
+
+
+class WeightedColumns:
+    """Weighted values per column, sorted once for CDF and quantile queries (NaNs ignored)"""
+
+    def __init__(self, items, weights=None):
+        items = np.asarray(items, dtype=np.float64)
+        weights = np.ones(len(items)) if weights is None else np.asarray(weights, dtype=np.float64)
+        order = np.argsort(items, axis=0, kind="stable")
+        self.items = np.take_along_axis(items, order, axis=0)
+        # NaNs sort last and carry no weight
+        sorted_weights = np.where(np.isnan(self.items), 0.0, weights[order])
+        self.cumulative = np.concatenate([np.zeros((1, items.shape[1])), np.cumsum(sorted_weights, axis=0)])
+        self.totals = self.cumulative[-1]
+        self.weight = float(weights.sum())
+
+    def cdf(self, j, points, strict=False):
+        """Fraction of column j's values <= points (< points when strict)"""
+        if not self.totals[j]:
+            return np.full(len(points), np.nan)
+        index = np.searchsorted(self.items[:, j], points, side="left" if strict else "right")
+        return self.cumulative[index, j] / self.totals[j]
+
+    def quantiles(self, j, q):
+        if not self.totals[j]:
+            return np.full(len(q), np.nan)
+        index = np.searchsorted(self.cumulative[1:, j], np.asarray(q) * self.totals[j], side="left")
+        return self.items[np.minimum(index, len(self.items) - 1), j]
+
+
+def reference_profile(source, names=None, bins=10, grid=101, **meta):
+    """
+    Reference profile of training features for DriftMonitor
+
+    source: (rows, n_features) array, or a QuantileSketch filled with the
+            training rows (e.g. when training out of core)
+    names: feature names (default f0, f1, ...)
+    bins: quantile bins per feature for PSI (fewer when values repeat)
+    grid: quantile points per feature for KS
+    meta: extra JSON fields stored with the profile (e.g. feature_set)
+    """
+    if isinstance(source, QuantileSketch):
+        weighted, rows = source.weighted(), source.count
+    else:
+        weighted = WeightedColumns(source)
+        rows = len(weighted.items)
+    n_features = weighted.items.shape[1]
+    names = list(names) if names is not None else [f"f{j}" for j in range(n_features)]
+
+    features = []
+    for j in range(n_features):
+        values = np.unique(weighted.quantiles(j, np.linspace(0, 1, grid)))
+        values = values[~np.isnan(values)]
+        edges = np.unique(weighted.quantiles(j, np.arange(1, bins) / bins))
+        edges = edges[~np.isnan(edges)]
+        finite = weighted.totals[j] / weighted.weight if weighted.weight else 0.0
+        # Bin i holds [edges[i-1], edges[i]); the extra last bin holds NaN
+        below = weighted.cdf(j, edges, strict=True) if finite else np.zeros(len(edges))
+        fractions = np.append(np.diff(np.concatenate([[0.0], below, [1.0]])) * finite, 1.0 - finite)
+        summary = weighted.quantiles(j, list(SUMMARY_QUANTILES.values()))
+        features.append({
+            "name": str(names[j]),
+            "grid": values.tolist(),
+            "cdf": weighted.cdf(j, values).tolist() if len(values) else [],
+            "edges": edges.tolist(),
+            "fractions": fractions.tolist(),
+            **{key: _number(value) for key, value in zip(SUMMARY_QUANTILES, summary)},
+        })
+    return {"version": PROFILE_VERSION, "rows": int(rows), "n_features": n_features, "features": features, **meta}
+
+
+def load_references(path):
+    """Reference profiles by model name from a JSON file ({} when it does not exist)"""
+    path = Path(path)
+    if not path.exists():
+        return {}
+    with open(path) as f:
+        references = json.load(f)
+    for name, profile in references.items():
+        if profile.get("version") != PROFILE_VERSION:
+            raise ValueError(f"{path}: profile '{name}' has version {profile.get('version')}, "
+                             f"expected {PROFILE_VERSION}")
+    return references
+
+
+def save_references(path, references):
+    with open(path, "w") as f:
+        json.dump(references, f)
+
+
+def _number(value):
+    value = float(value)
+    return None if math.isnan(value) else round(value, 6)
+
+
+def psi(expected, actual):
+    """Population stability index between two binned distributions"""
+    expected = np.maximum(expected, PSI_EPSILON)
+    actual = np.maximum(actual, PSI_EPSILON)
+    return float(np.sum((actual - expected) * np.log(actual / expected)))
+
+
+class FeatureWindow:
+    """Sketch and reference-bin histograms of the rows seen in one window"""
+
+    def __init__(self, n_features, k, edges=None):
+        self.sketch = QuantileSketch(n_features, k)
+        self.edges = edges
+        self.counts = [np.zeros(len(e) + 2, dtype=np.int64) for e in edges] if edges is not None else None
+
+    @property
+    def count(self):
+        return self.sketch.count
+
+    def update(self, X):
+        self.sketch.update(X)
+        if self.edges is not None:
+            for j, edges in enumerate(self.edges):
+                column = X[:, j]
+                index = np.searchsorted(edges, column, side="right")
+                index[np.isnan(column)] = len(edges) + 1
+                self.counts[j] += np.bincount(index, minlength=len(edges) + 2)
+
+    def merged(self, other):
+        """This window and a previous one combined (neither is modified)"""
+        if other is None:
+            return self
+        window = FeatureWindow.__new__(FeatureWindow)
+        window.sketch = self.sketch.copy().merge(other.sketch)
+        window.edges = self.edges
+        window.counts = None if self.counts is None else [a + b for a, b in zip(self.counts, other.counts)]
+        return window
+
+    def nbytes(self):
+        return self.sketch.nbytes() + (sum(c.nbytes for c in self.counts) if self.counts is not None else 0)
+
+
+class ModelDrift:
+    """Drift state of one model: two rotating windows and its reference profile"""
+
+    def __init__(self, name, reference=None, n_features=None, k=200, window_rows=50000):
+        self.name = name
+        self.reference = reference
+        self.k = k
+        self.window_rows = max(1, int(window_rows))
+        self.n_features = reference["n_features"] if reference else n_features
+        self.edges = [np.asarray(f["edges"], dtype=np.float64) for f in reference["features"]] if reference else None
+        self.current = None
+        self.previous = None
+        self.rows = 0
+        self.rejected = 0
+
+    def update(self, X):
+        if self.n_features is None and X.ndim == 2 and X.shape[1]:
+            self.n_features = X.shape[1]
+        if X.ndim != 2 or X.shape[1] != self.n_features:
+            self.rejected += len(X)
+            return
+        self.rows += len(X)
+        while len(X):
+            if self.current is None:
+                self.current = FeatureWindow(self.n_features, self.k, self.edges)
+            room = self.window_rows - self.current.count
+            self.current.update(X[:room])
+            X = X[room:]
+            if self.current.count >= self.window_rows:
+                self.previous, self.current = self.current, None
+
+    def window(self):
+        if self.current is None:
+            return self.previous
+        return self.current.merged(self.previous)
+
+    def nbytes(self):
+        return sum(w.nbytes() for w in (self.current, self.previous) if w is not None)
+
+    def scores(self, min_rows=1000, psi_warning=0.1, psi_alert=0.25, ks_alert=0.1, details=False, top=5):
+        window = self.window()
+        rows = window.count if window is not None else 0
+        result = {
+            "model": self.name,
+            "reference": self.reference is not None,
+            "reference_rows": self.reference["rows"] if self.reference else None,
+            "n_features": self.n_features,
+            "rows_seen": self.rows,
+            "window_rows": rows,
+            "rejected": self.rejected,
+        }
+        if self.reference is None:
+            result["status"] = "no_reference"
+        elif rows < min_rows:
+            result["status"] = "insufficient_data"
+        if rows == 0:
+            return result
+
+        weighted = window.sketch.weighted()
+        features = []
+        for j in range(self.n_features):
+            live = weighted.quantiles(j, list(SUMMARY_QUANTILES.values()))
+            feature = {"feature": j, "live": {key: _number(v) for key, v in zip(SUMMARY_QUANTILES, live)}}
+            if self.reference is not None:
+                profile = self.reference["features"][j]
+                feature["name"] = profile["name"]
+                feature["reference"] = {key: profile[key] for key in SUMMARY_QUANTILES}
+                counts = window.counts[j]
+                feature["psi"] = round(psi(np.asarray(profile["fractions"]), counts / counts.sum()), 6)
+                grid = np.asarray(profile["grid"], dtype=np.float64)
+                gaps = np.abs(weighted.cdf(j, grid) - np.asarray(profile["cdf"])) if len(grid) else np.zeros(0)
+                feature["ks"] = round(float(np.nanmax(gaps)), 6) if len(gaps) and not np.all(np.isnan(gaps)) else 0.0
+            features.append(feature)
+
+        if self.reference is not None:
+            result["psi"] = max(f["psi"] for f in features)
+            result["ks"] = max(f["ks"] for f in features)
+            drifted = [f for f in features if f["psi"] >= psi_alert or f["ks"] >= ks_alert]
+            result["drifted_features"] = len(drifted)
+            if "status" not in result:
+                if drifted:
+                    result["status"] = "drift"
+                elif result["psi"] >= psi_warning:
+                    result["status"] = "warning"
+                else:
+                    result["status"] = "ok"
+            result["top_features"] = sorted(features, key=lambda f: (f["psi"], f["ks"]), reverse=True)[:top]
+        if details:
+            result["features"] = features
+        return result
+
+
+class DriftMonitor:
+    """Records live feature vectors per model and scores them against reference profiles"""
+
+    def __init__(self, references=None, sample_rate=1.0, window_rows=50000, k=200, flush_seconds=1.0,
+                 max_pending=10000, min_rows=1000, psi_warning=0.1, psi_alert=0.25, ks_alert=0.1):
+        """
+        references: dict of model name -> reference_profile()
+        sample_rate: fraction of record() calls kept (0..1)
+        window_rows: rows per window; scores cover the last one to two windows
+        k: sketch size (rank error of roughly 1.7 / k)
+        max_pending: recorded vectors waiting for the next flush; more are dropped
+        min_rows: rows needed before a drift status is reported
+        """
+        self.sample_rate = float(sample_rate)
+        self.window_rows = int(window_rows)
+        self.k = int(k)
+        self.flush_seconds = float(flush_seconds)
+        self.max_pending = int(max_pending)
+        self.thresholds = {"min_rows": min_rows, "psi_warning": psi_warning, "psi_alert": psi_alert,
+                           "ks_alert": ks_alert}
+
+        self._pending = deque()
+        # _update_lock serializes sketch updates and full scoring (background
+        # thread, /drift details); _lock only guards swapping in the published
+        # summary, so /metrics scrapes and /drift never wait for an update
+        self._update_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self._published = {}
+        self._memory_bytes = 0
+        self.models = {}
+        self.recorded = 0
+        self.dropped = 0
+        self.flushes = 0
+        self.flush_seconds_total = 0.0
+        self.errors = 0
+        self.started_at = time.time()
+        self.set_references(references or {})
+
+        self._active = True
+        if hasattr(os, "register_at_fork"):
+            # A forked child (process-pool worker) has no drain thread: recording there would only fill the deque
+            os.register_at_fork(after_in_child=self._deactivate)
+        self._stopped = threading.Event()
+        self._worker = threading.Thread(target=self._run, name="drift-monitor", daemon=True)
+        self._worker.start()
+
+    def _deactivate(self):
+        self._active = False
+
+    def set_references(self, references):
+        """Replace the reference profiles; all windows start over"""
+        with self._update_lock:
+            self.references = dict(references)
+            self.models = {
+                name: ModelDrift(name, profile, k=self.k, window_rows=self.window_rows)
+                for name, profile in self.references.items()
+            }
+            self._publish()
+
+    def _publish(self):
+        """Score every model and swap the results in; called with _update_lock held"""
+        published = {name: state.scores(**self.thresholds) for name, state in self.models.items()}
+        memory_bytes = sum(state.nbytes() for state in self.models.values())
+        with self._lock:
+            self._published = published
+            self._memory_bytes = memory_bytes
+
+    def record(self, model, features):
+        """Queue one feature vector; never blocks (on the request path, so kept minimal)"""
+        if not self._active or (self.sample_rate < 1.0 and random.random() >= self.sample_rate):
+            return False
+        if len(self._pending) >= self.max_pending:
+            self.dropped += 1
+            return False
+        self._pending.append((model, features, False))
+        return True
+
+    def record_batch(self, model, rows):
+        """Queue a (rows, n_features) matrix or list of vectors; never blocks"""
+        if not self._active or (self.sample_rate < 1.0 and random.random() >= self.sample_rate):
+            return False
+        if len(self._pending) >= self.max_pending:
+            self.dropped += 1
+            return False
+        self._pending.append((model, rows, True))
+        return True
+
+    def _run(self):
+        try:
+            # Linux applies priorities per thread: nice 19 for this worker only
+            os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), 19)
+        except (AttributeError, OSError):
+            pass
+        while not self._stopped.wait(self.flush_seconds):
+            try:
+                self.flush()
+            except Exception as e:
+                self.errors += 1
+                logger.error(f"Drift monitor update failed: {e}")
+
+    def flush(self):
+        """Apply the queued vectors now (the worker calls this every flush interval)"""
+        if not self._pending:
+            return 0
+        rows = 0
+        with self._update_lock:
+            started = time.perf_counter()
+            grouped = {}
+            for _ in range(len(self._pending)):
+                model, data, batch = self._pending.popleft()
+                singles, batches = grouped.setdefault(model, ([], []))
+                (batches if batch else singles).append(data)
+            self.recorded += sum(len(singles) + len(batches) for singles, batches in grouped.values())
+
+            for model, (singles, batches) in grouped.items():
+                state = self.models.get(model)
+                if state is None:
+                    state = self.models[model] = ModelDrift(model, k=self.k, window_rows=self.window_rows)
+                for block in _blocks(singles, batches):
+                    state.update(block)
+                    rows += len(block)
+            self._publish()
+            self.flushes += 1
+            self.flush_seconds_total += time.perf_counter() - started
+        return rows
+
+    def scores(self, model=None, details=False):
+        """
+        Drift scores per model (or for one model)
+
+        Summaries are the ones published by the last flush and never wait
+        for an update; per-feature details are computed on demand and do.
+        """
+        if not details:
+            with self._lock:
+                published = self._published
+            names = [model] if model is not None else sorted(published)
+            return {name: published[name] for name in names if name in published}
+        with self._update_lock:
+            names = [model] if model is not None else sorted(self.models)
+            return {
+                name: self.models[name].scores(details=True, **self.thresholds)
+                for name in names if name in self.models
+            }
+
+    def stats(self):
+        with self._lock:
+            return {
+                "sample_rate": self.sample_rate,
+                "window_rows": self.window_rows,
+                "sketch_k": self.k,
+                "recorded": self.recorded,
+                "dropped": self.dropped,
+                "pending": len(self._pending),
+                "max_pending": self.max_pending,
+                "flushes": self.flushes,
+                "flush_ms_mean": round(self.flush_seconds_total / self.flushes * 1000, 3) if self.flushes else 0.0,
+                "errors": self.errors,
+                "memory_bytes": self._memory_bytes,
+                "references": sorted(self.references),
+                **self.thresholds,
+                "started_at": self.started_at,
+            }
+
+    def stop(self):
+        self._active = False
+        self._stopped.set()
+        self._worker.join(timeout=5)
+
+
+def _blocks(singles, batches):
+    """(rows, n_features) float arrays from queued vectors and matrices"""
+    for batch in batches:
+        try:
+            block = np.asarray(batch, dtype=np.float64)
+        except (TypeError, ValueError):
+            # Ragged: counted as one rejected row
+            yield np.empty((1, 0))
+            continue
+        yield block.reshape(1, -1) if block.ndim == 1 else block
+    if singles:
+        try:
+            yield np.asarray(singles, dtype=np.float64)
+        except ValueError:
+            # Vectors of different lengths: one block each
+            for row in singles:
+                yield np.asarray(row, dtype=np.float64).reshape(1, -1)
@@ -0,0 +1,288 @@
+"""
+Batch image feature extraction for OCR
+
+Shared by the training scripts and the service so both compute features
+identically. Glyph images are decoded once, resized onto a fixed canvas
+and stacked into a single preallocated uint8 tensor of shape (N, H, W);
+every feature is then an axis-wise reduction over that tensor instead of
+a per-image Python dict.
+
+Feature sets:
+  base      - the original six statistics (mean, std, min, max, aspect
+              ratio, edge density)
+  extended  - base plus projection histograms, 4x4 zoning densities and
+              HOG-style orientation histograms
+  pixels    - the first 100 raw pixels of each image, as used to train
+              the deployed ocr_classifier
+
+It also segments whole text images into glyph crops (Otsu binarization
+and projection profiles) for the image OCR endpoint.
+"""
+
+import io
+
+import numpy as np
+from PIL import Image
+
+CANVAS_SIZE = (32, 32)  # (height, width)
+PROJECTION_BINS = 8
+ZONE_GRID = 4
+HOG_CELLS = 2
+HOG_BINS = 9
+PIXEL_COUNT = 100
+
+# Bump whenever any feature computation changes: stored features
+# (scripts/feature_store.py) from another version are re-extracted
+FEATURE_VERSION = 1
+
+BASE_FEATURES = ['mean_pixel', 'std_pixel', 'min_pixel', 'max_pixel', 'aspect_ratio', 'edge_density']
+
+
+def feature_names(feature_set="extended"):
+    """Column names for a feature set, in output order"""
+    if feature_set == "pixels":
+        return [f"px_{i}" for i in range(PIXEL_COUNT)]
+    if feature_set == "base":
+        return list(BASE_FEATURES)
+    if feature_set == "extended":
+        return (
+            BASE_FEATURES
+            + [f"row_proj_{i}" for i in range(PROJECTION_BINS)]
+            + [f"col_proj_{i}" for i in range(PROJECTION_BINS)]
+            + [f"zone_{r}_{c}" for r in range(ZONE_GRID) for c in range(ZONE_GRID)]
+            + [f"hog_{cell}_{b}" for cell in range(HOG_CELLS * HOG_CELLS) for b in range(HOG_BINS)]
+        )
+    raise ValueError(f"Unknown feature set: {feature_set}")
+
+
+FEATURE_SETS = {name: len(feature_names(name)) for name in ("base", "extended", "pixels")}
+
+
+def feature_set_for(n_features):
+    """Feature set producing n_features columns (to match a fitted scaler), or None"""
+    for name, size in FEATURE_SETS.items():
+        if size == n_features:
+            return name
+    return None
+
+
+def load_image(source):
+    """Decode a path, bytes, file object, PIL image or array into a 2-D uint8 grayscale array"""
+    if isinstance(source, np.ndarray):
+        array = source if source.ndim == 2 else np.asarray(Image.fromarray(source).convert('L'))
+        return np.ascontiguousarray(array, dtype=np.uint8)
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        source = io.BytesIO(source)
+    image = source if isinstance(source, Image.Image) else Image.open(source)
+    return np.asarray(image.convert('L'), dtype=np.uint8)
+
+
+def to_canvas(images, size=CANVAS_SIZE):
+    """
+    Resize grayscale images onto one (N, H, W) uint8 tensor
+
+    Returns the tensor and each image's original width / height ratio,
+    which the resize would otherwise erase.
+    """
+    height, width = size
+    if height % PROJECTION_BINS or width % PROJECTION_BINS or height % ZONE_GRID or width % ZONE_GRID:
+        raise ValueError(f"Canvas {size} must be divisible by {PROJECTION_BINS} and {ZONE_GRID}")
+
+    batch = np.empty((len(images), height, width), dtype=np.uint8)
+    aspect = np.zeros(len(images), dtype=np.float64)
+    for i, image in enumerate(images):
+        array = load_image(image)
+        if array.shape[0] > 0:
+            aspect[i] = array.shape[1] / array.shape[0]
+        if array.shape == (height, width):
+            batch[i] = array
+        else:
+            batch[i] = np.asarray(Image.fromarray(array).resize((width, height), Image.BILINEAR))
+    return batch, aspect
+
+
+def base_features(batch, aspect):
+    """Mean, std, min, max, aspect ratio and edge density per image, shape (N, 6)"""
+    flat = batch.reshape(len(batch), -1)
+    return np.column_stack([
+        flat.mean(axis=1),
+        flat.std(axis=1),
+        flat.min(axis=1),
+        flat.max(axis=1),
+        aspect,
+        # uint8 difference of the flattened image, wrapping like the original extractor
+        np.diff(flat, axis=1).mean(axis=1),
+    ])
+
+
+def ink(batch):
+    """Contrast-stretched ink intensity in [0, 1] (dark glyph on light background -> 1)"""
+    low = batch.min(axis=(1, 2), keepdims=True).astype(np.float32)
+    high = batch.max(axis=(1, 2), keepdims=True).astype(np.float32)
+    return (high - batch) / np.maximum(high - low, 1.0)
+
+
+def projection_histograms(strokes):
+    """Share of ink in PROJECTION_BINS horizontal and vertical bands, shape (N, 2 * bins)"""
+    n, height, width = strokes.shape
+    total = strokes.sum(axis=(1, 2))[:, np.newaxis] + 1e-6
+    rows = strokes.sum(axis=2).reshape(n, PROJECTION_BINS, height // PROJECTION_BINS).sum(axis=2)
+    cols = strokes.sum(axis=1).reshape(n, PROJECTION_BINS, width // PROJECTION_BINS).sum(axis=2)
+    return np.concatenate([rows / total, cols / total], axis=1)
+
+
+def zoning(strokes):
+    """Mean ink density in a ZONE_GRID x ZONE_GRID grid of zones, shape (N, grid * grid)"""
+    n, height, width = strokes.shape
+    zones = strokes.reshape(n, ZONE_GRID, height // ZONE_GRID, ZONE_GRID, width // ZONE_GRID)
+    return zones.mean(axis=(2, 4)).reshape(n, -1)
+
+
+def orientation_histograms(strokes):
+    """
+    HOG-style gradient orientation histograms, shape (N, cells * cells * bins)
+
+    Central-difference gradients, unsigned orientations in HOG_BINS bins
+    weighted by magnitude, pooled over HOG_CELLS x HOG_CELLS cells and
+    L2-normalized per image.
+    """
+    n, height, width = strokes.shape
+    gx = np.zeros_like(strokes)
+    gy = np.zeros_like(strokes)
+    gx[:, :, 1:-1] = strokes[:, :, 2:] - strokes[:, :, :-2]
+    gy[:, 1:-1, :] = strokes[:, 2:, :] - strokes[:, :-2, :]
+
+    magnitude = np.hypot(gx, gy)
+    orientation = np.mod(np.arctan2(gy, gx), np.pi)
+    bins = np.minimum((orientation * (HOG_BINS / np.pi)).astype(np.int64), HOG_BINS - 1)
+
+    # One flat histogram index per pixel: (image, cell, bin)
+    cell_rows = np.arange(height) * HOG_CELLS // height
+    cell_cols = np.arange(width) * HOG_CELLS // width
+    cells = cell_rows[:, np.newaxis] * HOG_CELLS + cell_cols[np.newaxis, :]
+    n_bins = HOG_CELLS * HOG_CELLS * HOG_BINS
+    index = np.arange(n)[:, np.newaxis, np.newaxis] * n_bins + cells * HOG_BINS + bins
+
+    hist = np.bincount(index.ravel(), weights=magnitude.ravel(), minlength=n * n_bins).reshape(n, n_bins)
+    return hist / (np.linalg.norm(hist, axis=1, keepdims=True) + 1e-6)
+
+
+def pixel_features(images):
+    """First PIXEL_COUNT pixels of each flattened image (zero-padded if smaller), shape (N, 100)"""
+    out = np.zeros((len(images), PIXEL_COUNT), dtype=np.float64)
+    for i, image in enumerate(images):
+        pixels = load_image(image).ravel()[:PIXEL_COUNT]
+        out[i, :len(pixels)] = pixels
+    return out
+
+
+def extract_features(images, feature_set="extended", size=CANVAS_SIZE):
+    """
+    Feature matrix for a batch of images, shape (N, len(feature_names(feature_set)))
+
+    images: paths, encoded bytes, PIL images or 2-D uint8 arrays
+    """
+    if feature_set == "pixels":
+        return pixel_features(images)
+    if feature_set not in FEATURE_SETS:
+        raise ValueError(f"Unknown feature set: {feature_set}")
+    if len(images) == 0:
+        return np.empty((0, FEATURE_SETS[feature_set]), dtype=np.float64)
+
+    batch, aspect = to_canvas(images, size)
+    base = base_features(batch, aspect)
+    if feature_set == "base":
+        return base
+
+    strokes = ink(batch)
+    return np.concatenate([
+        base,
+        projection_histograms(strokes),
+        zoning(strokes),
+        orientation_histograms(strokes),
+    ], axis=1)
+
+
+class ImageTooLarge(ValueError):
+    """Image or glyph count exceeds a configured limit"""
+
+
+def open_image(source, max_pixels=None):
+    """
+    Decode an image to a 2-D uint8 grayscale array, checking its size first
+
+    PIL only reads the header on open, so oversized images are rejected
+    before any pixel data is decoded.
+    """
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        source = io.BytesIO(source)
+    try:
+        image = Image.open(source)
+    except Exception as e:
+        raise ValueError(f"Could not decode image: {e}") from e
+    width, height = image.size
+    if max_pixels and width * height > max_pixels:
+        raise ImageTooLarge(f"Image too large: {width}x{height} exceeds {max_pixels} pixels")
+    return load_image(image)
+
+
+def otsu_threshold(gray):
+    """Threshold maximizing between-class variance of the grayscale histogram"""
+    hist = np.bincount(gray.ravel(), minlength=256).astype(np.float64)
+    levels = np.arange(256, dtype=np.float64)
+    weight = np.cumsum(hist)
+    mass = np.cumsum(hist * levels)
+    total_weight, total_mass = weight[-1], mass[-1]
+    background = weight * (total_weight - weight)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        variance = (total_mass * weight - mass * total_weight) ** 2 / background
+    variance[background == 0] = 0.0
+    return int(np.argmax(variance))
+
+
+def binarize(gray):
+    """Boolean ink mask; the majority side of the Otsu threshold is taken as background"""
+    threshold = otsu_threshold(gray)
+    dark = gray <= threshold
+    return dark if dark.mean() < 0.5 else ~dark
+
+
+def _runs(mask):
+    """(start, end) index pairs of consecutive True values in a 1-D mask"""
+    edges = np.diff(np.concatenate([[0], mask.astype(np.int8), [0]]))
+    return list(zip(np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)))
+
+
+def segment_glyphs(gray, max_glyphs=None, min_size=2):
+    """
+    Split a text image into glyph boxes using projection profiles
+
+    The ink mask is split into lines on empty rows, then each line into
+    glyphs on empty columns; each glyph is trimmed to its ink rows. Specks
+    smaller than min_size in both directions are dropped.
+
+    Returns a list of (line, x0, y0, x1, y1) boxes in reading order.
+    Raises ImageTooLarge once more than max_glyphs glyphs are found.
+    """
+    mask = binarize(gray)
+    boxes = []
+    for line, (top, bottom) in enumerate(_runs(mask.any(axis=1))):
+        band = mask[top:bottom]
+        for left, right in _runs(band.any(axis=0)):
+            rows = np.flatnonzero(band[:, left:right].any(axis=1))
+            y0, y1 = top + rows[0], top + rows[-1] + 1
+            if right - left < min_size and y1 - y0 < min_size:
+                continue
+            boxes.append((line, int(left), int(y0), int(right), int(y1)))
+            if max_glyphs and len(boxes) > max_glyphs:
+                raise ImageTooLarge(f"Too many glyphs: more than {max_glyphs}")
+    return boxes
+
+
+def crop_glyphs(gray, boxes, margin=0.15):
+    """Crop each box with a background margin, like the framed training glyphs"""
+    crops = []
+    for _, x0, y0, x1, y1 in boxes:
+        pad = max(1, int(round(margin * (y1 - y0))))
+        crops.append(gray[max(0, y0 - pad):y1 + pad, max(0, x0 - pad):x1 + pad])
+    return crops
@@ -0,0 +1,445 @@
+"""
+Flat array-based random forest inference
+
+A trained sklearn RandomForestClassifier/Regressor is flattened into a
+handful of contiguous NumPy arrays (feature, threshold, left, right and
+leaf value per node, plus one root offset per tree). Prediction walks all
+trees for a whole batch at once, one vectorized step per tree level,
+instead of going through sklearn's per-estimator Python loop and joblib
+dispatch. Results are identical to the sklearn model's predict_proba /
+predict: same float32 input cast, same split comparisons and leaf
+values, accumulated in tree order.
+
+The arrays are saved uncompressed with joblib, so the model registry can
+memory-map them (mmap_mode='r') instead of unpickling tree objects.
+
+predict_proba_early_exit() is an "anytime" variant for thresholded binary
+decisions: trees are evaluated in chunks and a row stops as soon as the
+remaining trees can no longer move its score across the threshold.
+
+The flat engine wins on small batches but sklearn's Cython traversal is
+faster above a few hundred rows (benchmarks/bench_flat_forest.py), so
+DispatchForest keeps both and picks one per call by row count.
+
+A forest over a single feature is a piecewise-constant function of that
+feature, so BreakpointLookup replaces it outright with the sorted split
+thresholds and one output per interval, answered by np.searchsorted.
+"""
+
+import math
+import weakref
+
+import joblib
+import numpy as np
+import sklearn
+
+FORMAT_VERSION = 1
+
+# sklearn >= 1.4 stores class fractions in classifier leaves and returns
+# them as-is; older releases stored weighted counts and normalized them
+# inside DecisionTreeClassifier.predict_proba
+_SKLEARN_NORMALIZES_LEAVES = tuple(int(p) for p in sklearn.__version__.split(".")[:2]) < (1, 4)
+
+
+class FlatForest:
+    """Vectorized inference engine for a flattened random forest"""
+
+    def __init__(self, kind, feature, threshold, left, right, value, roots, max_depth,
+                 n_features_in_, classes_=None, missing_go_to_left=None):
+        self.format_version = FORMAT_VERSION
+        self.kind = kind
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.value = value
+        self.roots = roots
+        self.max_depth = int(max_depth)
+        self.n_features_in_ = int(n_features_in_)
+        self.classes_ = classes_
+        self.missing_go_to_left = missing_go_to_left
+        self._build_lookup_arrays()
+
+    def _build_lookup_arrays(self):
+        """Derived arrays used by traversal (rebuilt on load, never saved)"""
+        # children[2 * node + go_right] is the next node
+        self._children = np.stack([self.left, self.right], axis=1).ravel().astype(np.int64)
+        self._is_leaf = self.left == np.arange(len(self.left), dtype=self.left.dtype)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state.pop("_children", None)
+        state.pop("_is_leaf", None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._build_lookup_arrays()
+
+    @property
+    def n_estimators(self):
+        return len(self.roots)
+
+    @property
+    def n_nodes(self):
+        return len(self.feature)
+
+    @classmethod
+    def from_sklearn(cls, forest):
+        """Flatten a fitted RandomForestClassifier or RandomForestRegressor"""
+        is_classifier = hasattr(forest, "classes_")
+        if getattr(forest, "n_outputs_", 1) != 1:
+            raise ValueError("Only single-output forests are supported")
+
+        features, thresholds, lefts, rights, values, missing, roots = [], [], [], [], [], [], []
+        offset = 0
+        max_depth = 0
+        for estimator in forest.estimators_:
+            tree = estimator.tree_
+            n = tree.node_count
+            node_ids = np.arange(offset, offset + n, dtype=np.int32)
+            is_leaf = tree.children_left == -1
+
+            # Leaves point at themselves so every row can take exactly
+            # max_depth steps regardless of which leaf it reaches
+            left = np.where(is_leaf, node_ids, tree.children_left + offset).astype(np.int32)
+            right = np.where(is_leaf, node_ids, tree.children_right + offset).astype(np.int32)
+            feature = np.where(is_leaf, 0, tree.feature).astype(np.int32)
+
+            if is_classifier:
+                value = tree.value[:, 0, :forest.n_classes_].astype(np.float64)
+                if _SKLEARN_NORMALIZES_LEAVES:
+                    normalizer = value.sum(axis=1)[:, np.newaxis]
+                    normalizer[normalizer == 0.0] = 1.0
+                    value = value / normalizer
+            else:
+                value = tree.value[:, 0, :1].astype(np.float64)
+
+            features.append(feature)
+            thresholds.append(tree.threshold.astype(np.float64))
+            lefts.append(left)
+            rights.append(right)
+            values.append(value)
+            missing.append(getattr(tree, "missing_go_to_left", np.zeros(n, dtype=np.uint8)).astype(bool))
+            roots.append(offset)
+            offset += n
+            max_depth = max(max_depth, tree.max_depth)
+
+        missing_go_to_left = np.concatenate(missing)
+        return cls(
+            kind="classifier" if is_classifier else "regressor",
+            feature=np.ascontiguousarray(np.concatenate(features)),
+            threshold=np.ascontiguousarray(np.concatenate(thresholds)),
+            left=np.ascontiguousarray(np.concatenate(lefts)),
+            right=np.ascontiguousarray(np.concatenate(rights)),
+            value=np.ascontiguousarray(np.concatenate(values)),
+            roots=np.asarray(roots, dtype=np.int32),
+            max_depth=max_depth,
+            n_features_in_=forest.n_features_in_,
+            classes_=np.asarray(forest.classes_) if is_classifier else None,
+            # Only kept when some split actually routes missing values left
+            missing_go_to_left=missing_go_to_left if missing_go_to_left.any() else None,
+        )
+
+    def _validate(self, X):
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        if X.ndim != 2 or X.shape[1] != self.n_features_in_:
+            raise ValueError(
+                f"X has {X.shape[-1]} features, but FlatForest is expecting {self.n_features_in_} features as input."
+            )
+        return X
+
+    def apply(self, X, trees=None):
+        """Leaf node index reached in each tree, shape (n_samples, n_trees)"""
+        X = self._validate(X)
+        roots = self.roots if trees is None else self.roots[trees]
+        n_samples, n_trees = X.shape[0], len(roots)
+        flat_X = X.ravel()
+
+        # One entry per (row, tree) pair, advanced one level per step;
+        # pairs that reached a leaf are dropped from the active set
+        leaves = np.repeat(roots[np.newaxis, :].astype(np.int64), n_samples, axis=0).ravel()
+        offsets = np.repeat(np.arange(n_samples, dtype=np.int64) * X.shape[1], n_trees)
+        active = np.arange(leaves.size)
+        nodes = leaves.copy()
+
+        for depth in range(self.max_depth):
+            x = flat_X.take(offsets + self.feature.take(nodes))
+            go_right = ~(x <= self.threshold.take(nodes))
+            if self.missing_go_to_left is not None:
+                go_right &= ~(np.isnan(x) & self.missing_go_to_left.take(nodes))
+            nodes = self._children.take(2 * nodes + go_right)
+
+            # Compaction costs a few passes, so only start once trees begin to end
+            if depth >= 3:
+                running = ~self._is_leaf.take(nodes)
+                leaves[active] = nodes
+                if not running.any():
+                    return leaves.reshape(n_samples, n_trees)
+                active, nodes, offsets = active[running], nodes[running], offsets[running]
+
+        leaves[active] = nodes
+        return leaves.reshape(n_samples, n_trees)
+
+    def _accumulate(self, X, chunk_rows=256):
+        """Sum leaf values over trees (in tree order) for every row"""
+        X = self._validate(X)
+        out = np.empty((X.shape[0], self.value.shape[1]), dtype=np.float64)
+        # Row chunks keep the per-pair working set cache-resident
+        for start in range(0, X.shape[0], chunk_rows):
+            leaves = self.apply(X[start:start + chunk_rows])
+            # cumsum is strictly sequential, matching sklearn's
+            # tree-by-tree `out += prediction` accumulation bit for bit
+            out[start:start + chunk_rows] = np.cumsum(self.value[leaves], axis=1)[:, -1]
+        return out
+
+    def predict_proba(self, X):
+        if self.kind != "classifier":
+            raise AttributeError("predict_proba is only available for classifiers")
+        proba = self._accumulate(X)
+        proba /= self.n_estimators
+        return proba
+
+    def predict_proba_early_exit(self, X, threshold, positive=1, chunk_trees=10, delta=None, min_trees=None):
+        """
+        Class probabilities from as few trees as the decision proba[positive] > threshold needs
+
+        Trees are evaluated chunk_trees at a time, and after each chunk a row
+        stops once its decision is settled:
+
+          exact bound   every tree adds a leaf fraction in [0, 1], so after k
+                        of T trees the final score lies in [S / T, (S + T - k) / T]
+                        for the partial sum S; a row stops when that whole
+                        interval is on one side of the threshold. The decision
+                        is then always the one full evaluation would make.
+          delta         additionally stop when the running mean S / k is more
+                        than eps = sqrt(log(2 / delta) * (1 - (k - 1) / T) / (2k))
+                        from the threshold (Hoeffding-Serfling bound for
+                        sampling trees without replacement); the decision
+                        differs from full evaluation with probability <= delta
+                        per row, in exchange for stopping much earlier.
+
+        Rows that stop early report the running mean over their trees, which
+        is an estimate; rows that need every tree get exactly predict_proba.
+        Returns (proba, trees_evaluated per row).
+        """
+        if self.kind != "classifier":
+            raise AttributeError("predict_proba_early_exit is only available for classifiers")
+        X = self._validate(X)
+        n_trees = self.n_estimators
+        chunk_trees = max(1, int(chunk_trees))
+        min_trees = max(chunk_trees, int(min_trees or 0))
+        log_term = math.log(2.0 / delta) if delta else None
+        threshold_sum = threshold * n_trees
+
+        sums = np.zeros((X.shape[0], self.value.shape[1]), dtype=np.float64)
+        used = np.zeros(X.shape[0], dtype=np.int64)
+        active = np.arange(X.shape[0])
+        for start in range(0, n_trees, chunk_trees):
+            trees = np.arange(start, min(start + chunk_trees, n_trees))
+            values = self.value[self.apply(X[active], trees)]
+            # Prepending the partial sum keeps the accumulation sequential in
+            # tree order, so rows that use every tree match predict_proba exactly
+            sums[active] = np.cumsum(np.concatenate([sums[active][:, np.newaxis], values], axis=1), axis=1)[:, -1]
+            k = int(trees[-1]) + 1
+            used[active] = k
+            if k == n_trees or k < min_trees:
+                continue
+
+            partial = sums[active, positive]
+            settled = (partial > threshold_sum) | (partial + (n_trees - k) <= threshold_sum)
+            if log_term is not None:
+                eps = math.sqrt(log_term * (1.0 - (k - 1) / n_trees) / (2.0 * k))
+                settled |= np.abs(partial / k - threshold) > eps
+            active = active[~settled]
+            if active.size == 0:
+                break
+
+        return sums / used[:, np.newaxis], used
+
+    def predict(self, X):
+        if self.kind == "classifier":
+            return self.classes_.take(np.argmax(self.predict_proba(X), axis=1))
+        prediction = self._accumulate(X)
+        prediction /= self.n_estimators
+        return prediction[:, 0]
+
+    def nbytes(self):
+        arrays = [self.feature, self.threshold, self.left, self.right, self.value, self.roots]
+        if self.missing_go_to_left is not None:
+            arrays.append(self.missing_go_to_left)
+        return sum(a.nbytes for a in arrays)
+
+    def save(self, path):
+        """Write uncompressed so the arrays can be memory-mapped on load"""
+        joblib.dump(self, path, compress=0)
+
+    @staticmethod
+    def load(path, mmap_mode="r"):
+        return joblib.load(path, mmap_mode=mmap_mode)
+
+
+class DispatchForest:
+    """
+    A FlatForest and the sklearn forest it was built from, serving each call
+    with the engine that is faster for its batch size
+
+    Calls of up to max_flat_rows rows go to the flat engine, larger ones to
+    sklearn; outputs are identical either way. Other attributes (classes_,
+    n_features_in_, ...) come from the sklearn model.
+    """
+
+    def __init__(self, flat, forest, max_flat_rows=128):
+        self.flat = flat
+        self.forest = forest
+        self.max_flat_rows = int(max_flat_rows)
+
+    def _engine(self, X):
+        return self.flat if len(X) <= self.max_flat_rows else self.forest
+
+    def predict_proba(self, X):
+        return self._engine(X).predict_proba(X)
+
+    def predict(self, X):
+        return self._engine(X).predict(X)
+
+    def __getattr__(self, name):
+        # Only reached for attributes not set in __init__; guarded for unpickling
+        if name in ("flat", "forest", "max_flat_rows"):
+            raise AttributeError(name)
+        return getattr(self.forest, name)
+
+
+class BreakpointLookup:
+    """
+    Single-feature random forest collapsed into a sorted breakpoint lookup
+
+    Every split of every tree compares float32(x) <= threshold, so the
+    thresholds, sorted and deduplicated, cut the input line into intervals
+    (b[i-1], b[i]] on which the whole forest's output is constant. The
+    output of each interval is computed once by running the forest on a
+    float32 point inside it; serving is then one np.searchsorted over the
+    breakpoints with the same float32 cast and `<=` comparison, which gives
+    exactly the forest's predict / predict_proba. Adjacent intervals with
+    equal outputs are merged.
+    """
+
+    def __init__(self, kind, breakpoints, values, n_estimators, classes_=None, nan_value=None):
+        self.format_version = FORMAT_VERSION
+        self.kind = kind
+        self.breakpoints = breakpoints
+        self.values = values
+        self.n_estimators = int(n_estimators)
+        self.n_features_in_ = 1
+        self.classes_ = classes_
+        self.nan_value = nan_value
+
+    @classmethod
+    def from_forest(cls, forest):
+        """Collapse a fitted single-feature RandomForestClassifier/Regressor (or FlatForest)"""
+        if getattr(forest, "n_features_in_", None) != 1:
+            raise ValueError(f"Only single-feature forests can be collapsed (got {forest.n_features_in_} features)")
+        flat = as_flat_forest(forest)
+        if flat is None:
+            raise ValueError(f"Not a random forest: {type(forest).__name__}")
+        splits = ~flat._is_leaf
+        breakpoints = np.unique(flat.threshold[splits])
+
+        # One float32 input per interval: the largest float32 <= b[i] for
+        # (b[i-1], b[i]], the smallest float32 > b[-1] for the last one
+        points = breakpoints.astype(np.float32)
+        rounded_up = points.astype(np.float64) > breakpoints
+        points[rounded_up] = np.nextafter(points[rounded_up], np.float32(-np.inf))
+        above = np.float32(breakpoints[-1]) if len(breakpoints) else np.float32(0)
+        if len(breakpoints) and above <= breakpoints[-1]:
+            above = np.nextafter(above, np.float32(np.inf))
+        points = np.append(points, above).astype(np.float32)
+        lower = np.concatenate([[-np.inf], breakpoints])
+        reachable = points.astype(np.float64) > lower
+
+        if flat.kind == "classifier":
+            values = flat.predict_proba(points.reshape(-1, 1))
+        else:
+            values = flat.predict(points.reshape(-1, 1))[:, np.newaxis]
+        # No float32 input falls in an unreachable interval: give it its left neighbour's output
+        for i in np.flatnonzero(~reachable):
+            values[i] = values[i - 1] if i > 0 else values[i + 1]
+
+        # Drop breakpoints between intervals with identical outputs
+        keep = np.any(values[1:] != values[:-1], axis=1)
+        values = values[np.concatenate([[0], np.flatnonzero(keep) + 1])]
+        breakpoints = breakpoints[keep]
+
+        nan_value = None
+        if flat.missing_go_to_left is not None:
+            nan_input = np.full((1, 1), np.nan, dtype=np.float32)
+            nan_value = flat.predict_proba(nan_input)[0] if flat.kind == "classifier" else flat.predict(nan_input)
+        return cls(
+            kind=flat.kind,
+            breakpoints=np.ascontiguousarray(breakpoints, dtype=np.float64),
+            values=np.ascontiguousarray(values, dtype=np.float64),
+            n_estimators=flat.n_estimators,
+            classes_=flat.classes_,
+            nan_value=nan_value,
+        )
+
+    @property
+    def n_intervals(self):
+        return len(self.values)
+
+    def _lookup(self, X):
+        X = np.asarray(X)
+        if X.ndim == 2 and X.shape[1] != 1 or X.ndim > 2:
+            raise ValueError(f"X has {X.shape[-1]} features, but BreakpointLookup is expecting 1 feature as input.")
+        # Same float32 cast as the trees; float32 -> float64 is exact
+        x = X.reshape(-1).astype(np.float32).astype(np.float64)
+        out = self.values.take(np.searchsorted(self.breakpoints, x, side="left"), axis=0)
+        missing = np.isnan(x)
+        if missing.any():
+            if self.nan_value is None:
+                raise ValueError("Input X contains NaN.")
+            out[missing] = self.nan_value
+        return out
+
+    def predict_proba(self, X):
+        if self.kind != "classifier":
+            raise AttributeError("predict_proba is only available for classifiers")
+        return self._lookup(X)
+
+    def predict(self, X):
+        if self.kind == "classifier":
+            return self.classes_.take(np.argmax(self._lookup(X), axis=1))
+        return self._lookup(X)[:, 0]
+
+    def nbytes(self):
+        return self.breakpoints.nbytes + self.values.nbytes
+
+    def save(self, path):
+        joblib.dump(self, path, compress=0)
+
+    @staticmethod
+    def load(path, mmap_mode="r"):
+        return joblib.load(path, mmap_mode=mmap_mode)
+
+
+_flattened = weakref.WeakKeyDictionary()
+
+
+def as_flat_forest(model):
+    """
+    FlatForest for model: model itself, or a flattened copy of a fitted
+    sklearn random forest (built once per model object), else None
+    """
+    if isinstance(model, FlatForest):
+        return model
+    if isinstance(model, DispatchForest):
+        return model.flat
+    if not hasattr(model, "estimators_") or type(model).__name__ not in ("RandomForestClassifier",
+                                                                           "RandomForestRegressor"):
+        return None
+    flat = _flattened.get(model)
+    if flat is None:
+        flat = _flattened[model] = FlatForest.from_sklearn(model)
+    return flat
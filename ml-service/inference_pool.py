@@ -0,0 +1,359 @@
+"""
+Bounded worker pool for blocking model inference
+
+scikit-learn transform/predict calls are CPU-bound and would otherwise run
+on the asyncio event loop, stalling every other request (including
+/health). Work is dispatched to a thread pool (tree traversal releases the
+GIL) or a process pool. The number of running plus queued calls is
+bounded; once full, new work is rejected immediately with PoolSaturated so
+the service can fail fast instead of building an unbounded backlog.
+
+Calls wait in the pool's own queue, not the executor's: only as many as
+there are workers are handed to the executor, and the next one is picked
+by priority class, then earliest deadline, then arrival. Each call has a
+priority ("interactive" before "batch") and an optional deadline, passed
+to run() or taken from the request's scheduling context (see
+SchedulingMiddleware, which reads them from request headers):
+
+  - a call whose deadline has passed when a worker frees up is dropped
+    with DeadlineExceeded instead of being run for a client that has
+    already given up
+  - lower-priority calls are only admitted while fewer than
+    low_priority_queue calls are waiting, and when the queue is full a
+    higher-priority call takes the place of the lowest-priority waiting
+    one (which fails with PoolSaturated), so bulk work is shed first
+"""
+
+import asyncio
+import contextvars
+import heapq
+import itertools
+import json
+import logging
+import math
+import os
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from functools import partial
+
+logger = logging.getLogger(__name__)
+
+# Most urgent first
+PRIORITIES = ("interactive", "batch")
+DEFAULT_PRIORITY = "interactive"
+OUTCOMES = ("completed", "failed", "expired", "shed", "rejected")
+
+PRIORITY_HEADER = "x-request-priority"
+DEADLINE_HEADER = "x-request-deadline-ms"
+
+# priority: one of PRIORITIES; deadline: time.monotonic() value or None
+Scheduling = namedtuple("Scheduling", ["priority", "deadline"])
+_scheduling = contextvars.ContextVar("inference_scheduling", default=Scheduling(DEFAULT_PRIORITY, None))
+
+
+class PoolSaturated(Exception):
+    """Raised when the inference queue is full"""
+
+    def __init__(self, retry_after):
+        super().__init__("Inference queue is full, retry later")
+        self.retry_after = retry_after
+
+
+class DeadlineExceeded(Exception):
+    """Raised when a call's deadline passes before it starts"""
+
+    def __init__(self):
+        super().__init__("Request deadline passed before inference started")
+
+
+def parse_scheduling(priority=None, deadline_ms=None):
+    """Scheduling from header-style values: a priority name and a time budget in milliseconds"""
+    priority = (priority or DEFAULT_PRIORITY).strip().lower()
+    if priority not in PRIORITIES:
+        raise ValueError(f"Unknown priority '{priority}' (choose from {', '.join(PRIORITIES)})")
+    deadline = None
+    if deadline_ms is not None and deadline_ms != "":
+        try:
+            budget = float(deadline_ms)
+        except (TypeError, ValueError):
+            raise ValueError(f"Invalid deadline '{deadline_ms}': expected milliseconds") from None
+        if not math.isfinite(budget) or budget < 0:
+            raise ValueError(f"Invalid deadline '{deadline_ms}': expected milliseconds")
+        deadline = time.monotonic() + budget / 1000.0
+    return Scheduling(priority, deadline)
+
+
+def current_scheduling():
+    return _scheduling.get()
+
+
+def set_scheduling(scheduling):
+    """Apply scheduling to inference calls made from the current task; returns a reset token"""
+    return _scheduling.set(scheduling)
+
+
+def reset_scheduling(token):
+    _scheduling.reset(token)
+
+
+class SchedulingMiddleware:
+    """
+    ASGI middleware setting the scheduling context of each request from
+    the X-Request-Priority (interactive / batch) and X-Request-Deadline-Ms
+    (time budget from arrival, e.g. the client's own timeout) headers
+
+    Only requests to `paths` (exact request paths, default: all) are
+    scheduled; a malformed header there is answered with 400, elsewhere
+    the headers are not read at all. on_response(scheduling, status, late)
+    is called after every scheduled HTTP response; late is True when it
+    was sent after the deadline.
+    """
+
+    def __init__(self, app, paths=None, on_response=None):
+        self.app = app
+        self.paths = None if paths is None else frozenset(paths)
+        self.on_response = on_response
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] not in ("http", "websocket") or (self.paths is not None and scope["path"] not in self.paths):
+            return await self.app(scope, receive, send)
+        headers = dict(scope.get("headers") or ())
+        priority = headers.get(PRIORITY_HEADER.encode())
+        deadline = headers.get(DEADLINE_HEADER.encode())
+        try:
+            scheduling = parse_scheduling(
+                priority.decode("latin-1") if priority else None,
+                # A connection-wide deadline means nothing for a long-lived stream
+                deadline.decode("latin-1") if deadline and scope["type"] == "http" else None,
+            )
+        except ValueError as e:
+            if scope["type"] == "websocket":
+                return await send({"type": "websocket.close", "code": 1008})
+            body = json.dumps({"detail": str(e)}).encode()
+            await send({"type": "http.response.start", "status": 400,
+                        "headers": [(b"content-type", b"application/json"),
+                                    (b"content-length", str(len(body)).encode())]})
+            return await send({"type": "http.response.body", "body": body})
+        token = _scheduling.set(scheduling)
+        status = 500
+        if scope["type"] == "http" and self.on_response is not None:
+            async def send_with_status(message):
+                nonlocal status
+                if message["type"] == "http.response.start":
+                    status = message["status"]
+                await send(message)
+        else:
+            send_with_status = send
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            _scheduling.reset(token)
+            if scope["type"] == "http" and self.on_response is not None:
+                late = scheduling.deadline is not None and time.monotonic() > scheduling.deadline
+                self.on_response(scheduling, status, late)
+
+
+class _Call:
+    __slots__ = ("rank", "deadline", "seq", "fn", "future", "priority", "enqueued")
+
+    def __init__(self, rank, deadline, seq, fn, future, priority):
+        self.rank = rank
+        self.deadline = deadline
+        self.seq = seq
+        self.fn = fn
+        self.future = future
+        self.priority = priority
+        self.enqueued = time.monotonic()
+
+    def key(self):
+        return (self.rank, math.inf if self.deadline is None else self.deadline, self.seq)
+
+    def __lt__(self, other):
+        return self.key() < other.key()
+
+
+class InferencePool:
+    """Run blocking inference calls off the event loop with a bounded priority queue"""
+
+    def __init__(self, kind="thread", workers=None, max_queue=64, retry_after=1, initializer=None,
+                 low_priority_queue=None):
+        """
+        kind: "thread" or "process"
+        workers: number of worker threads/processes (default: CPU count)
+        max_queue: calls allowed to wait for a free worker before rejecting
+        retry_after: seconds advertised to rejected clients
+        initializer: run once in each worker process (process pools only)
+        low_priority_queue: waiting calls beyond which calls below the top
+                            priority are shed (default: half of max_queue)
+        """
+        if kind not in ("thread", "process"):
+            raise ValueError(f"Unknown executor kind: {kind}")
+
+        self.kind = kind
+        self.workers = int(workers or os.cpu_count() or 1)
+        self.max_queue = max(0, int(max_queue))
+        self.low_priority_queue = self.max_queue // 2 if low_priority_queue is None else int(low_priority_queue)
+        self.retry_after = retry_after
+
+        if kind == "process":
+            self._executor = ProcessPoolExecutor(max_workers=self.workers, initializer=initializer)
+        else:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="inference")
+
+        self._queue = []  # heap of _Call
+        self._running = 0
+        self._seq = itertools.count()
+        self._closing = False
+        self._outcomes = {priority: dict.fromkeys(OUTCOMES, 0) for priority in PRIORITIES}
+        self._wait_seconds = dict.fromkeys(PRIORITIES, 0.0)
+
+    @property
+    def capacity(self):
+        return self.workers + self.max_queue
+
+    @property
+    def _pending(self):
+        return self._running + len(self._queue)
+
+    async def run(self, fn, *args, priority=None, deadline=None):
+        """
+        Run fn(*args) in the pool; raises PoolSaturated if the queue is full
+        (or the call is shed) and DeadlineExceeded if it expires while queued
+
+        priority / deadline default to the current scheduling context.
+        """
+        if self._closing:
+            raise RuntimeError("Inference pool is shut down")
+        context = _scheduling.get()
+        priority = priority or context.priority
+        deadline = context.deadline if deadline is None else deadline
+        rank = PRIORITIES.index(priority)
+        outcomes = self._outcomes[priority]
+
+        if deadline is not None and deadline <= time.monotonic():
+            outcomes["expired"] += 1
+            raise DeadlineExceeded()
+        if self._queue and (rank > 0 and len(self._queue) >= self.low_priority_queue or self._pending >= self.capacity):
+            # Calls that expired or were abandoned while waiting must not count against the limits
+            self._purge_stale()
+        if rank > 0 and len(self._queue) >= self.low_priority_queue and self._running >= self.workers:
+            outcomes["shed"] += 1
+            raise PoolSaturated(self.retry_after)
+        if self._pending >= self.capacity and not self._evict_below(rank):
+            outcomes["rejected"] += 1
+            raise PoolSaturated(self.retry_after)
+
+        loop = asyncio.get_running_loop()
+        call = _Call(rank, deadline, next(self._seq), partial(fn, *args), loop.create_future(), priority)
+        if self._running < self.workers and not self._queue:
+            self._start(call)
+        else:
+            heapq.heappush(self._queue, call)
+        return await call.future
+
+    def _purge_stale(self):
+        """Drop waiting calls that are done or past their deadline (failed with DeadlineExceeded)"""
+        now = time.monotonic()
+        waiting = []
+        for call in self._queue:
+            if call.future.done():
+                continue
+            if call.deadline is not None and call.deadline <= now:
+                self._outcomes[call.priority]["expired"] += 1
+                call.future.set_exception(DeadlineExceeded())
+                continue
+            waiting.append(call)
+        if len(waiting) < len(self._queue):
+            heapq.heapify(waiting)
+            self._queue = waiting
+
+    def _evict_below(self, rank):
+        """
+        Shed the least urgent waiting call if it ranks below `rank`; True if one was shed
+
+        Expired calls, of any rank, are dropped by _purge_stale() before this runs.
+        """
+        if not self._queue:
+            return False
+        victim = max(self._queue)
+        if victim.rank <= rank:
+            return False
+        self._queue.remove(victim)
+        heapq.heapify(self._queue)
+        self._outcomes[victim.priority]["shed"] += 1
+        victim.future.set_exception(PoolSaturated(self.retry_after))
+        return True
+
+    def _start(self, call):
+        self._running += 1
+        self._wait_seconds[call.priority] += time.monotonic() - call.enqueued
+        task = asyncio.get_running_loop().run_in_executor(self._executor, call.fn)
+        task.add_done_callback(partial(self._finished, call))
+
+    def _finished(self, call, task):
+        self._running -= 1
+        outcomes = self._outcomes[call.priority]
+        if task.cancelled():
+            outcomes["failed"] += 1
+            if not call.future.done():
+                call.future.cancel()
+        elif task.exception() is not None:
+            outcomes["failed"] += 1
+            if not call.future.done():
+                call.future.set_exception(task.exception())
+        else:
+            outcomes["completed"] += 1
+            if not call.future.done():
+                call.future.set_result(task.result())
+        self._dispatch()
+
+    def _dispatch(self):
+        """Start waiting calls, most urgent first, while workers are free"""
+        now = time.monotonic()
+        while self._queue and self._running < self.workers:
+            call = heapq.heappop(self._queue)
+            if call.future.done():
+                # Shed, or the caller went away
+                continue
+            if call.deadline is not None and call.deadline <= now:
+                self._outcomes[call.priority]["expired"] += 1
+                call.future.set_exception(DeadlineExceeded())
+                continue
+            self._start(call)
+        if self._closing and not self._queue:
+            self._executor.shutdown(wait=False)
+
+    def stats(self):
+        by_priority = {}
+        for priority, outcomes in self._outcomes.items():
+            started = outcomes["completed"] + outcomes["failed"]
+            by_priority[priority] = {
+                **outcomes,
+                "queued": sum(1 for call in self._queue if call.priority == priority and not call.future.done()),
+                "mean_wait_ms": round(self._wait_seconds[priority] / started * 1000, 3) if started else 0.0,
+            }
+        return {
+            "executor": self.kind,
+            "workers": self.workers,
+            "max_queue": self.max_queue,
+            "low_priority_queue": self.low_priority_queue,
+            "in_flight": self._running,
+            "queued": len(self._queue),
+            "completed": sum(o["completed"] for o in self._outcomes.values()),
+            "failed": sum(o["failed"] for o in self._outcomes.values()),
+            "rejected": sum(o["rejected"] + o["shed"] for o in self._outcomes.values()),
+            "expired": sum(o["expired"] for o in self._outcomes.values()),
+            "by_priority": by_priority,
+        }
+
+    def shutdown(self, cancel_pending=True):
+        """Stop the workers; with cancel_pending=False queued tasks still run"""
+        self._closing = True
+        if cancel_pending:
+            for call in self._queue:
+                call.future.cancel()
+            self._queue = []
+            self._executor.shutdown(wait=False, cancel_futures=True)
+        elif not self._queue:
+            self._executor.shutdown(wait=False)
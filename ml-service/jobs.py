@@ -0,0 +1,636 @@
+"""
+Asynchronous bulk scoring jobs
+
+A job is a large batch of feature rows (with optional certificate IDs)
+split into fixed-size chunks. Jobs are persisted in a JobStore and scored
+chunk by chunk by background workers in the service process; clients poll
+the job for progress and read results back as NDJSON while it runs.
+
+Scheduling:
+  - Workers always take the next pending chunk of the highest-priority,
+    oldest job, so a higher-priority job overtakes running ones at the
+    next chunk boundary.
+  - Before claiming a chunk a worker checks busy() (in the service: every
+    inference worker already has a request) and backs off instead, so job
+    chunks only fill idle inference capacity and interactive requests
+    never queue behind more than one chunk per job worker.
+  - Exceptions listed in retry_on (pool saturation) hand the chunk back
+    to the queue; any other error fails the job.
+
+Stores:
+  MemoryJobStore  - in-process dicts; jobs are lost on restart and are not
+                    shared between pre-forked workers
+  SQLiteJobStore  - a single SQLite file (WAL mode), shared by all workers
+                    of one host. A claimed chunk records the claiming PID
+                    and a lease; recover() (at startup and periodically)
+                    re-queues only chunks whose owner has died or whose
+                    lease has expired, never those a live sibling worker
+                    is still scoring
+Other backends plug in as "package.module:ClassName" (see load_job_store).
+"""
+
+import asyncio
+import importlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED_STATES = (DONE, FAILED, CANCELLED)
+
+FEATURE_DTYPE = np.float64
+
+
+def split_chunks(features, certificate_ids, chunk_size):
+    """[(features, ids or None)] of at most chunk_size rows each"""
+    return [
+        (features[start:start + chunk_size],
+         None if certificate_ids is None else list(certificate_ids[start:start + chunk_size]))
+        for start in range(0, len(features), chunk_size)
+    ]
+
+
+def new_job(rows, chunk_size, priority=0, meta=None):
+    """Job record for a freshly submitted batch"""
+    return {
+        "job_id": uuid.uuid4().hex,
+        "status": QUEUED,
+        "priority": int(priority),
+        "rows": int(rows),
+        "chunk_size": int(chunk_size),
+        "chunks": -(-int(rows) // int(chunk_size)),
+        "chunks_done": 0,
+        "rows_done": 0,
+        "created_at": time.time(),
+        "started_at": None,
+        "finished_at": None,
+        "error": None,
+        "meta": meta or {},
+    }
+
+
+def progress(job):
+    """Job record plus completion ratio, as returned by the API"""
+    return {**job, "progress": round(job["rows_done"] / job["rows"], 4) if job["rows"] else 1.0}
+
+
+class JobStore:
+    """Storage interface for jobs, their input chunks and chunk results"""
+
+    def create(self, job, chunks):
+        """Persist a job record and its [(features, ids)] chunks"""
+        raise NotImplementedError
+
+    def get(self, job_id):
+        """Job record, or None"""
+        raise NotImplementedError
+
+    def list(self, limit=100):
+        """Most recent job records first"""
+        raise NotImplementedError
+
+    def claim(self):
+        """
+        Mark the next chunk as running and return (job_id, index, features,
+        ids), or None when nothing is pending
+        """
+        raise NotImplementedError
+
+    def release(self, job_id, index):
+        """Put a claimed chunk back in the queue"""
+        raise NotImplementedError
+
+    def complete(self, job_id, index, results):
+        """Store a chunk's results (a list of dicts) and advance the job"""
+        raise NotImplementedError
+
+    def fail(self, job_id, error):
+        raise NotImplementedError
+
+    def cancel(self, job_id):
+        """Stop a queued or running job; returns the record, or None if unknown"""
+        raise NotImplementedError
+
+    def results(self, job_id, start=0):
+        """Yield (index, results) for consecutive completed chunks from start"""
+        raise NotImplementedError
+
+    def purge(self, older_than):
+        """Delete finished jobs that ended before the given timestamp, return the count"""
+        raise NotImplementedError
+
+    def recover(self, startup=False):
+        """
+        Re-queue chunks left running by a dead process, return the count
+
+        startup: called before this process has claimed anything, so chunks
+                 recorded under its own PID belong to an earlier process
+        """
+        return 0
+
+    def stats(self):
+        return {}
+
+
+def pid_alive(pid):
+    """Whether a process with this PID exists on this host"""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class MemoryJobStore(JobStore):
+    """In-process job store"""
+
+    def __init__(self):
+        self._jobs = {}
+        self._chunks = {}  # job_id -> list of {"status", "features", "ids", "results"}
+        self._lock = threading.Lock()
+
+    def create(self, job, chunks):
+        with self._lock:
+            self._jobs[job["job_id"]] = dict(job)
+            self._chunks[job["job_id"]] = [
+                {"status": QUEUED, "features": features, "ids": ids, "results": None} for features, ids in chunks
+            ]
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job is not None else None
+
+    def list(self, limit=100):
+        with self._lock:
+            jobs = sorted(self._jobs.values(), key=lambda job: job["created_at"], reverse=True)
+            return [dict(job) for job in jobs[:limit]]
+
+    def claim(self):
+        with self._lock:
+            active = [job for job in self._jobs.values() if job["status"] in (QUEUED, RUNNING)]
+            for job in sorted(active, key=lambda job: (-job["priority"], job["created_at"])):
+                for index, chunk in enumerate(self._chunks[job["job_id"]]):
+                    if chunk["status"] == QUEUED:
+                        chunk["status"] = RUNNING
+                        if job["status"] == QUEUED:
+                            job["status"], job["started_at"] = RUNNING, time.time()
+                        return job["job_id"], index, chunk["features"], chunk["ids"]
+            return None
+
+    def release(self, job_id, index):
+        with self._lock:
+            chunks = self._chunks.get(job_id)
+            if chunks is not None and chunks[index]["status"] == RUNNING:
+                chunks[index]["status"] = QUEUED
+
+    def complete(self, job_id, index, results):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job["status"] in FINISHED_STATES:
+                return
+            chunk = self._chunks[job_id][index]
+            if chunk["status"] == DONE:
+                return  # scored twice after a re-queue
+            chunk.update(status=DONE, results=results, features=None, ids=None)
+            job["chunks_done"] += 1
+            job["rows_done"] += len(results)
+            if job["chunks_done"] == job["chunks"]:
+                job["status"], job["finished_at"] = DONE, time.time()
+
+    def fail(self, job_id, error):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None and job["status"] not in FINISHED_STATES:
+                job.update(status=FAILED, error=str(error), finished_at=time.time())
+
+    def cancel(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            if job["status"] not in FINISHED_STATES:
+                job.update(status=CANCELLED, finished_at=time.time())
+                for chunk in self._chunks[job_id]:
+                    chunk.update(features=None, ids=None)
+            return dict(job)
+
+    def results(self, job_id, start=0):
+        with self._lock:
+            chunks = list(self._chunks.get(job_id, []))
+        for index in range(start, len(chunks)):
+            if chunks[index]["status"] != DONE:
+                return
+            yield index, chunks[index]["results"]
+
+    def purge(self, older_than):
+        with self._lock:
+            expired = [
+                job_id for job_id, job in self._jobs.items()
+                if job["status"] in FINISHED_STATES and job["finished_at"] < older_than
+            ]
+            for job_id in expired:
+                del self._jobs[job_id], self._chunks[job_id]
+            return len(expired)
+
+    def stats(self):
+        with self._lock:
+            counts = {}
+            for job in self._jobs.values():
+                counts[job["status"]] = counts.get(job["status"], 0) + 1
+            pending = sum(
+                chunk["status"] == QUEUED
+                for job_id, chunks in self._chunks.items() if self._jobs[job_id]["status"] in (QUEUED, RUNNING)
+                for chunk in chunks
+            )
+        return {"backend": "memory", "jobs": counts, "pending_chunks": pending}
+
+
+class SQLiteJobStore(JobStore):
+    """Job store in one SQLite file; features are stored as raw float64 bytes, results as NDJSON"""
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS jobs (
+            job_id TEXT PRIMARY KEY,
+            status TEXT NOT NULL,
+            priority INTEGER NOT NULL,
+            created_at REAL NOT NULL,
+            record TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS chunks (
+            job_id TEXT NOT NULL,
+            idx INTEGER NOT NULL,
+            status TEXT NOT NULL,
+            rows INTEGER NOT NULL,
+            features BLOB,
+            ids TEXT,
+            results TEXT,
+            owner INTEGER,
+            lease_until REAL,
+            PRIMARY KEY (job_id, idx)
+        );
+        CREATE INDEX IF NOT EXISTS jobs_queue ON jobs (status, priority DESC, created_at);
+    """
+
+    def __init__(self, path="jobs.sqlite3", lease_seconds=600.0):
+        """lease_seconds: how long a claimed chunk is reserved; must exceed the slowest chunk"""
+        self.path = Path(path)
+        self.lease_seconds = float(lease_seconds)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(self.SCHEMA)
+        # Stores created before chunk leases existed
+        columns = {row[1] for row in self._db.execute("PRAGMA table_info(chunks)")}
+        for column, kind in (("owner", "INTEGER"), ("lease_until", "REAL")):
+            if column not in columns:
+                self._db.execute(f"ALTER TABLE chunks ADD COLUMN {column} {kind}")
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def _transaction(self):
+        """BEGIN IMMEDIATE ... COMMIT, so read-modify-write is atomic across processes"""
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._db
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            self._db.execute("COMMIT")
+
+    def _read(self, db, job_id):
+        row = db.execute("SELECT record FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _write(self, db, job):
+        db.execute(
+            "UPDATE jobs SET status = ?, record = ? WHERE job_id = ?", (job["status"], json.dumps(job), job["job_id"])
+        )
+
+    def create(self, job, chunks):
+        with self._transaction() as db:
+            db.execute(
+                "INSERT INTO jobs (job_id, status, priority, created_at, record) VALUES (?, ?, ?, ?, ?)",
+                (job["job_id"], job["status"], job["priority"], job["created_at"], json.dumps(job)),
+            )
+            db.executemany(
+                "INSERT INTO chunks (job_id, idx, status, rows, features, ids) VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    (job["job_id"], index, QUEUED, len(features),
+                     np.ascontiguousarray(features, dtype=FEATURE_DTYPE).tobytes(),
+                     None if ids is None else json.dumps(ids))
+                    for index, (features, ids) in enumerate(chunks)
+                ),
+            )
+
+    def get(self, job_id):
+        with self._lock:
+            return self._read(self._db, job_id)
+
+    def list(self, limit=100):
+        with self._lock:
+            rows = self._db.execute("SELECT record FROM jobs ORDER BY created_at DESC LIMIT ?", (limit,)).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def claim(self):
+        with self._transaction() as db:
+            row = db.execute(
+                """
+                SELECT c.job_id, c.idx, c.rows, c.features, c.ids FROM jobs j
+                JOIN chunks c ON c.job_id = j.job_id AND c.status = ?
+                WHERE j.status IN (?, ?)
+                ORDER BY j.priority DESC, j.created_at, c.idx
+                LIMIT 1
+                """,
+                (QUEUED, QUEUED, RUNNING),
+            ).fetchone()
+            if row is None:
+                return None
+            job_id, index, rows, features, ids = row
+            db.execute(
+                "UPDATE chunks SET status = ?, owner = ?, lease_until = ? WHERE job_id = ? AND idx = ?",
+                (RUNNING, os.getpid(), time.time() + self.lease_seconds, job_id, index),
+            )
+            job = self._read(db, job_id)
+            if job["status"] == QUEUED:
+                job["status"], job["started_at"] = RUNNING, time.time()
+                self._write(db, job)
+        features = np.frombuffer(features, dtype=FEATURE_DTYPE).reshape(rows, -1)
+        return job_id, index, features, None if ids is None else json.loads(ids)
+
+    def release(self, job_id, index):
+        with self._transaction() as db:
+            db.execute(
+                "UPDATE chunks SET status = ?, owner = NULL, lease_until = NULL WHERE job_id = ? AND idx = ? AND status = ?",
+                (QUEUED, job_id, index, RUNNING),
+            )
+
+    def complete(self, job_id, index, results):
+        ndjson = "".join(json.dumps(result, separators=(",", ":")) + "\n" for result in results)
+        with self._transaction() as db:
+            job = self._read(db, job_id)
+            if job is None or job["status"] in FINISHED_STATES:
+                return
+            updated = db.execute(
+                """
+                UPDATE chunks SET status = ?, results = ?, features = NULL, ids = NULL
+                WHERE job_id = ? AND idx = ? AND status != ?
+                """,
+                (DONE, ndjson, job_id, index, DONE),
+            ).rowcount
+            if not updated:
+                return  # scored twice after a re-queue
+            job["chunks_done"] += 1
+            job["rows_done"] += len(results)
+            if job["chunks_done"] == job["chunks"]:
+                job["status"], job["finished_at"] = DONE, time.time()
+            self._write(db, job)
+
+    def fail(self, job_id, error):
+        with self._transaction() as db:
+            job = self._read(db, job_id)
+            if job is not None and job["status"] not in FINISHED_STATES:
+                job.update(status=FAILED, error=str(error), finished_at=time.time())
+                self._write(db, job)
+
+    def cancel(self, job_id):
+        with self._transaction() as db:
+            job = self._read(db, job_id)
+            if job is not None and job["status"] not in FINISHED_STATES:
+                job.update(status=CANCELLED, finished_at=time.time())
+                self._write(db, job)
+                db.execute("UPDATE chunks SET features = NULL, ids = NULL WHERE job_id = ?", (job_id,))
+            return job
+
+    def results(self, job_id, start=0):
+        index = start
+        while True:
+            # One short read per chunk, so the lock is never held while the caller streams
+            with self._lock:
+                row = self._db.execute(
+                    "SELECT status, results FROM chunks WHERE job_id = ? AND idx = ?", (job_id, index)
+                ).fetchone()
+            if row is None or row[0] != DONE:
+                return
+            yield index, [json.loads(line) for line in row[1].splitlines()]
+            index += 1
+
+    def purge(self, older_than):
+        with self._transaction() as db:
+            expired = [
+                json.loads(row[0])["job_id"]
+                for row in db.execute("SELECT record FROM jobs WHERE status IN (?, ?, ?)", FINISHED_STATES)
+                if (json.loads(row[0])["finished_at"] or 0) < older_than
+            ]
+            for job_id in expired:
+                db.execute("DELETE FROM chunks WHERE job_id = ?", (job_id,))
+                db.execute("DELETE FROM jobs WHERE job_id = ?", (job_id,))
+        return len(expired)
+
+    def recover(self, startup=False):
+        """Re-queue running chunks whose owner is gone or whose lease has expired"""
+        now = time.time()
+        this_process = os.getpid()
+        with self._transaction() as db:
+            running = db.execute(
+                """
+                SELECT c.job_id, c.idx, c.owner, c.lease_until FROM chunks c JOIN jobs j ON j.job_id = c.job_id
+                WHERE c.status = ? AND j.status IN (?, ?)
+                """,
+                (RUNNING, QUEUED, RUNNING),
+            ).fetchall()
+            stale = [
+                (job_id, index) for job_id, index, owner, lease_until in running
+                # Chunks without an owner predate leases
+                if owner is None or lease_until is None or lease_until < now
+                or (owner == this_process and startup)
+                or (owner != this_process and not pid_alive(owner))
+            ]
+            db.executemany(
+                "UPDATE chunks SET status = ?, owner = NULL, lease_until = NULL WHERE job_id = ? AND idx = ?",
+                ((QUEUED, job_id, index) for job_id, index in stale),
+            )
+        return len(stale)
+
+    def stats(self):
+        with self._lock:
+            counts = dict(self._db.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+            pending = self._db.execute(
+                """
+                SELECT COUNT(*) FROM chunks c JOIN jobs j ON j.job_id = c.job_id
+                WHERE c.status = ? AND j.status IN (?, ?)
+                """,
+                (QUEUED, QUEUED, RUNNING),
+            ).fetchone()[0]
+        return {"backend": "sqlite", "path": str(self.path), "jobs": counts, "pending_chunks": pending}
+
+
+def load_job_store(spec, path="jobs.sqlite3", lease_seconds=600.0):
+    """Build a store from "sqlite", "memory" or a "package.module:ClassName" path"""
+    if not spec or spec == "sqlite":
+        return SQLiteJobStore(path, lease_seconds=lease_seconds)
+    if spec == "memory":
+        return MemoryJobStore()
+    module_name, _, class_name = spec.partition(":")
+    store_class = getattr(importlib.import_module(module_name), class_name)
+    return store_class()
+
+
+class JobRunner:
+    """Background workers scoring job chunks from a JobStore"""
+
+    def __init__(self, store, run_chunk, execute=None, workers=1, busy=None, retry_on=(),
+                 backoff_seconds=0.05, idle_seconds=1.0, ttl_seconds=86400.0):
+        """
+        run_chunk: callable run_chunk(features, ids) returning one result dict per row
+        execute: optional coroutine function execute(fn, *args) used to run
+                 chunks (e.g. the inference pool); chunks run inline when omitted
+        busy: optional callable; while it returns True no new chunk is started
+        retry_on: exception types that re-queue the chunk instead of failing the job
+        ttl_seconds: finished jobs are purged this long after they end
+        """
+        self.store = store
+        self.run_chunk = run_chunk
+        self.execute = execute
+        self.workers = max(1, int(workers))
+        self.busy = busy
+        self.retry_on = tuple(retry_on)
+        self.backoff = float(backoff_seconds)
+        self.idle = float(idle_seconds)
+        self.ttl = float(ttl_seconds)
+
+        self._tasks = []
+        self._wake = asyncio.Event()
+        self._changed = asyncio.Condition()
+        self._last_purge = 0.0
+
+        # Stats
+        self.chunks = 0
+        self.rows = 0
+        self.deferrals = 0
+        self.retries = 0
+        self.failures = 0
+
+    def start(self):
+        recovered = self.store.recover(startup=True)
+        if recovered:
+            logger.info(f"Re-queued {recovered} interrupted job chunks")
+        self._tasks = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def submit(self, features, certificate_ids=None, priority=0, chunk_size=500, meta=None):
+        """Store a new job and wake the workers; returns the job record"""
+        job = new_job(len(features), chunk_size, priority, meta)
+        chunks = split_chunks(features, certificate_ids, job["chunk_size"])
+        await asyncio.to_thread(self.store.create, job, chunks)
+        self._wake.set()
+        return job
+
+    async def wait_for_change(self, timeout):
+        """Wait until any job makes progress (or timeout seconds pass)"""
+        async with self._changed:
+            try:
+                await asyncio.wait_for(self._changed.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _notify(self):
+        async with self._changed:
+            self._changed.notify_all()
+
+    async def _work(self):
+        while True:
+            try:
+                await self._step()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Job worker error: {e}")
+                await asyncio.sleep(self.idle)
+
+    async def _step(self):
+        if self.busy is not None and self.busy():
+            self.deferrals += 1
+            await asyncio.sleep(self.backoff)
+            return
+
+        claimed = await asyncio.to_thread(self.store.claim)
+        if claimed is None:
+            await self._purge()
+            self._wake.clear()
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.idle)
+            except asyncio.TimeoutError:
+                pass
+            return
+
+        job_id, index, features, ids = claimed
+        try:
+            if self.execute is not None:
+                results = await self.execute(self.run_chunk, features, ids)
+            else:
+                results = self.run_chunk(features, ids)
+        except self.retry_on:
+            self.retries += 1
+            await asyncio.to_thread(self.store.release, job_id, index)
+            await asyncio.sleep(self.backoff)
+            return
+        except asyncio.CancelledError:
+            await asyncio.to_thread(self.store.release, job_id, index)
+            raise
+        except Exception as e:
+            self.failures += 1
+            logger.error(f"Job {job_id} failed on chunk {index}: {e}")
+            await asyncio.to_thread(self.store.fail, job_id, f"Chunk {index}: {e}")
+        else:
+            await asyncio.to_thread(self.store.complete, job_id, index, results)
+            self.chunks += 1
+            self.rows += len(results)
+        await self._notify()
+
+    async def _purge(self):
+        now = time.time()
+        if now - self._last_purge < 60:
+            return
+        self._last_purge = now
+        purged = await asyncio.to_thread(self.store.purge, now - self.ttl)
+        if purged:
+            logger.info(f"Purged {purged} finished jobs")
+        # Chunks of a worker that died without being restarted
+        recovered = await asyncio.to_thread(self.store.recover)
+        if recovered:
+            logger.info(f"Re-queued {recovered} abandoned job chunks")
+
+    def stats(self):
+        return {
+            "workers": self.workers,
+            "chunks": self.chunks,
+            "rows": self.rows,
+            "deferrals": self.deferrals,
+            "retries": self.retries,
+            "failures": self.failures,
+            **self.store.stats(),
+        }
@@ -0,0 +1,334 @@
+"""
+Service metrics in the Prometheus text exposition format
+
+A small in-process implementation of counters, gauges and histograms (no
+client library dependency) plus an ASGI middleware that records request
+latency, in-flight requests and response codes per route. Inference code
+times its stages with Metrics.time(); when metrics are switched off at
+runtime every call short-circuits to a shared no-op timer.
+
+Each process keeps its own values: with serve.py every worker exposes its
+own /metrics, and stage timings recorded inside a process-pool executor
+stay in the worker process.
+
+SamplingProfiler is an optional wall-clock sampler built on
+sys._current_frames(); it aggregates collapsed stacks (flamegraph.pl
+format) and is meant to be enabled on a single replica.
+"""
+
+import bisect
+import math
+import os
+import sys
+import threading
+import time
+from collections import Counter as StackCounter
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024, 4096, 10000)
+
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    pairs.extend(f'{name}="{_escape(value)}"' for name, value in extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    type = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _check(self, labels):
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {labels}")
+
+    def samples(self):
+        """(suffix, label values, extra labels, value) tuples for rendering"""
+        raise NotImplementedError
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        for suffix, labels, extra, value in self.samples():
+            lines.append(f"{self.name}{suffix}{_format_labels(self.labelnames, labels, extra)} {_format_value(value)}")
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def inc(self, *labels, amount=1):
+        self._check(labels)
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            return [("_total", labels, (), value) for labels, value in sorted(self._values.items())]
+
+
+class Gauge(_Metric):
+    type = "gauge"
+
+    def inc(self, *labels, amount=1):
+        self._check(labels)
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def dec(self, *labels, amount=1):
+        self.inc(*labels, amount=-amount)
+
+    def set(self, value, *labels):
+        self._check(labels)
+        with self._lock:
+            self._values[labels] = value
+
+    def samples(self):
+        with self._lock:
+            return [("", labels, (), value) for labels, value in sorted(self._values.items())]
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, *labels):
+        self._check(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(labels)
+            if state is None:
+                # Per-bucket counts (last slot is +Inf), sum, count
+                state = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def samples(self):
+        out = []
+        with self._lock:
+            items = sorted((labels, (list(state[0]), state[1], state[2])) for labels, state in self._values.items())
+        for labels, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (math.inf,), counts):
+                cumulative += bucket_count
+                out.append(("_bucket", labels, (("le", _format_value(bound)),), cumulative))
+            out.append(("_sum", labels, (), total))
+            out.append(("_count", labels, (), count))
+        return out
+
+
+class _Timer:
+    __slots__ = ("histogram", "labels", "started")
+
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.started, *self.labels)
+        return False
+
+
+class _NullTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class Metrics:
+    """Registry of metrics with a runtime on/off switch"""
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self._metrics = []
+        self._collectors = []
+
+    def _register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def add_collector(self, collect):
+        """Register a callable run at scrape time, before rendering (e.g. to refresh gauges)"""
+        self._collectors.append(collect)
+
+    def time(self, histogram, *labels):
+        """Context manager observing the elapsed seconds into histogram (no-op when disabled)"""
+        if not self.enabled:
+            return _NULL_TIMER
+        return _Timer(histogram, labels)
+
+    def observe(self, histogram, value, *labels):
+        if self.enabled:
+            histogram.observe(value, *labels)
+
+    def inc(self, counter, *labels, amount=1):
+        if self.enabled:
+            counter.inc(*labels, amount=amount)
+
+    def render(self):
+        for collect in self._collectors:
+            collect()
+        return "\n".join(metric.render() for metric in self._metrics) + "\n"
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording latency, status codes and in-flight requests per route
+
+    Requests are labelled with the matched route template (e.g.
+    "/fraud-detection"), or "unmatched", so cardinality stays bounded.
+    """
+
+    def __init__(self, app, metrics, latency, in_flight, exclude=("/metrics",)):
+        self.app = app
+        self.metrics = metrics
+        self.latency = latency
+        self.in_flight = in_flight
+        self.exclude = set(exclude)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.metrics.enabled or scope["path"] in self.exclude:
+            await self.app(scope, receive, send)
+            return
+
+        status = [500]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        self.in_flight.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            endpoint = getattr(route, "path", "unmatched")
+            self.latency.observe(time.perf_counter() - started, endpoint, scope["method"], str(status[0]))
+            self.in_flight.dec()
+
+
+class SamplingProfiler:
+    """
+    Wall-clock stack sampler using sys._current_frames()
+
+    Every interval the stack of each thread (except the sampler) is
+    recorded as a collapsed "module:function;module:function" string.
+    At most max_stacks distinct stacks are kept; further new stacks are
+    counted as dropped.
+    """
+
+    def __init__(self, interval=0.01, max_depth=64, max_stacks=10000):
+        self.interval = float(interval)
+        self.max_depth = int(max_depth)
+        self.max_stacks = int(max_stacks)
+        self._stacks = StackCounter()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.samples = 0
+        self.dropped = 0
+        self.started_at = None
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        if self.running:
+            return
+        self._stop.clear()
+        self.started_at = time.time()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+        self._thread = None
+
+    def reset(self):
+        with self._lock:
+            self._stacks.clear()
+            self.samples = 0
+            self.dropped = 0
+
+    def _collapse(self, frame):
+        names = []
+        while frame is not None and len(names) < self.max_depth:
+            code = frame.f_code
+            names.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+            frame = frame.f_back
+        return ";".join(reversed(names))
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            stacks = [self._collapse(frame) for ident, frame in sys._current_frames().items() if ident != own]
+            with self._lock:
+                self.samples += 1
+                for stack in stacks:
+                    if stack in self._stacks or len(self._stacks) < self.max_stacks:
+                        self._stacks[stack] += 1
+                    else:
+                        self.dropped += 1
+
+    def snapshot(self, top=None):
+        """Most frequent stacks as (stack, count) pairs"""
+        with self._lock:
+            return self._stacks.most_common(top)
+
+    def collapsed(self, top=None):
+        """Stacks in flamegraph.pl collapsed format"""
+        return "\n".join(f"{stack} {count}" for stack, count in self.snapshot(top)) + "\n"
+
+    def stats(self):
+        return {
+            "running": self.running,
+            "interval_seconds": self.interval,
+            "samples": self.samples,
+            "distinct_stacks": len(self._stacks),
+            "dropped": self.dropped,
+            "started_at": self.started_at,
+        }
@@ -0,0 +1,520 @@
+"""
+Lazily loaded model registry
+
+Replaces eager loading of every artifact at startup. Each model is
+loaded on first use (or up front if listed for warm-up), independently of
+the others, so one missing file only makes that model unavailable.
+Artifacts are opened with joblib's mmap_mode so uncompressed numpy
+payloads are mapped from disk instead of copied into the heap; replicas
+only pay memory for the models they actually serve.
+
+ModelVersions manages versioned model directories (models/<version>/)
+on top of it: a new version is loaded and warmed in the background and
+then swapped in atomically, with the previous one kept for rollback.
+"""
+
+import hashlib
+import logging
+import os
+import re
+import threading
+import time
+import weakref
+from pathlib import Path
+
+import joblib
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class ModelNotAvailable(KeyError):
+    """Raised when a model has no artifact or failed to load"""
+
+    def __str__(self):
+        return str(self.args[0]) if self.args else "Model not available"
+
+
+def estimate_nbytes(obj, _seen=None):
+    """
+    Estimate the bytes held by a loaded artifact
+
+    Sums numpy buffers reachable from the object (including sklearn tree
+    node arrays). Memory-mapped arrays are reported separately by the
+    caller since their pages are file-backed and shared.
+    """
+    if _seen is None:
+        _seen = set()
+    if id(obj) in _seen:
+        return 0
+    _seen.add(id(obj))
+
+    if isinstance(obj, np.memmap):
+        return 0
+    if isinstance(obj, np.ndarray):
+        if obj.dtype == object:
+            return obj.nbytes + sum(estimate_nbytes(item, _seen) for item in obj.ravel())
+        return obj.nbytes if obj.base is None else 0
+    if isinstance(obj, (list, tuple, set, frozenset)):
+        return sum(estimate_nbytes(item, _seen) for item in obj)
+    if isinstance(obj, dict):
+        return sum(estimate_nbytes(value, _seen) for value in obj.values())
+    if type(obj).__name__ == "Tree" and hasattr(obj, "__getstate__"):
+        # sklearn.tree._tree.Tree keeps its nodes in a C buffer
+        state = obj.__getstate__()
+        return state["nodes"].nbytes + state["values"].nbytes
+    if hasattr(obj, "__dict__"):
+        return sum(estimate_nbytes(value, _seen) for value in vars(obj).values())
+    return 0
+
+
+def mapped_nbytes(obj, _seen=None):
+    """Bytes of memory-mapped arrays reachable from the object"""
+    if _seen is None:
+        _seen = set()
+    if id(obj) in _seen:
+        return 0
+    _seen.add(id(obj))
+
+    if isinstance(obj, np.memmap):
+        return obj.nbytes
+    if isinstance(obj, np.ndarray):
+        return mapped_nbytes(obj.base, _seen) if obj.base is not None else 0
+    if isinstance(obj, (list, tuple, set, frozenset)):
+        return sum(mapped_nbytes(item, _seen) for item in obj)
+    if isinstance(obj, dict):
+        return sum(mapped_nbytes(value, _seen) for value in obj.values())
+    if hasattr(obj, "__dict__"):
+        return sum(mapped_nbytes(value, _seen) for value in vars(obj).values())
+    return 0
+
+
+# Registries are rebuilt on every reload, so one fork hook covers all live
+# ones; a hook per registry would keep each (and its models) alive forever.
+_live_registries = weakref.WeakSet()
+
+
+def _reset_registry_locks():
+    # A lock held by another thread at fork time would never be released in the child
+    for registry in list(_live_registries):
+        registry._reset_locks()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_registry_locks)
+
+
+class ModelRegistry:
+    """
+    Name -> model mapping that loads artifacts on first access
+
+    Supports the read-only mapping protocol used by the service:
+      name in registry   - an artifact exists (loaded or loadable)
+      registry[name]     - the model, loaded lazily
+      len(registry)      - number of models currently loaded
+    """
+
+    def __init__(self, models_dir, artifacts, mmap_mode="r", alternatives=None, model_version=None, compose=None):
+        """
+        models_dir: directory holding the artifacts
+        artifacts: dict of model name -> file name within models_dir
+        mmap_mode: passed to joblib.load (None to disable memory mapping)
+        alternatives: optional dict of model name -> file names preferred over
+                      the default artifact when present (e.g. compiled forests)
+        model_version: release name of this set of artifacts, reported in responses
+        compose: optional callable(model, load_default) -> model applied to a
+                 model loaded from an alternative; load_default() loads the
+                 default artifact (None if missing), e.g. to keep both engines
+        """
+        self.models_dir = Path(models_dir)
+        self.artifacts = dict(artifacts)
+        self.alternatives = dict(alternatives or {})
+        self.compose = compose
+        self.mmap_mode = mmap_mode
+        self.model_version = model_version
+
+        self._models = {}
+        self._info = {}
+        self._locks = {}
+        self._listeners = []
+        self._registry_lock = threading.Lock()
+        _live_registries.add(self)
+
+    def _reset_locks(self):
+        self._registry_lock = threading.Lock()
+        self._locks = {}
+
+    def _lock_for(self, name):
+        with self._registry_lock:
+            return self._locks.setdefault(name, threading.Lock())
+
+    def path(self, name):
+        """Artifact to load for a model: the first existing alternative, else the default"""
+        if name not in self.artifacts:
+            raise ModelNotAvailable(f"Unknown model: {name}")
+        for filename in self.alternatives.get(name, ()):
+            candidate = self.models_dir / filename
+            if candidate.exists():
+                return candidate
+        return self.models_dir / self.artifacts[name]
+
+    def __contains__(self, name):
+        return name in self._models or (name in self.artifacts and self.path(name).exists())
+
+    def __getitem__(self, name):
+        model = self._models.get(name)
+        if model is None:
+            model = self.load(name)
+        return model
+
+    def __len__(self):
+        return len(self._models)
+
+    def get(self, name, default=None):
+        try:
+            return self[name]
+        except ModelNotAvailable:
+            return default
+
+    def add_listener(self, callback):
+        """Call callback(name, registry) whenever a model is (re)loaded or unloaded"""
+        self._listeners.append(callback)
+
+    def _notify(self, name):
+        for callback in self._listeners:
+            try:
+                callback(name, self)
+            except Exception as e:
+                logger.error(f"Model listener failed for '{name}': {e}")
+
+    def version(self, name):
+        """Fingerprint of the loaded artifact, or None if the model is not loaded"""
+        return self._info.get(name, {}).get("version") if name in self._models else None
+
+    def loaded_names(self):
+        return list(self._models)
+
+    def available_names(self):
+        return [name for name in self.artifacts if name in self]
+
+    def load(self, name):
+        """Load one model (once, even under concurrent first use)"""
+        with self._lock_for(name):
+            if name in self._models:
+                return self._models[name]
+
+            path = self.path(name)
+            if not path.exists():
+                self._info[name] = {"error": f"Artifact not found: {path}"}
+                raise ModelNotAvailable(f"Model '{name}' not available: artifact not found at {path}")
+
+            started = time.perf_counter()
+            try:
+                model = joblib.load(path, mmap_mode=self.mmap_mode)
+                default = self.models_dir / self.artifacts[name]
+                if self.compose is not None and path != default:
+                    model = self.compose(
+                        model, lambda: joblib.load(default, mmap_mode=self.mmap_mode) if default.exists() else None
+                    )
+            except Exception as e:
+                self._info[name] = {"error": str(e)}
+                logger.error(f"❌ Error loading model '{name}': {e}")
+                raise ModelNotAvailable(f"Model '{name}' failed to load: {e}") from e
+            load_seconds = time.perf_counter() - started
+
+            stat = path.stat()
+            self._info[name] = {
+                "path": str(path),
+                "version": hashlib.blake2b(
+                    f"{path}:{stat.st_mtime_ns}:{stat.st_size}".encode(), digest_size=6
+                ).hexdigest(),
+                "size_on_disk": stat.st_size,
+                "load_seconds": round(load_seconds, 4),
+                "resident_bytes": estimate_nbytes(model),
+                "mapped_bytes": mapped_nbytes(model),
+                "loaded_at": time.time(),
+            }
+            self._models[name] = model
+            logger.info(f"✅ Loaded '{name}' in {load_seconds * 1000:.1f} ms")
+        self._notify(name)
+        return model
+
+    def warm_up(self, names=None):
+        """Load the given models (default: all available) now; returns names that failed"""
+        failed = []
+        for name in (self.available_names() if names is None else names):
+            try:
+                self.load(name)
+            except ModelNotAvailable as e:
+                logger.error(f"❌ Warm-up failed: {e}")
+                failed.append(name)
+        return failed
+
+    def unload(self, name):
+        with self._lock_for(name):
+            self._models.pop(name, None)
+            self._info.pop(name, None)
+        self._notify(name)
+
+    def info(self, name):
+        """Load state, load time and resident size for one model"""
+        return {
+            "loaded": name in self._models,
+            "available": name in self,
+            **self._info.get(name, {}),
+        }
+
+
+LEGACY_VERSION = "1.0.0"
+POINTER_FILE = "CURRENT"
+
+
+class ReloadInProgress(RuntimeError):
+    """Raised when a model version change is requested while another is running"""
+
+
+def _version_key(version):
+    """Natural sort key, so "1.10.0" sorts after "1.9.0" and timestamps sort by date"""
+    return [int(part) if part.isdigit() else part for part in re.split(r"(\d+)", version)]
+
+
+class ModelVersions:
+    """
+    Versioned model directories with background load, atomic swap and rollback
+
+    Layout: root/<version>/<artifact>. Artifacts placed directly in root
+    (the pre-versioning layout) are served as LEGACY_VERSION. The version to
+    serve is the one named in root/CURRENT, else the newest directory.
+
+    activate() builds a fresh ModelRegistry for the version, loads every
+    available artifact, runs the caller's warm-up, and only then swaps it in.
+    In-flight requests keep using the registry they started with, so nothing
+    is dropped; the swapped-out registry is kept for rollback().
+    """
+
+    def __init__(self, root, artifacts, mmap_mode="r", alternatives=None, legacy_version=LEGACY_VERSION,
+                 compose=None):
+        self.root = Path(root)
+        self.artifacts = dict(artifacts)
+        self.alternatives = dict(alternatives or {})
+        self.compose = compose
+        self.mmap_mode = mmap_mode
+        self.legacy_version = legacy_version
+
+        self._listeners = []
+        self._swap_listeners = []
+        self._lock = threading.Lock()
+        self._watcher = None
+        self._stop_watching = threading.Event()
+        self.previous = None
+        self.status = {"state": "idle"}
+        self._rejected = None  # (version, fingerprint) the watcher failed to load
+
+        version = self.target_version()
+        self.active = self._build(version or legacy_version)
+        self._fingerprint = self.fingerprint(self.active.model_version)
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._reset_after_fork)
+
+    def _reset_after_fork(self):
+        self._lock = threading.Lock()
+        self._watcher = None
+
+    @property
+    def active_version(self):
+        return self.active.model_version
+
+    def _filenames(self):
+        names = set(self.artifacts.values())
+        for alternatives in self.alternatives.values():
+            names.update(alternatives)
+        return names
+
+    def _has_artifacts(self, path):
+        return any((path / filename).exists() for filename in self._filenames())
+
+    def versions(self):
+        """Available versions, oldest first, as {version: directory}"""
+        found = {}
+        if self.root.is_dir():
+            if self._has_artifacts(self.root):
+                found[self.legacy_version] = self.root
+            for path in self.root.iterdir():
+                if path.is_dir() and self._has_artifacts(path):
+                    found[path.name] = path
+        return dict(sorted(found.items(), key=lambda item: _version_key(item[0])))
+
+    def target_version(self):
+        """Version named in the pointer file if it exists, else the newest one"""
+        versions = self.versions()
+        pointer = self.root / POINTER_FILE
+        if pointer.exists():
+            version = pointer.read_text().strip()
+            if version in versions:
+                return version
+            logger.error(f"❌ {pointer} names unknown version '{version}', ignoring")
+        return next(reversed(versions), None)
+
+    def write_pointer(self, version):
+        """Record the version to serve, so other workers' watchers follow"""
+        pointer = self.root / POINTER_FILE
+        tmp = pointer.with_suffix(".tmp")
+        tmp.write_text(version + "\n")
+        os.replace(tmp, pointer)
+
+    def _persist(self, version):
+        try:
+            self.write_pointer(version)
+        except OSError as e:
+            # A read-only model volume still allows swapping this process
+            logger.error(f"❌ Could not write {self.root / POINTER_FILE}: {e}")
+
+    def fingerprint(self, version):
+        """Hash of the artifact files of a version (detects in-place retraining)"""
+        path = self.versions().get(version)
+        if path is None:
+            return None
+        entries = []
+        for filename in sorted(self._filenames()):
+            candidate = path / filename
+            if candidate.exists():
+                stat = candidate.stat()
+                entries.append(f"{filename}:{stat.st_mtime_ns}:{stat.st_size}")
+        return hashlib.blake2b("|".join(entries).encode(), digest_size=8).hexdigest()
+
+    def _build(self, version):
+        path = self.versions().get(version, self.root)
+        registry = ModelRegistry(
+            path, self.artifacts, mmap_mode=self.mmap_mode, alternatives=self.alternatives, model_version=version,
+            compose=self.compose,
+        )
+        for callback in self._listeners:
+            registry.add_listener(callback)
+        return registry
+
+    def registry_for(self, version):
+        """A new, unloaded registry for a version (e.g. a shadow candidate), not swapped in"""
+        if version not in self.versions():
+            raise ModelNotAvailable(f"Unknown model version: {version}")
+        return self._build(version)
+
+    def add_listener(self, callback):
+        """Registry listener added to the active and every future registry"""
+        self._listeners.append(callback)
+        self.active.add_listener(callback)
+
+    def add_swap_listener(self, callback):
+        """Call callback(active, previous) right after a version swap"""
+        self._swap_listeners.append(callback)
+
+    def _swap(self, registry):
+        self.previous, self.active = self.active, registry
+        self._fingerprint = self.fingerprint(registry.model_version)
+        for callback in self._swap_listeners:
+            try:
+                callback(registry, self.previous)
+            except Exception as e:
+                logger.error(f"Swap listener failed: {e}")
+        logger.info(f"✅ Serving model version '{registry.model_version}'")
+
+    def activate(self, version=None, warm=None, persist=False):
+        """
+        Load, warm and swap in a version (default: target_version())
+
+        warm: optional callable(registry) run after loading, e.g. sample
+              predictions; an exception aborts the swap
+        persist: also write the pointer file
+        """
+        if not self._lock.acquire(blocking=False):
+            raise ReloadInProgress("A model version change is already in progress")
+        try:
+            version = version or self.target_version()
+            if version not in self.versions():
+                raise ModelNotAvailable(f"Unknown model version: {version}")
+
+            self.status = {"state": "loading", "version": version, "started_at": time.time()}
+            started = time.perf_counter()
+            registry = self._build(version)
+            failed = registry.warm_up()
+            if failed:
+                raise ModelNotAvailable(f"Version '{version}' failed to load: {', '.join(failed)}")
+            if warm is not None:
+                warm(registry)
+
+            self._swap(registry)
+            if persist:
+                self._persist(version)
+            self.status = {
+                "state": "ready",
+                "version": version,
+                "load_seconds": round(time.perf_counter() - started, 3),
+                "finished_at": time.time(),
+            }
+            return registry
+        except Exception as e:
+            if not isinstance(e, ReloadInProgress):
+                self.status = {"state": "failed", "version": version, "error": str(e), "finished_at": time.time()}
+            raise
+        finally:
+            self._lock.release()
+
+    def rollback(self, persist=False):
+        """Swap back to the previously active (already loaded) registry"""
+        if not self._lock.acquire(blocking=False):
+            raise ReloadInProgress("A model version change is already in progress")
+        try:
+            if self.previous is None:
+                raise ModelNotAvailable("No previous model version to roll back to")
+            self._swap(self.previous)
+            if persist:
+                self._persist(self.active_version)
+            self.status = {"state": "ready", "version": self.active_version, "finished_at": time.time()}
+            return self.active
+        finally:
+            self._lock.release()
+
+    def changed(self):
+        """True when the target version or the active version's files changed on disk"""
+        target = self.target_version()
+        if target is None:
+            return False
+        fingerprint = self.fingerprint(target)
+        if (target, fingerprint) == self._rejected:
+            return False
+        return target != self.active_version or fingerprint != self._fingerprint
+
+    def start_watcher(self, interval, warm=None):
+        """Poll the model directory every interval seconds and activate changes"""
+        if self._watcher is not None:
+            return
+        self._stop_watching.clear()
+
+        def watch():
+            while not self._stop_watching.wait(interval):
+                try:
+                    if self.changed():
+                        logger.info("🔄 Model files changed, reloading")
+                        self.activate(warm=warm)
+                except ReloadInProgress:
+                    pass
+                except Exception as e:
+                    logger.error(f"❌ Model reload failed: {e}")
+                    # Don't retry a broken version until its files change again
+                    target = self.target_version()
+                    self._rejected = (target, self.fingerprint(target))
+
+        self._watcher = threading.Thread(target=watch, name="model-watcher", daemon=True)
+        self._watcher.start()
+
+    def stop_watcher(self):
+        self._stop_watching.set()
+        self._watcher = None
+
+    def info(self):
+        return {
+            "active": self.active_version,
+            "previous": self.previous.model_version if self.previous is not None else None,
+            "target": self.target_version(),
+            "versions": list(self.versions()),
+            "status": self.status,
+        }
@@ -0,0 +1,155 @@
+"""
+Prediction result cache
+
+Verifiers re-check the same certificate many times, so responses are
+cached by (endpoint, model version, hash of the feature vector). Entries
+expire after a TTL and the least recently used ones are evicted once the
+byte budget is exceeded. Values are stored as JSON bytes so the same
+cache can be backed by a shared store across replicas; LocalCacheBackend
+is the in-process default and the stand-in for tests.
+"""
+
+import hashlib
+import importlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+# Approximate per-entry bookkeeping cost (dict slot, tuple, key string)
+ENTRY_OVERHEAD_BYTES = 128
+
+
+class CacheBackend:
+    """Storage interface for PredictionCache; values are bytes"""
+
+    def get(self, key):
+        raise NotImplementedError
+
+    def set(self, key, value, ttl):
+        raise NotImplementedError
+
+    def delete_prefix(self, prefix):
+        """Remove every key starting with prefix, return the number removed"""
+        raise NotImplementedError
+
+    def stats(self):
+        return {}
+
+
+class LocalCacheBackend(CacheBackend):
+    """In-memory LRU + TTL store bounded by a byte budget"""
+
+    def __init__(self, max_bytes=32 * 1024 * 1024):
+        self.max_bytes = int(max_bytes)
+        self._entries = OrderedDict()  # key -> (value, expires_at, size)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at, size = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                self._bytes -= size
+                self.expirations += 1
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        size = len(key) + len(value) + ENTRY_OVERHEAD_BYTES
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous[2]
+            self._entries[key] = (value, time.monotonic() + ttl, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, (_, _, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self.evictions += 1
+
+    def delete_prefix(self, prefix):
+        with self._lock:
+            keys = [key for key in self._entries if key.startswith(prefix)]
+            for key in keys:
+                self._bytes -= self._entries.pop(key)[2]
+            return len(keys)
+
+    def stats(self):
+        return {
+            "backend": "local",
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+
+def load_backend(spec, max_bytes):
+    """Build a backend from "local" or a "package.module:ClassName" path"""
+    if not spec or spec == "local":
+        return LocalCacheBackend(max_bytes=max_bytes)
+    module_name, _, class_name = spec.partition(":")
+    backend_class = getattr(importlib.import_module(module_name), class_name)
+    return backend_class()
+
+
+class PredictionCache:
+    """Cache of endpoint responses keyed by model version and feature hash"""
+
+    def __init__(self, backend, ttl_seconds=300.0):
+        self.backend = backend
+        self.ttl = float(ttl_seconds)
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def key(endpoint, version, features):
+        digest = hashlib.blake2b(
+            np.ascontiguousarray(features, dtype=np.float64).tobytes(), digest_size=16
+        ).hexdigest()
+        return f"{endpoint}:{version}:{digest}"
+
+    def get(self, key):
+        value = self.backend.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(value)
+
+    def record_miss(self):
+        """Count a lookup that could not be made, e.g. before the model has a version"""
+        self.misses += 1
+
+    def set(self, key, result):
+        self.backend.set(key, json.dumps(result, separators=(",", ":")).encode(), self.ttl)
+
+    def invalidate(self, endpoint):
+        """Drop every cached response for an endpoint (e.g. after a model reload)"""
+        self.invalidations += 1
+        return self.backend.delete_prefix(f"{endpoint}:")
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "invalidations": self.invalidations,
+            "ttl_seconds": self.ttl,
+            **self.backend.stats(),
+        }
@@ -0,0 +1,155 @@
+"""
+Early-Exit Evaluation Script
+Measures early-exit forest inference (FlatForest.predict_proba_early_exit)
+against full evaluation on a held-out set: mean trees evaluated, latency
+per batch and per single row, and how often the thresholded decision
+disagrees with the full forest, for each chunk size and bound.
+
+The held-out set is a labelled CSV/Parquet file (--data, scaled with the
+model's scaler; all columns except --label and --id-column are features)
+or, without one, standard-normal rows like the synthetic training data.
+
+Run from the ml-service directory:
+    python scripts/evaluate_early_exit.py
+    python scripts/evaluate_early_exit.py --data holdout.csv --label is_fraudulent --delta 0.05 0.01
+"""
+
+import sys
+import json
+import time
+import argparse
+import numpy as np
+import pandas as pd
+from pathlib import Path
+import joblib
+
+# forest_engine lives in the ml-service directory, one level up
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from forest_engine import as_flat_forest  # noqa: E402
+
+
+def load_holdout(path, label, id_column, n_features, rows, seed):
+    """(features, labels or None)"""
+    if path is None:
+        return np.random.default_rng(seed).standard_normal((rows, n_features)), None
+    frame = pd.read_parquet(path) if str(path).endswith(".parquet") else pd.read_csv(path)
+    labels = frame.pop(label).to_numpy() if label in frame.columns else None
+    if id_column and id_column in frame.columns:
+        frame = frame.drop(columns=[id_column])
+    if frame.shape[1] != n_features:
+        raise ValueError(f"{path} has {frame.shape[1]} feature columns, the scaler expects {n_features}")
+    return frame.to_numpy(dtype=np.float64), labels
+
+
+def seconds_per_call(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def evaluate(forest, X, labels, threshold, chunk_trees, delta, repeat, single_rows):
+    full = forest.predict_proba(X)[:, 1]
+    proba, used = forest.predict_proba_early_exit(X, threshold, chunk_trees=chunk_trees, delta=delta)
+    score = proba[:, 1]
+    disagree = (score > threshold) != (full > threshold)
+
+    batch_full = seconds_per_call(lambda: forest.predict_proba(X), repeat)
+    batch_early = seconds_per_call(
+        lambda: forest.predict_proba_early_exit(X, threshold, chunk_trees=chunk_trees, delta=delta), repeat
+    )
+    singles = X[:single_rows]
+    single_full = seconds_per_call(lambda: [forest.predict_proba(row[np.newaxis]) for row in singles], repeat)
+    single_early = seconds_per_call(
+        lambda: [forest.predict_proba_early_exit(row[np.newaxis], threshold, chunk_trees=chunk_trees, delta=delta)
+                 for row in singles],
+        repeat,
+    )
+
+    result = {
+        "chunk_trees": chunk_trees,
+        "delta": delta,
+        "mean_trees": float(used.mean()),
+        "p95_trees": float(np.percentile(used, 95)),
+        "exited_early": float((used < forest.n_estimators).mean()),
+        "disagreement_rate": float(disagree.mean()),
+        "disagreements": int(disagree.sum()),
+        "mean_abs_score_error": float(np.abs(score - full).mean()),
+        "batch_ms": {"full": batch_full * 1e3, "early_exit": batch_early * 1e3},
+        "single_row_us": {"full": single_full / len(singles) * 1e6, "early_exit": single_early / len(singles) * 1e6},
+    }
+    if labels is not None:
+        result["accuracy"] = {
+            "full": float(((full > threshold) == labels).mean()),
+            "early_exit": float(((score > threshold) == labels).mean()),
+        }
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate early-exit forest inference")
+    parser.add_argument("--models-dir", default="models")
+    parser.add_argument("--model", default="fraud_classifier")
+    parser.add_argument("--scaler", default="fraud_scaler", help="Scaler artifact ('' for none)")
+    parser.add_argument("--data", default=None, help="Held-out CSV/Parquet (default: synthetic rows)")
+    parser.add_argument("--label", default="is_fraudulent")
+    parser.add_argument("--id-column", default=None)
+    parser.add_argument("--rows", type=int, default=20000, help="Synthetic rows when --data is not given")
+    parser.add_argument("--threshold", type=float, default=70.0, help="Fraud score threshold (0-100)")
+    parser.add_argument("--chunk-trees", type=int, nargs="+", default=[5, 10, 20])
+    parser.add_argument("--delta", type=float, nargs="*", default=[0.05],
+                        help="Statistical bounds to try besides the exact one")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--single-rows", type=int, default=200, help="Rows timed one request at a time")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None, help="Write the results as JSON")
+    args = parser.parse_args()
+
+    models_dir = Path(args.models_dir)
+    model = joblib.load(models_dir / f"{args.model}.pkl")
+    forest = as_flat_forest(model)
+    if forest is None or forest.kind != "classifier" or len(forest.classes_) != 2:
+        print(f"[-] {args.model} is not a binary random forest classifier ({type(model).__name__})")
+        sys.exit(1)
+    scaler = joblib.load(models_dir / f"{args.scaler}.pkl") if args.scaler else None
+
+    X, labels = load_holdout(args.data, args.label, args.id_column, forest.n_features_in_, args.rows, args.seed)
+    if scaler is not None:
+        X = scaler.transform(X)
+    threshold = args.threshold / 100.0
+
+    print("=" * 92)
+    print(f"Early-Exit Inference: {args.model}, {forest.n_estimators} trees, {len(X)} rows, "
+          f"threshold {args.threshold:g}")
+    print("=" * 92)
+    print(f"{'chunk':>5} {'bound':>12} {'trees':>7} {'p95':>5} {'early':>7} {'disagree':>9} "
+          f"{'batch ms':>17} {'row us':>17} {'saving':>7}")
+
+    results = []
+    for chunk_trees in args.chunk_trees:
+        for delta in [None] + list(args.delta):
+            result = evaluate(forest, X, labels, threshold, chunk_trees, delta, args.repeat, args.single_rows)
+            results.append(result)
+            batch, single = result["batch_ms"], result["single_row_us"]
+            bound = "exact" if delta is None else f"delta={delta:g}"
+            print(
+                f"{chunk_trees:>5} {bound:>12} {result['mean_trees']:>7.1f} {result['p95_trees']:>5.0f} "
+                f"{result['exited_early']:>6.1%} {result['disagreement_rate']:>9.4%} "
+                f"{batch['full']:>8.1f}/{batch['early_exit']:<8.1f} {single['full']:>8.0f}/{single['early_exit']:<8.0f} "
+                f"{1 - batch['early_exit'] / batch['full']:>6.0%}"
+            )
+            if "accuracy" in result:
+                print(f"{'':>19} accuracy full {result['accuracy']['full']:.4f}, "
+                      f"early exit {result['accuracy']['early_exit']:.4f}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"model": args.model, "n_estimators": forest.n_estimators, "rows": len(X),
+                       "threshold": args.threshold, "results": results}, f, indent=2)
+        print(f"\n[+] Results saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
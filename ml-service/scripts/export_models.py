@@ -0,0 +1,141 @@
+"""
+Model Export Script
+Compiles trained random forests into the flat array format served by
+forest_engine.FlatForest, verifying that every exported model predicts
+exactly like the original before writing it.
+
+Forests over a single feature (the course rating regressors) are also
+collapsed into a forest_engine.BreakpointLookup table, which the service
+prefers over the flat forest. Its verification includes every breakpoint
+and its float32 neighbours, the inputs where an off-by-one would show.
+"""
+
+import sys
+import time
+import argparse
+import numpy as np
+from pathlib import Path
+import joblib
+
+# forest_engine lives in the ml-service directory, one level up
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from forest_engine import BreakpointLookup, FlatForest  # noqa: E402
+
+FOREST_MODELS = ['fraud_classifier', 'ocr_classifier', 'classifier', 'coursera_regressor', 'regressor']
+
+
+def verification_inputs(n_features, n_rows, forest, seed=42):
+    """Random rows plus rows sitting exactly on split thresholds"""
+    rng = np.random.default_rng(seed)
+    X = rng.standard_normal((n_rows, n_features)) * 2
+
+    # Values equal to a threshold exercise the `<=` boundary of each split
+    thresholds = np.concatenate([e.tree_.threshold[e.tree_.children_left != -1] for e in forest.estimators_])
+    features = np.concatenate([e.tree_.feature[e.tree_.children_left != -1] for e in forest.estimators_])
+    picks = rng.integers(0, len(thresholds), size=n_rows)
+    X[np.arange(n_rows), features[picks]] = thresholds[picks]
+    return X
+
+
+def breakpoint_inputs(lookup, n_rows, seed=42):
+    """Random values plus every breakpoint and the float32 values on either side of it"""
+    rng = np.random.default_rng(seed)
+    b = lookup.breakpoints
+    b32 = b.astype(np.float32)
+    around = [
+        b,
+        np.nextafter(b, np.inf), np.nextafter(b, -np.inf),
+        np.nextafter(b32, np.float32(np.inf)), np.nextafter(b32, np.float32(-np.inf)), b32,
+    ]
+    spread = max(float(np.abs(b).max(initial=1.0)), 1.0)
+    return np.concatenate([rng.uniform(-2 * spread, 2 * spread, n_rows)] + [a.astype(np.float64) for a in around])
+
+
+def export_lookup(models_dir, name, forest, verify_rows=2000):
+    """Collapse a single-feature forest into a breakpoint lookup table"""
+    lookup = BreakpointLookup.from_forest(forest)
+
+    X = breakpoint_inputs(lookup, verify_rows).reshape(-1, 1)
+    if lookup.kind == "classifier":
+        expected, actual = forest.predict_proba(X), lookup.predict_proba(X)
+    else:
+        expected, actual = forest.predict(X), lookup.predict(X)
+    if not np.array_equal(expected, actual):
+        print(f"[-] {name}: lookup verification FAILED (max abs diff {np.abs(expected - actual).max():.3e}), "
+              f"not exported")
+        return False
+
+    output = models_dir / f"{name}.lookup.joblib"
+    lookup.save(output)
+
+    row = X[:1]
+    forest_us = min(timed(forest.predict, row) for _ in range(20)) * 1e6
+    lookup_us = min(timed(lookup.predict, row) for _ in range(200)) * 1e6
+    print(f"    lookup: {len(lookup.breakpoints)} breakpoints, {output.stat().st_size / 1024:.0f} KB, "
+          f"verified on {len(X)} values; single row {forest_us:.0f} us -> {lookup_us:.0f} us")
+    return True
+
+
+def timed(fn, *args):
+    started = time.perf_counter()
+    fn(*args)
+    return time.perf_counter() - started
+
+
+def export_forest(models_dir, name, verify_rows=2000, lookup=True):
+    source = models_dir / f"{name}.pkl"
+    if not source.exists():
+        print(f"[-] {name}: {source} not found, skipping")
+        return False
+
+    forest = joblib.load(source)
+    if not hasattr(forest, "estimators_"):
+        print(f"[-] {name}: not a fitted forest ({type(forest).__name__}), skipping")
+        return False
+
+    flat = FlatForest.from_sklearn(forest)
+
+    # Verify against sklearn with a fixed accumulation order
+    forest.n_jobs = 1
+    X = verification_inputs(forest.n_features_in_, verify_rows, forest)
+    if flat.kind == "classifier":
+        expected, actual = forest.predict_proba(X), flat.predict_proba(X)
+    else:
+        expected, actual = forest.predict(X), flat.predict(X)
+    if not np.array_equal(expected, actual):
+        print(f"[-] {name}: verification FAILED (max abs diff {np.abs(expected - actual).max():.3e}), not exported")
+        return False
+
+    output = models_dir / f"{name}.flat.joblib"
+    flat.save(output)
+    print(f"[+] {name}: {flat.n_estimators} trees, {flat.n_nodes} nodes, depth {flat.max_depth}")
+    print(f"    {source.stat().st_size / 1024:.0f} KB pickle -> {output.stat().st_size / 1024:.0f} KB flat, "
+          f"verified on {verify_rows} rows")
+    if lookup and forest.n_features_in_ == 1:
+        export_lookup(models_dir, name, forest, verify_rows)
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export trained forests to the flat inference format")
+    parser.add_argument("--models-dir", default="models")
+    parser.add_argument("--models", nargs="+", default=FOREST_MODELS)
+    parser.add_argument("--verify-rows", type=int, default=2000)
+    parser.add_argument("--no-lookup", action="store_true",
+                        help="Do not collapse single-feature forests into lookup tables")
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("Flat Forest Export")
+    print("=" * 60)
+
+    models_dir = Path(args.models_dir)
+    exported = sum(export_forest(models_dir, name, args.verify_rows, not args.no_lookup) for name in args.models)
+
+    print("\n" + "=" * 60)
+    print(f"[+] Done! {exported}/{len(args.models)} models exported")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,31 +1,34 @@
 import os
+import sys
 import zipfile
 import pandas as pd
 import numpy as np
 from pathlib import Path
 from sklearn.feature_extraction.text import TfidfVectorizer
 
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from image_dataset import ImageDataset  # noqa: E402
+
+# Dataset indexes are cached here; archives are read in place, never extracted
+INDEX_CACHE_DIR = Path(os.environ.get("ML_TRAIN_CACHE_DIR", ".cache/training")) / "datasets"
+
 def extract_and_prepare_data():
-    """Extract and prepare data from your Datasets folder"""
-    print("Extracting datasets...")
+    """Index the ZIP archives in your Datasets folder (no extraction)"""
+    print("Indexing datasets...")
     
     datasets_dir = Path("Datasets")
-    extract_dir = Path("training_data/extracted")
-    extract_dir.mkdir(parents=True, exist_ok=True)
-    
-    # Extract all zip files
-    for zip_file in datasets_dir.glob("*.zip"):
-        print(f"\nExtracting: {zip_file.name}")
-        with zipfile.ZipFile(zip_file, 'r') as zip_ref:
-            zip_ref.extractall(extract_dir)
+    datasets = {}
     
-    print("\n✓ Files extracted to:", extract_dir)
+    for zip_file in sorted(datasets_dir.glob("*.zip")):
+        print(f"\nIndexing: {zip_file.name}")
+        dataset = ImageDataset(zip_file, cache_dir=INDEX_CACHE_DIR)
+        datasets[zip_file.name] = dataset
+        print(f"  {len(dataset)} images in {len(dataset.classes)} classes")
+        for label, count in sorted(dataset.class_counts().items()):
+            print(f"  - {label}: {count}")
     
-    # List extracted files
-    for root, dirs, files in os.walk(extract_dir):
-        for file in files:
-            file_path = os.path.join(root, file)
-            print(f"  - {file_path}")
+    print("\n✓ Index cache:", INDEX_CACHE_DIR)
+    return datasets
 
 def prepare_certificate_dataset():
     """Prepare certificate dataset for ML"""
@@ -33,20 +36,22 @@ def prepare_certificate_dataset():
     print("Preparing Certificate Dataset")
     print("="*60)
     
-    extract_dir = Path("training_data/extracted")
-    
-    # Look for CSV files
-    csv_files = list(extract_dir.glob("**/*.csv"))
+    datasets_dir = Path("Datasets")
     
-    if csv_files:
-        for csv_file in csv_files:
-            print(f"\nProcessing: {csv_file.name}")
-            df = pd.read_csv(csv_file)
-            print(f"  Shape: {df.shape}")
-            print(f"  Columns: {df.columns.tolist()}")
-            print(f"  Data types:\n{df.dtypes}")
-            print(f"  Sample:\n{df.head()}")
+    # CSV files are read straight from the archives
+    for zip_file in sorted(datasets_dir.glob("*.zip")):
+        with zipfile.ZipFile(zip_file) as archive:
+            for member in archive.namelist():
+                if not member.endswith(".csv"):
+                    continue
+                print(f"\nProcessing: {zip_file.name}::{member}")
+                with archive.open(member) as f:
+                    df = pd.read_csv(f)
+                print(f"  Shape: {df.shape}")
+                print(f"  Columns: {df.columns.tolist()}")
+                print(f"  Data types:\n{df.dtypes}")
+                print(f"  Sample:\n{df.head()}")
 
 if __name__ == "__main__":
     extract_and_prepare_data()
-    prepare_certificate_dataset()
\ No newline at end of file
+    prepare_certificate_dataset()
@@ -0,0 +1,255 @@
+"""
+On-disk feature store for extracted OCR image features
+
+Features are stored per feature set as float32 .npy segments (float32 is
+what sklearn trees split on anyway) and opened memory-mapped, plus a JSON
+index keyed by image path (or "<archive>::<member>" for images read from
+a ZIP, see image_dataset.py):
+
+    <root>/<feature_set>/
+        meta.json                  feature set, FEATURE_VERSION, columns
+        index.json                 image key -> segment, row, mtime_ns, size, label, shape
+        segment-000000.npy         (rows, n_features) float32
+
+update() stats every requested image and only decodes and extracts the
+ones that are new or whose mtime/size changed; their rows go to a new
+segment and the index entry is repointed, leaving a dead row behind. An
+image that fails to decode loses its entry, so stale features are never
+served for content that has changed.
+compact() rewrites everything live into a single segment in the requested
+order, after which get() for that order is a zero-copy slice of the
+memory map. A FEATURE_VERSION or column mismatch drops the whole store.
+"""
+
+import json
+import os
+import re
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from pathlib import Path
+
+import numpy as np
+
+# features.py lives in the ml-service directory, one level up
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from features import FEATURE_VERSION, extract_features, feature_names, load_image  # noqa: E402
+from image_dataset import open_sample, sample_stat  # noqa: E402
+
+SEGMENT_PATTERN = re.compile(r"segment-(\d+)\.npy$")
+DTYPE = np.float32
+
+
+def ordered_map(function, chunks, workers, *args):
+    """Yield function(chunk, *args) in order, keeping at most 2 * workers chunks in flight"""
+    if workers <= 1:
+        for chunk in chunks:
+            yield function(chunk, *args)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        next_chunk = iter(chunks)
+        for chunk in islice(next_chunk, 2 * workers):
+            pending.append(executor.submit(function, chunk, *args))
+        while pending:
+            result = pending.popleft().result()
+            for chunk in islice(next_chunk, 1):
+                pending.append(executor.submit(function, chunk, *args))
+            yield result
+
+
+def extract_chunk(paths, feature_set, dtype=DTYPE):
+    """
+    Worker: decode a chunk of images; returns (features, positions decoded, image shapes)
+
+    Shared with prepare_ocr_data.py, which passes dtype=None to keep
+    extract_features' float64 output for its CSVs.
+    """
+    images, kept, shapes = [], [], []
+    for i, path in enumerate(paths):
+        try:
+            image = load_image(open_sample(path))
+        except Exception as e:
+            print(f"    Error processing image {path}: {e}")
+            continue
+        images.append(image)
+        kept.append(i)
+        shapes.append(image.shape)
+    X = extract_features(images, feature_set)
+    return (X if dtype is None else X.astype(dtype)), kept, shapes
+
+
+def _write_json(path, data):
+    tmp = path.with_suffix(".tmp")
+    with open(tmp, "w") as f:
+        json.dump(data, f)
+    os.replace(tmp, path)
+
+
+class FeatureStore:
+    """Incrementally maintained, memory-mapped feature matrix for one feature set"""
+
+    def __init__(self, root, feature_set="extended"):
+        self.feature_set = feature_set
+        self.columns = feature_names(feature_set)
+        self.dir = Path(root) / feature_set
+        self.dir.mkdir(parents=True, exist_ok=True)
+        self._segments = {}
+        self.index = self._load_index()
+
+    def _meta(self):
+        return {"feature_set": self.feature_set, "feature_version": FEATURE_VERSION, "columns": self.columns}
+
+    def _load_index(self):
+        meta_path, index_path = self.dir / "meta.json", self.dir / "index.json"
+        if meta_path.exists() and index_path.exists():
+            with open(meta_path) as f:
+                meta = json.load(f)
+            if meta == self._meta():
+                with open(index_path) as f:
+                    return json.load(f)
+            print(f"  [!] Feature store {self.dir} was built by another extractor version, rebuilding")
+        for segment in self._segment_paths():
+            segment.unlink()
+        _write_json(meta_path, self._meta())
+        return {}
+
+    def _segment_paths(self):
+        return sorted(p for p in self.dir.iterdir() if SEGMENT_PATTERN.search(p.name))
+
+    def _segment(self, number):
+        if number not in self._segments:
+            self._segments[number] = np.load(self.dir / f"segment-{number:06d}.npy", mmap_mode="r")
+        return self._segments[number]
+
+    def _next_segment(self):
+        numbers = [int(SEGMENT_PATTERN.search(p.name).group(1)) for p in self._segment_paths()]
+        return max(numbers, default=-1) + 1
+
+    def _save(self):
+        _write_json(self.dir / "index.json", self.index)
+
+    def __len__(self):
+        return len(self.index)
+
+    def __contains__(self, path):
+        return str(path) in self.index
+
+    def stale(self, paths):
+        """Paths with no stored features, or whose file changed since extraction"""
+        out = []
+        for path in paths:
+            entry = self.index.get(str(path))
+            stat = sample_stat(path)
+            if entry is None or stat is None or (entry["mtime_ns"], entry["size"]) != stat:
+                out.append(path)
+        return out
+
+    def update(self, items, workers=1, chunk_size=256):
+        """
+        Extract features for new or changed images among (path, label) pairs
+
+        Returns {"reused", "extracted", "failed", "seconds"}.
+        """
+        started = time.perf_counter()
+        labels = {str(path): label for path, label in items}
+        # Relabelled images keep their features; only the index entry changes
+        for key, label in labels.items():
+            if key in self.index:
+                self.index[key]["label"] = label
+        todo = self.stale([path for path, _ in items])
+        extracted = failed = 0
+        if todo:
+            number = self._next_segment()
+            chunks = [todo[i:i + chunk_size] for i in range(0, len(todo), chunk_size)]
+            parts, row = [], 0
+            for chunk, (X, kept, shapes) in zip(chunks, ordered_map(extract_chunk, chunks, workers, self.feature_set)):
+                parts.append(X)
+                for position, shape in zip(kept, shapes):
+                    path = str(chunk[position])
+                    mtime_ns, size = sample_stat(path)
+                    self.index[path] = {"segment": number, "row": row, "mtime_ns": mtime_ns, "size": size,
+                                        "label": labels[path], "shape": list(shape)}
+                    row += 1
+                # A changed image that no longer decodes must not keep serving its old features
+                for position in sorted(set(range(len(chunk))) - set(kept)):
+                    self.index.pop(str(chunk[position]), None)
+                failed += len(chunk) - len(kept)
+            extracted = row
+            if row:
+                np.save(self.dir / f"segment-{number:06d}.npy", np.concatenate(parts))
+            self._save()
+        elif items:
+            self._save()
+        return {"reused": len(items) - len(todo), "extracted": extracted, "failed": failed,
+                "seconds": time.perf_counter() - started}
+
+    def get(self, paths):
+        """
+        (features, labels) for stored paths, in the given order
+
+        When the rows are one contiguous run of a single segment (e.g. after
+        compact() with the same order) the features are a read-only view of
+        the memory map; otherwise rows are gathered into a new array.
+        """
+        entries = [self.index[str(path)] for path in paths]
+        labels = [entry["label"] for entry in entries]
+        if not entries:
+            return np.empty((0, len(self.columns)), dtype=DTYPE), labels
+        segment = entries[0]["segment"]
+        rows = np.fromiter((entry["row"] for entry in entries), dtype=np.int64, count=len(entries))
+        if all(entry["segment"] == segment for entry in entries) and np.all(np.diff(rows) == 1):
+            return self._segment(segment)[rows[0]:rows[-1] + 1], labels
+        out = np.empty((len(entries), len(self.columns)), dtype=DTYPE)
+        by_segment = {}
+        for i, entry in enumerate(entries):
+            by_segment.setdefault(entry["segment"], []).append(i)
+        for number, positions in by_segment.items():
+            out[positions] = self._segment(number)[rows[positions]]
+        return out, labels
+
+    def shapes(self, paths):
+        return [tuple(self.index[str(path)]["shape"]) for path in paths]
+
+    def compact(self, order=None):
+        """Rewrite live rows into one segment (in `order` first, if given) and drop old segments"""
+        keys = list(dict.fromkeys([str(p) for p in order or []] + list(self.index)))
+        keys = [key for key in keys if key in self.index]
+        old = self._segment_paths()
+        number = self._next_segment()
+        target = self.dir / f"segment-{number:06d}.npy"
+        matrix = np.lib.format.open_memmap(target, mode="w+", dtype=DTYPE, shape=(len(keys), len(self.columns)))
+        for start in range(0, len(keys), 65536):
+            block = keys[start:start + 65536]
+            matrix[start:start + len(block)] = self.get(block)[0]
+        matrix.flush()
+        del matrix
+        for row, key in enumerate(keys):
+            self.index[key]["segment"], self.index[key]["row"] = number, row
+        self._save()
+        self._segments.clear()
+        for path in old:
+            path.unlink()
+        return len(keys)
+
+    def dead_rows(self):
+        """Rows in segments no longer referenced by the index (reclaimed by compact())"""
+        total = sum(np.load(p, mmap_mode="r").shape[0] for p in self._segment_paths())
+        return total - len(self.index)
+
+    def ensure(self, items, workers=1, chunk_size=256):
+        """update() then compact() when needed, so get() over items in this order is zero-copy"""
+        stats = self.update(items, workers, chunk_size)
+        paths = [str(path) for path, _ in items]
+        stored = [path for path in paths if path in self.index]
+        rows = [(self.index[p]["segment"], self.index[p]["row"]) for p in stored]
+        contiguous = len({segment for segment, _ in rows}) <= 1 and all(
+            b[1] - a[1] == 1 for a, b in zip(rows, rows[1:])
+        )
+        if not contiguous or self.dead_rows() > 0:
+            self.compact(stored)
+            stats["compacted"] = True
+        return stats, stored
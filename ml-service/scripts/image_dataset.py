@@ -0,0 +1,254 @@
+"""
+Lazy, random-access image dataset over folders and ZIP archives
+
+Each source (a directory tree or a .zip file) is indexed once: for a ZIP
+only the central directory is read, for a folder the tree is listed. The
+index is cached to disk as JSON and reused while the source is unchanged
+(ZIP: archive mtime and size; folder: the mtime of every directory in the
+tree, which changes whenever a file is added, removed or renamed in it).
+Images are decoded only when a sample is requested, so archives never
+need to be extracted.
+
+A sample's label is the name of the directory holding it, and its key is
+a plain path for folder samples or "<archive>::<member>" for ZIP members.
+open_sample() and sample_stat() resolve either form, so keys can be used
+directly by the feature store.
+"""
+
+import hashlib
+import json
+import os
+import sys
+import threading
+import zipfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path, PurePosixPath
+
+import numpy as np
+
+# features.py lives in the ml-service directory, one level up
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from features import load_image  # noqa: E402
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg")
+ZIP_SEPARATOR = "::"
+
+_archives = threading.local()
+
+
+def _archive(path):
+    """ZipFile handle for path, one per thread (ZipFile reads are not safe to interleave)"""
+    handles = getattr(_archives, "handles", None)
+    if handles is None:
+        handles = _archives.handles = {}
+    if path not in handles:
+        handles[path] = zipfile.ZipFile(path)
+    return handles[path]
+
+
+def split_key(key):
+    """(archive path, member) for a ZIP sample key, (path, None) otherwise"""
+    key = str(key)
+    if ZIP_SEPARATOR in key:
+        archive, member = key.split(ZIP_SEPARATOR, 1)
+        return archive, member
+    return key, None
+
+
+def open_sample(key):
+    """Something load_image() accepts: the file path, or the ZIP member's bytes"""
+    path, member = split_key(key)
+    if member is None:
+        return path
+    return _archive(path).read(member)
+
+
+def sample_stat(key):
+    """(mtime_ns, size) identifying the sample's current content, None if missing"""
+    path, member = split_key(key)
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    if member is None:
+        return stat.st_mtime_ns, stat.st_size
+    # Members change only with the archive; the CRC tells members apart
+    try:
+        info = _archive(path).getinfo(member)
+    except KeyError:
+        return None
+    return stat.st_mtime_ns, info.CRC
+
+
+def prefetch(keys, loader, workers=None, window=64):
+    """
+    Yield loader(key) for each key, in order, decoded ahead by a thread pool
+
+    At most `window` samples are decoded ahead of the consumer, so memory
+    stays bounded. PIL releases the GIL while decoding, so threads overlap
+    the I/O and decompression of consecutive samples. workers defaults to
+    min(4, cores); on a single core decoding is done inline.
+    """
+    if workers is None:
+        workers = min(4, os.cpu_count() or 1)
+    if workers <= 1:
+        for key in keys:
+            yield loader(key)
+        return
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="prefetch") as executor:
+        pending = deque()
+        keys = iter(keys)
+        for key in keys:
+            pending.append(executor.submit(loader, key))
+            if len(pending) >= window:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+class ImageDataset:
+    """Index of labelled images across folders and ZIP archives, read on demand"""
+
+    def __init__(self, sources, cache_dir=None, extensions=IMAGE_EXTENSIONS):
+        self.extensions = tuple(extensions)
+        self.cache_dir = Path(cache_dir) if cache_dir else None
+        self.keys = []
+        self.labels = []
+        for source in [sources] if isinstance(sources, (str, Path)) else sources:
+            keys, labels = self._index(Path(source))
+            self.keys.extend(keys)
+            self.labels.extend(labels)
+        self.classes = sorted(set(self.labels))
+        self._by_class = {label: [] for label in self.classes}
+        for i, label in enumerate(self.labels):
+            self._by_class[label].append(i)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __getitem__(self, index):
+        """(decoded grayscale image, label)"""
+        return load_image(open_sample(self.keys[index])), self.labels[index]
+
+    def indices(self, label):
+        return self._by_class[label]
+
+    def class_counts(self):
+        return {label: len(indices) for label, indices in self._by_class.items()}
+
+    def items(self, indices=None):
+        """(key, label) pairs, e.g. for the feature store"""
+        indices = range(len(self)) if indices is None else indices
+        return [(self.keys[i], self.labels[i]) for i in indices]
+
+    def _is_image(self, name):
+        return name.lower().endswith(self.extensions)
+
+    def _fingerprint(self, source):
+        if source.is_file():
+            stat = source.stat()
+            return {"mtime_ns": stat.st_mtime_ns, "size": stat.st_size}
+        return None
+
+    def _dir_mtimes(self, directories):
+        mtimes = {}
+        for directory in directories:
+            try:
+                mtimes[directory] = os.stat(directory).st_mtime_ns
+            except OSError:
+                return None
+        return mtimes
+
+    def _cache_path(self, source):
+        digest = hashlib.sha1(str(source.resolve()).encode()).hexdigest()[:16]
+        return self.cache_dir / f"index-{source.name.replace(' ', '_')}-{digest}.json"
+
+    def _load_cached(self, source):
+        if self.cache_dir is None:
+            return None
+        path = self._cache_path(source)
+        if not path.exists():
+            return None
+        with open(path) as f:
+            cached = json.load(f)
+        if cached.get("extensions") != list(self.extensions):
+            return None
+        if source.is_file():
+            valid = cached.get("fingerprint") == self._fingerprint(source)
+        else:
+            valid = cached.get("directories") == self._dir_mtimes(cached.get("directories", {}))
+        return cached if valid else None
+
+    def _index(self, source):
+        cached = self._load_cached(source)
+        if cached is not None:
+            return cached["keys"], cached["labels"]
+
+        if zipfile.is_zipfile(source):
+            keys, labels = self._index_zip(source)
+            record = {"fingerprint": self._fingerprint(source)}
+        elif source.is_dir():
+            keys, labels, directories = self._index_folder(source)
+            record = {"directories": self._dir_mtimes(directories)}
+        else:
+            raise ValueError(f"Not a folder or ZIP archive: {source}")
+
+        if self.cache_dir is not None:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            path = self._cache_path(source)
+            tmp = path.with_suffix(".tmp")
+            with open(tmp, "w") as f:
+                json.dump({**record, "source": str(source), "extensions": list(self.extensions),
+                           "keys": keys, "labels": labels}, f)
+            os.replace(tmp, path)
+        return keys, labels
+
+    def _index_zip(self, source):
+        keys, labels = [], []
+        with zipfile.ZipFile(source) as archive:
+            for info in archive.infolist():
+                if info.is_dir() or not self._is_image(info.filename):
+                    continue
+                member = PurePosixPath(info.filename)
+                keys.append(f"{source}{ZIP_SEPARATOR}{info.filename}")
+                labels.append(member.parent.name)
+        return keys, labels
+
+    def _index_folder(self, source):
+        keys, labels, directories = [], [], []
+        for root, dirs, files in os.walk(source):
+            dirs.sort()
+            directories.append(root)
+            label = os.path.basename(root)
+            for name in sorted(files):
+                if self._is_image(name):
+                    keys.append(os.path.join(root, name))
+                    labels.append(label)
+        return keys, labels, directories
+
+    def sample(self, per_class=None, classes=None, shuffle=True, seed=0):
+        """
+        Stratified sample of indices: up to per_class samples from each class
+
+        Samples are drawn without replacement from each class; with shuffle
+        the combined order is shuffled, otherwise it is grouped by class.
+        """
+        rng = np.random.default_rng(seed)
+        chosen = []
+        for label in classes or self.classes:
+            indices = np.asarray(self._by_class.get(label, []), dtype=np.int64)
+            if per_class and len(indices) > per_class:
+                indices = np.sort(rng.choice(indices, size=per_class, replace=False)) if shuffle else indices[:per_class]
+            chosen.append(indices)
+        chosen = np.concatenate(chosen) if chosen else np.empty(0, dtype=np.int64)
+        if shuffle:
+            rng.shuffle(chosen)
+        return chosen.tolist()
+
+    def iter_images(self, indices, workers=None, window=64):
+        """Yield (index, image, label), decoding ahead with a thread pool"""
+        def load(i):
+            return i, load_image(open_sample(self.keys[i])), self.labels[i]
+
+        return prefetch(indices, load, workers, window)
@@ -0,0 +1,239 @@
+"""
+Cross-validated model search for MLPipeline
+
+Searches model families and their hyperparameters at once with successive
+halving (HalvingRandomSearchCV): every sampled configuration is scored on
+a small share of the training rows, the best third is kept and re-scored
+on three times as many rows, and so on until the full training set. Folds
+and candidates are fitted in parallel across cores (n_jobs=-1).
+
+Every candidate is a Pipeline(scaler, model) built with a joblib.Memory,
+so each fold's fitted StandardScaler and scaled matrix are cached on disk
+and shared by every configuration (and every later run) using that fold.
+
+The finalists are refitted on the training split and timed predicting
+one row at a time, which is how the service scores interactive requests.
+The leaderboard records CV score, holdout score and per-row latency so
+a model can be picked to fit a latency budget rather than on accuracy
+alone.
+"""
+
+import time
+
+import numpy as np
+from joblib import Memory, Parallel, delayed
+from scipy.stats import loguniform, randint, uniform
+from sklearn.base import clone
+from sklearn.ensemble import (
+    ExtraTreesClassifier, ExtraTreesRegressor,
+    HistGradientBoostingClassifier, HistGradientBoostingRegressor,
+    RandomForestClassifier, RandomForestRegressor,
+)
+from sklearn.experimental import enable_halving_search_cv  # noqa: F401
+from sklearn.linear_model import LogisticRegression, Ridge
+from sklearn.metrics import accuracy_score, mean_squared_error
+from sklearn.model_selection import HalvingRandomSearchCV, KFold, RandomizedSearchCV, StratifiedKFold
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import StandardScaler
+
+_FOREST_SPACE = {
+    "model__n_estimators": randint(50, 300),
+    "model__max_depth": [8, 15, 25, None],
+    "model__min_samples_leaf": randint(1, 5),
+    "model__max_features": ["sqrt", 0.5, 1.0],
+}
+_BOOSTING_SPACE = {
+    "model__learning_rate": loguniform(0.02, 0.3),
+    "model__max_iter": randint(50, 300),
+    "model__max_leaf_nodes": randint(8, 64),
+    "model__l2_regularization": uniform(0.0, 1.0),
+}
+
+# family -> (estimator, parameter distributions) per task. Tree ensembles
+# leave n_jobs at 1: the search already runs one fit per core.
+CLASSIFIER_FAMILIES = {
+    "random_forest": (RandomForestClassifier(random_state=42), _FOREST_SPACE),
+    "extra_trees": (ExtraTreesClassifier(random_state=42), _FOREST_SPACE),
+    "hist_gradient_boosting": (HistGradientBoostingClassifier(random_state=42), _BOOSTING_SPACE),
+    "logistic_regression": (LogisticRegression(max_iter=2000), {"model__C": loguniform(1e-3, 1e2)}),
+}
+REGRESSOR_FAMILIES = {
+    "random_forest": (RandomForestRegressor(random_state=42), _FOREST_SPACE),
+    "extra_trees": (ExtraTreesRegressor(random_state=42), _FOREST_SPACE),
+    "hist_gradient_boosting": (HistGradientBoostingRegressor(random_state=42), _BOOSTING_SPACE),
+    "ridge": (Ridge(), {"model__alpha": loguniform(1e-3, 1e3)}),
+}
+
+
+def search_space(task, families=None):
+    """Parameter distributions for HalvingRandomSearchCV, one dict per model family"""
+    available = CLASSIFIER_FAMILIES if task == "classification" else REGRESSOR_FAMILIES
+    families = families or list(available)
+    unknown = [name for name in families if name not in available]
+    if unknown:
+        raise ValueError(f"Unknown model families for {task}: {unknown}")
+    return [{"model": [available[name][0]], **available[name][1]} for name in families]
+
+
+def family_name(estimator):
+    for families in (CLASSIFIER_FAMILIES, REGRESSOR_FAMILIES):
+        for name, (template, _) in families.items():
+            if type(estimator) is type(template):
+                return name
+    return type(estimator).__name__
+
+
+def make_pipeline(task, memory):
+    # The model step is a placeholder replaced by each search candidate; its
+    # type still matters, the halving search sizes rounds differently for classifiers
+    placeholder = RandomForestClassifier() if task == "classification" else RandomForestRegressor()
+    return Pipeline([("scaler", StandardScaler()), ("model", placeholder)], memory=memory)
+
+
+def make_cv(task, y, n_splits):
+    if task == "classification":
+        # StratifiedKFold needs every class present in each fold
+        _, counts = np.unique(y, return_counts=True)
+        n_splits = max(2, min(n_splits, counts.min()))
+        return StratifiedKFold(n_splits=n_splits, shuffle=True, random_state=42)
+    return KFold(n_splits=n_splits, shuffle=True, random_state=42)
+
+
+def measure_latency(model, X, rows=200, batch=256):
+    """Per-row latency percentiles (ms) predicting one row at a time, plus batched rows/s"""
+    predict = model.predict_proba if hasattr(model, "predict_proba") else model.predict
+    X = np.asarray(X)
+    sample = X[:rows]
+    predict(sample[:1])  # warm-up
+    timings = []
+    for i in range(len(sample)):
+        started = time.perf_counter()
+        predict(sample[i:i + 1])
+        timings.append((time.perf_counter() - started) * 1000)
+    block = np.resize(X, (batch, X.shape[1]))
+    started = time.perf_counter()
+    predict(block)
+    elapsed = time.perf_counter() - started
+    return {
+        "p50_ms": round(float(np.percentile(timings, 50)), 4),
+        "p99_ms": round(float(np.percentile(timings, 99)), 4),
+        "batch_rows_per_second": round(batch / elapsed, 1) if elapsed > 0 else None,
+    }
+
+
+def _refit(pipeline, params, task, X_train, y_train, X_test, y_test):
+    # Second clone: the params hold the shared family template, fit a copy of it
+    pipeline = clone(clone(pipeline).set_params(**params))
+    started = time.perf_counter()
+    pipeline.fit(X_train, y_train)
+    fit_seconds = time.perf_counter() - started
+    y_pred = pipeline.predict(X_test)
+    if task == "classification":
+        holdout = {"accuracy": float(accuracy_score(y_test, y_pred))}
+    else:
+        holdout = {"rmse": float(np.sqrt(mean_squared_error(y_test, y_pred)))}
+    return pipeline, holdout, fit_seconds
+
+
+def run_search(X_train, y_train, X_test, y_test, task="classification", families=None, n_candidates=40,
+               factor=3, cv=5, n_jobs=-1, cache_dir=None, top_k=8, latency_rows=200,
+               latency_budget_ms=None, random_state=42):
+    """
+    Successive-halving search over model families, then a latency-aware leaderboard
+
+    Returns (selected fitted Pipeline, leaderboard dict). The selected model
+    is the best holdout score among finalists whose per-row p99 latency is
+    within latency_budget_ms (all finalists when no budget is given).
+    """
+    memory = Memory(cache_dir, verbose=0) if cache_dir else None
+    pipeline = make_pipeline(task, memory)
+    scoring = "accuracy" if task == "classification" else "neg_root_mean_squared_error"
+    folds = make_cv(task, y_train, cv)
+    space = search_space(task, families)
+
+    search_kwargs = dict(scoring=scoring, cv=folds, n_jobs=n_jobs, refit=False, random_state=random_state)
+    halving = HalvingRandomSearchCV(pipeline, space, n_candidates=n_candidates, factor=factor, **search_kwargs)
+    n_classes = len(np.unique(y_train)) if task == "classification" else 1
+    if len(X_train) >= factor * 2 * folds.get_n_splits() * n_classes:
+        search, strategy = halving, "successive_halving"
+    else:
+        # Too few rows for a second halving round: score every candidate once on all rows
+        search = RandomizedSearchCV(pipeline, space, n_iter=n_candidates, **search_kwargs)
+        strategy = "random"
+    print(f"  Searching {n_candidates} candidates ({strategy}, {folds.get_n_splits()}-fold CV)...")
+    started = time.perf_counter()
+    search.fit(X_train, y_train)
+    search_seconds = time.perf_counter() - started
+
+    results = search.cv_results_
+    # Finalists: the candidates that survived the most halving rounds, best
+    # CV score first (each candidate keeps only its row from its last round)
+    rounds = results.get("iter", np.zeros(len(results["params"]), dtype=int))
+    order = sorted(
+        (i for i in range(len(results["params"])) if np.isfinite(results["mean_test_score"][i])),
+        key=lambda i: (-rounds[i], -results["mean_test_score"][i]),
+    )
+    ranked, seen = [], set()
+    for i in order:
+        key = repr(sorted(results["params"][i].items()))
+        if key not in seen:
+            seen.add(key)
+            ranked.append(i)
+    ranked = ranked[:top_k]
+
+    refitted = Parallel(n_jobs=n_jobs)(
+        delayed(_refit)(pipeline, results["params"][i], task, X_train, y_train, X_test, y_test) for i in ranked
+    )
+    # Latency is timed serially, after the parallel refits, so finalists do not compete for cores
+    entries = []
+    for i, (fitted, holdout, fit_seconds) in zip(ranked, refitted):
+        score = float(results["mean_test_score"][i])
+        params = {k: v for k, v in results["params"][i].items() if k != "model"}
+        entries.append({
+            "family": family_name(results["params"][i]["model"]),
+            "params": {k.replace("model__", ""): (v.item() if hasattr(v, "item") else v) for k, v in params.items()},
+            "cv_score": score if task == "classification" else -score,
+            "cv_std": float(results["std_test_score"][i]),
+            "holdout": holdout,
+            "fit_seconds": round(fit_seconds, 3),
+            "latency": measure_latency(fitted, X_test, latency_rows),
+            "_pipeline": fitted,
+        })
+
+    metric = "accuracy" if task == "classification" else "rmse"
+    sign = -1 if task == "classification" else 1
+    # Holdout score first; ties go to the better CV score, then the faster model
+    entries.sort(key=lambda e: (sign * e["holdout"][metric], sign * e["cv_score"], e["latency"]["p99_ms"]))
+    within = [e for e in entries if latency_budget_ms is None or e["latency"]["p99_ms"] <= latency_budget_ms]
+    if not within:
+        print(f"  [!] No finalist within {latency_budget_ms} ms p99; selecting the fastest")
+        within = [min(entries, key=lambda e: e["latency"]["p99_ms"])]
+    selected = within[0]
+    for rank, entry in enumerate(entries, 1):
+        entry["rank"] = rank
+        entry["within_budget"] = latency_budget_ms is None or entry["latency"]["p99_ms"] <= latency_budget_ms
+        entry["selected"] = entry is selected
+
+    leaderboard = {
+        "task": task,
+        "metric": metric,
+        "strategy": strategy,
+        "candidates": n_candidates,
+        "evaluations": len(results["params"]),
+        "cv_splits": folds.get_n_splits(),
+        "search_seconds": round(search_seconds, 2),
+        "latency_budget_ms": latency_budget_ms,
+        "train_rows": len(X_train),
+        "holdout_rows": len(X_test),
+        "entries": [{k: v for k, v in e.items() if k != "_pipeline"} for e in entries],
+    }
+    return selected["_pipeline"], leaderboard
+
+
+def print_leaderboard(leaderboard):
+    metric = leaderboard["metric"]
+    print(f"  {'#':>2} {'family':<24} {'cv':>8} {metric:>9} {'p50 ms':>8} {'p99 ms':>8}")
+    for entry in leaderboard["entries"]:
+        marker = "*" if entry["selected"] else (" " if entry["within_budget"] else "x")
+        print(f"{marker} {entry['rank']:>2} {entry['family']:<24} {entry['cv_score']:>8.4f} "
+              f"{entry['holdout'][metric]:>9.4f} {entry['latency']['p50_ms']:>8.3f} {entry['latency']['p99_ms']:>8.3f}")
@@ -4,16 +4,39 @@ Extracts features from OCR training images for model training
 """
 
 import os
+import sys
+import csv
+import time
+import argparse
 import numpy as np
+from collections import Counter
 from pathlib import Path
 from PIL import Image
 import pandas as pd
 from sklearn.preprocessing import StandardScaler
 import joblib
 
+# features.py lives in the ml-service directory, one level up, and is
+# shared with the service so training and serving compute identical features
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from features import extract_features, feature_names, load_image  # noqa: E402
+from feature_store import FeatureStore, extract_chunk, ordered_map  # noqa: E402
+
+DEFAULT_FEATURE_SET = "extended"
+
+
+def extract_image_features(image_path, feature_set=DEFAULT_FEATURE_SET):
+    """Extract features from a single image"""
+    try:
+        values = extract_features([load_image(image_path)], feature_set)[0]
+        return dict(zip(feature_names(feature_set), values))
+    except Exception as e:
+        print(f"Error processing {image_path}: {e}")
+        return None
+
 
 class OCRDataPreparation:
-    def __init__(self, data_dir=None, output_dir=None):
+    def __init__(self, data_dir=None, output_dir=None, feature_set=DEFAULT_FEATURE_SET, store_dir=None):
         # Make paths repo-root relative so script can be run from any CWD.
         # repo root is two parents above this script (ml-service/scripts -> repo root)
         repo_root = Path(__file__).resolve().parents[2]
@@ -29,137 +52,171 @@ class OCRDataPreparation:
             self.output_dir = Path(output_dir)
 
         self.output_dir.mkdir(parents=True, exist_ok=True)
+        self.feature_set = feature_set
+        # With a feature store only new or changed images are decoded
+        self.store = FeatureStore(store_dir, feature_set) if store_dir else None
     
     def extract_image_features(self, image_path):
         """Extract features from a single image"""
-        try:
-            img = Image.open(image_path).convert('L')  # Convert to grayscale
-            img_array = np.array(img)
-            
-            # Basic features
-            features = {
-                'mean_pixel': np.mean(img_array),
-                'std_pixel': np.std(img_array),
-                'min_pixel': np.min(img_array),
-                'max_pixel': np.max(img_array),
-                'aspect_ratio': img_array.shape[1] / img_array.shape[0] if img_array.shape[0] > 0 else 0,
-                'edge_density': np.mean(np.abs(np.diff(img_array.flatten()))),
-            }
-            
-            return features
-        except Exception as e:
-            print(f"Error processing {image_path}: {e}")
-            return None
+        return extract_image_features(image_path, self.feature_set)
     
-    def prepare_ocr_training_data(self, limit=100):
-        """Extract features from OCR training dataset"""
-        print("\n" + "="*60)
-        print("Preparing OCR Training Data")
-        print("="*60)
-        
-        training_dir = self.data_dir / "data" / "training_data"
-        
-        if not training_dir.exists():
-            print(f"[!] Training directory not found: {training_dir}")
-            return None
-        
-        data = []
-        labels = []
-        
-        # Process each character folder (0-9, A-Z)
-        for char_folder in sorted(training_dir.iterdir()):
+    def list_images(self, split_dir, limit=None):
+        """List (image path, label) pairs per character folder, up to limit per class"""
+        items = []
+        for char_folder in sorted(split_dir.iterdir()):
             if not char_folder.is_dir():
                 continue
-            
-            char_label = char_folder.name
-            images = list(char_folder.glob("*.png"))[:limit]
-            
-            print(f"\nProcessing '{char_label}': {len(images)} images")
-            
-            for img_path in images:
-                features = self.extract_image_features(img_path)
-                if features:
-                    data.append(features)
-                    labels.append(char_label)
-        
-        if len(data) == 0:
+            images = sorted(char_folder.glob("*.png"))
+            if limit:
+                images = images[:limit]
+            items.extend((img_path, char_folder.name) for img_path in images)
+        return items
+
+    def extract_to_csv(self, items, output_file, workers=1, chunk_size=256):
+        """
+        Extract features for (path, label) pairs and stream rows to a CSV
+
+        Work is split into chunks of chunk_size images. With workers > 1 the
+        chunks run in a process pool; at most 2 * workers chunks are in
+        flight and results are written in order as they arrive, so memory
+        stays bounded regardless of dataset size.
+        """
+        if self.store is not None:
+            return self.store_to_csv(items, output_file, workers, chunk_size)
+
+        chunks = [items[i:i + chunk_size] for i in range(0, len(items), chunk_size)]
+        label_counts = Counter()
+        written = 0
+        started = time.perf_counter()
+        last_report = started
+
+        with open(output_file, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(feature_names(self.feature_set) + ["label"])
+
+            results = _iter_chunk_results(chunks, self.feature_set, workers)
+            for done, (X, labels) in enumerate(results, start=1):
+                writer.writerows(row + [label] for row, label in zip(X.tolist(), labels))
+                written += len(labels)
+                label_counts.update(labels)
+
+                now = time.perf_counter()
+                if now - last_report >= 5 or done == len(chunks):
+                    last_report = now
+                    elapsed = now - started
+                    processed = min(done * chunk_size, len(items))
+                    rate = processed / elapsed if elapsed > 0 else 0.0
+                    eta = (len(items) - processed) / rate if rate > 0 else 0.0
+                    print(f"  {processed}/{len(items)} images ({processed / len(items):.0%}), "
+                          f"{rate:,.0f} img/s, ETA {eta:.0f}s")
+
+        return written, label_counts
+
+    def store_to_csv(self, items, output_file, workers=1, chunk_size=256):
+        """Bring the feature store up to date for items, then write the CSV from it"""
+        stats, stored = self.store.ensure(items, workers=workers, chunk_size=chunk_size)
+        print(f"  Feature store: {stats['reused']} reused, {stats['extracted']} extracted, "
+              f"{stats['failed']} failed ({stats['seconds']:.1f}s)")
+        X, labels = self.store.get(stored)
+        with open(output_file, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(feature_names(self.feature_set) + ["label"])
+            for start in range(0, len(stored), chunk_size):
+                rows = X[start:start + chunk_size].astype(np.float64).tolist()
+                writer.writerows(row + [label] for row, label in zip(rows, labels[start:start + chunk_size]))
+        return len(stored), Counter(labels)
+
+    def _prepare_split(self, split_name, output_name, limit, workers, chunk_size, return_df):
+        split_dir = self.data_dir / "data" / split_name
+
+        if not split_dir.exists():
+            print(f"[!] {split_name.replace('_', ' ').title()} directory not found: {split_dir}")
+            return None
+
+        items = self.list_images(split_dir, limit)
+        if len(items) == 0:
             print("[-] No images found!")
             return None
-        
-        df = pd.DataFrame(data)
-        df['label'] = labels
-        
-        print(f"\n[+] Extracted {len(df)} images with {len(df.columns)-1} features")
-        print(f"  Classes: {df['label'].unique()}")
-        print(f"  Class distribution:\n{df['label'].value_counts()}")
-        
-        # Save dataset
-        output_file = self.output_dir / "ocr_training_data.csv"
-        df.to_csv(output_file, index=False)
-        print(f"\n[+] Saved to: {output_file}")
-        
-        return df
-    
-    def prepare_ocr_testing_data(self, limit=50):
-        """Extract features from OCR testing dataset"""
+
+        workers = workers or os.cpu_count() or 1
+        print(f"Processing {len(items)} images in {len(set(label for _, label in items))} classes "
+              f"with {workers} worker(s), chunks of {chunk_size}")
+
+        output_file = self.output_dir / output_name
+        written, label_counts = self.extract_to_csv(items, output_file, workers=workers, chunk_size=chunk_size)
+
+        if written == 0:
+            print("[-] No images could be processed!")
+            return None
+
+        print(f"\n[+] Extracted {written} images with {len(feature_names(self.feature_set))} "
+              f"'{self.feature_set}' features")
+        print(f"  Classes: {sorted(label_counts)}")
+        print(f"  Class distribution: {dict(sorted(label_counts.items()))}")
+        print(f"[+] Saved to: {output_file}")
+
+        if return_df:
+            return pd.read_csv(output_file, dtype={"label": str})
+        return {"rows": written, "classes": dict(label_counts), "output_file": str(output_file)}
+
+    def prepare_ocr_training_data(self, limit=100, workers=1, chunk_size=256, return_df=True):
+        """
+        Extract features from OCR training dataset
+
+        limit: images per class (None or 0 for all)
+        workers: extraction processes (None for all cores)
+        return_df: load the CSV back as a DataFrame; pass False for full
+                   dataset runs to keep memory bounded
+        """
+        print("\n" + "="*60)
+        print("Preparing OCR Training Data")
+        print("="*60)
+        return self._prepare_split("training_data", "ocr_training_data.csv", limit, workers, chunk_size, return_df)
+
+    def prepare_ocr_testing_data(self, limit=50, workers=1, chunk_size=256, return_df=True):
+        """Extract features from OCR testing dataset (same options as training)"""
         print("\n" + "="*60)
         print("Preparing OCR Testing Data")
         print("="*60)
-        
-        testing_dir = self.data_dir / "data" / "testing_data"
-        
-        if not testing_dir.exists():
-            print(f"[!] Testing directory not found: {testing_dir}")
-            return None
-        
-        data = []
-        labels = []
-        
-        # Process each character folder
-        for char_folder in sorted(testing_dir.iterdir()):
-            if not char_folder.is_dir():
-                continue
-            
-            char_label = char_folder.name
-            images = list(char_folder.glob("*.png"))[:limit]
-            
-            print(f"Processing '{char_label}': {len(images)} images")
-            
-            for img_path in images:
-                features = self.extract_image_features(img_path)
-                if features:
-                    data.append(features)
-                    labels.append(char_label)
-        
-        if len(data) == 0:
-            print("❌ No images found!")
-            return None
-        
-        df = pd.DataFrame(data)
-        df['label'] = labels
-        
-        print(f"\n[+] Extracted {len(df)} images")
-        
-        # Save dataset
-        output_file = self.output_dir / "ocr_testing_data.csv"
-        df.to_csv(output_file, index=False)
-        print(f"[+] Saved to: {output_file}")
-        
-        return df
+        return self._prepare_split("testing_data", "ocr_testing_data.csv", limit, workers, chunk_size, return_df)
+
+
+def _extract_chunk(chunk, feature_set):
+    """Worker: features and labels of the decodable images in one chunk of (path, label) pairs"""
+    X, kept, _ = extract_chunk([path for path, _ in chunk], feature_set, dtype=None)
+    return X, [chunk[i][1] for i in kept]
+
+
+def _iter_chunk_results(chunks, feature_set, workers):
+    """Yield per-chunk results in order, keeping at most 2 * workers chunks in flight"""
+    return ordered_map(_extract_chunk, chunks, workers, feature_set)
 
 
 def main():
+    parser = argparse.ArgumentParser(description="Extract OCR features from the character image dataset")
+    parser.add_argument("--limit", type=int, default=20,
+                        help="Training images per class, 0 for all (default 20 for faster processing)")
+    parser.add_argument("--test-limit", type=int, default=10, help="Testing images per class, 0 for all")
+    parser.add_argument("--workers", type=int, default=1, help="Extraction processes, 0 for all cores")
+    parser.add_argument("--chunk-size", type=int, default=256, help="Images per work unit")
+    parser.add_argument("--feature-set", default=DEFAULT_FEATURE_SET, choices=["base", "extended", "pixels"],
+                        help="Feature schema written to the CSVs (see features.py)")
+    parser.add_argument("--store", default=None,
+                        help="Feature store directory: only new or changed images are re-extracted")
+    args = parser.parse_args()
+
     print("="*60)
     print("OCR Dataset Preparation")
     print("="*60)
     
-    ocr = OCRDataPreparation()
+    ocr = OCRDataPreparation(feature_set=args.feature_set, store_dir=args.store)
+    options = {"workers": args.workers or None, "chunk_size": args.chunk_size, "return_df": False}
     
     # Prepare training data
-    train_df = ocr.prepare_ocr_training_data(limit=20)  # Limit to 20 per class for faster processing
+    train_df = ocr.prepare_ocr_training_data(limit=args.limit, **options)
     
     # Prepare testing data
-    test_df = ocr.prepare_ocr_testing_data(limit=10)
+    test_df = ocr.prepare_ocr_testing_data(limit=args.test_limit, **options)
     
     if train_df is not None and test_df is not None:
         print("\n" + "="*60)
@@ -0,0 +1,246 @@
+"""
+Out-of-core training for tabular data that does not fit in memory
+
+Every pass reads the CSV or Parquet file in fixed-size chunks, so peak
+memory is bounded by the chunk size (plus the model), not by the number
+of rows:
+
+  pass 1   StandardScaler.partial_fit on the training rows, label counts,
+           a quantile sketch of the features (the drift reference, drift.py)
+  pass 2+  the model, from scaled chunks:
+             sgd     SGDClassifier.partial_fit (logistic loss), one pass
+                     per epoch, class-balanced sample weights
+             forest  a small random forest per chunk; at most max_trees
+                     trees are kept by reservoir sampling, so every chunk
+                     is equally likely to contribute, and the survivors
+                     are merged into one RandomForestClassifier (still
+                     exportable by export_models.py)
+  last     evaluation on the holdout rows with streaming metrics
+
+Train/holdout membership is a hash of the row's id column (or of its
+global row number), so the same row falls on the same side in every pass
+and on every run, without keeping a list of test rows.
+"""
+
+import time
+
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.linear_model import SGDClassifier
+from sklearn.preprocessing import StandardScaler
+
+from drift import QuantileSketch
+
+HASH_BUCKETS = 10000
+
+
+def iter_chunks(path, chunk_size=100_000, columns=None):
+    """Yield DataFrames of at most chunk_size rows from a CSV or Parquet file"""
+    path = str(path)
+    if path.endswith((".parquet", ".pq")):
+        try:
+            import pyarrow.parquet as pq
+        except ImportError as e:
+            raise ImportError("Reading Parquet in chunks requires pyarrow (pip install pyarrow)") from e
+        parquet = pq.ParquetFile(path)
+        for batch in parquet.iter_batches(batch_size=chunk_size, columns=columns):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(path, chunksize=chunk_size, usecols=columns)
+
+
+def holdout_mask(chunk, offset, test_fraction, id_column=None, seed=0):
+    """Boolean mask of holdout rows: a stable hash of the id (or global row number)"""
+    keys = chunk[id_column] if id_column else pd.Series(np.arange(offset, offset + len(chunk)))
+    hashes = pd.util.hash_pandas_object(keys, index=False, hash_key=f"holdout{seed:08d}".ljust(16)[:16])
+    return (hashes.to_numpy() % HASH_BUCKETS) < test_fraction * HASH_BUCKETS
+
+
+class StreamingMetrics:
+    """
+    Binary classification metrics accumulated chunk by chunk
+
+    Confusion counts, log loss and ROC AUC (from fixed-width score
+    histograms) need O(bins) memory regardless of the number of rows.
+    """
+
+    def __init__(self, threshold=0.5, bins=1000):
+        self.threshold = threshold
+        self.bins = bins
+        self.tp = self.fp = self.tn = self.fn = 0
+        self.log_loss_sum = 0.0
+        self.positive_hist = np.zeros(bins, dtype=np.int64)
+        self.negative_hist = np.zeros(bins, dtype=np.int64)
+
+    def update(self, y_true, scores):
+        y_true = np.asarray(y_true).astype(bool)
+        scores = np.clip(np.asarray(scores, dtype=np.float64), 1e-15, 1 - 1e-15)
+        predicted = scores >= self.threshold
+        self.tp += int(np.sum(predicted & y_true))
+        self.fp += int(np.sum(predicted & ~y_true))
+        self.tn += int(np.sum(~predicted & ~y_true))
+        self.fn += int(np.sum(~predicted & y_true))
+        self.log_loss_sum -= float(np.sum(np.where(y_true, np.log(scores), np.log(1 - scores))))
+        index = np.minimum((scores * self.bins).astype(np.int64), self.bins - 1)
+        self.positive_hist += np.bincount(index[y_true], minlength=self.bins)
+        self.negative_hist += np.bincount(index[~y_true], minlength=self.bins)
+
+    @property
+    def count(self):
+        return self.tp + self.fp + self.tn + self.fn
+
+    def roc_auc(self):
+        """AUC from the score histograms (ties within a bin count one half)"""
+        positives, negatives = self.positive_hist.sum(), self.negative_hist.sum()
+        if positives == 0 or negatives == 0:
+            return None
+        negatives_below = np.cumsum(self.negative_hist) - self.negative_hist
+        pairs = np.sum(self.positive_hist * (negatives_below + 0.5 * self.negative_hist))
+        return float(pairs / (positives * negatives))
+
+    def result(self):
+        precision = self.tp / (self.tp + self.fp) if self.tp + self.fp else 0.0
+        recall = self.tp / (self.tp + self.fn) if self.tp + self.fn else 0.0
+        return {
+            "rows": self.count,
+            "accuracy": (self.tp + self.tn) / self.count if self.count else 0.0,
+            "precision": precision,
+            "recall": recall,
+            "f1_score": 2 * precision * recall / (precision + recall) if precision + recall else 0.0,
+            "log_loss": self.log_loss_sum / self.count if self.count else 0.0,
+            "roc_auc": self.roc_auc(),
+        }
+
+
+class StreamingTrainer:
+    """Trains a scaler and a binary classifier on a file in bounded memory"""
+
+    def __init__(self, path, label_column, id_column=None, feature_columns=None, chunk_size=100_000,
+                 test_fraction=0.2, model="forest", epochs=3, trees_per_chunk=10, max_trees=100,
+                 max_depth=15, random_state=42):
+        if model not in ("sgd", "forest"):
+            raise ValueError(f"Unknown streaming model: {model}")
+        self.path = path
+        self.label_column = label_column
+        self.id_column = id_column
+        self.feature_columns = feature_columns
+        self.chunk_size = chunk_size
+        self.test_fraction = test_fraction
+        self.model_kind = model
+        self.epochs = epochs
+        self.trees_per_chunk = trees_per_chunk
+        self.max_trees = max_trees
+        self.max_depth = max_depth
+        self.rng = np.random.default_rng(random_state)
+        self.random_state = random_state
+        self.scaler = StandardScaler()
+        self.sketch = None
+        self.classes = None
+        self.class_counts = None
+        self.chunks_read = 0
+
+    def _split_chunks(self):
+        """Yield (X, y, holdout mask) per chunk of the file"""
+        offset = 0
+        for chunk in iter_chunks(self.path, self.chunk_size):
+            if self.feature_columns is None:
+                excluded = {self.label_column, self.id_column}
+                self.feature_columns = [
+                    c for c in chunk.select_dtypes(include=[np.number]).columns if c not in excluded
+                ]
+            mask = holdout_mask(chunk, offset, self.test_fraction, self.id_column, self.random_state)
+            offset += len(chunk)
+            self.chunks_read += 1
+            X = chunk[self.feature_columns].to_numpy(dtype=np.float64)
+            yield X, chunk[self.label_column].to_numpy(), mask
+
+    def fit_scaler(self):
+        """Pass 1: scaler statistics, feature sketch and class counts over the training rows"""
+        counts = {}
+        for X, y, holdout in self._split_chunks():
+            train = ~holdout
+            if train.any():
+                self.scaler.partial_fit(X[train])
+                if self.sketch is None:
+                    self.sketch = QuantileSketch(X.shape[1], seed=self.random_state)
+                self.sketch.update(X[train])
+                labels, n = np.unique(y[train], return_counts=True)
+                for label, count in zip(labels, n):
+                    counts[label] = counts.get(label, 0) + int(count)
+        if len(counts) < 2:
+            raise ValueError(f"Need at least 2 classes in '{self.label_column}', found {list(counts)}")
+        self.classes = np.array(sorted(counts))
+        self.class_counts = np.array([counts[c] for c in self.classes])
+        return self.scaler
+
+    def _train_chunks(self):
+        for X, y, holdout in self._split_chunks():
+            train = ~holdout
+            if train.any():
+                yield self.scaler.transform(X[train]), y[train]
+
+    def fit_sgd(self):
+        model = SGDClassifier(loss="log_loss", alpha=1e-5, random_state=self.random_state)
+        # Class-balanced weights from the pass-1 counts (partial_fit cannot use class_weight="balanced")
+        weights = self.class_counts.sum() / (len(self.classes) * self.class_counts)
+        for _ in range(self.epochs):
+            for X, y in self._train_chunks():
+                model.partial_fit(X, y, classes=self.classes, sample_weight=weights[np.searchsorted(self.classes, y)])
+        return model
+
+    def fit_forest(self):
+        reservoir = []
+        seen = 0
+        skipped = 0
+        for X, y in self._train_chunks():
+            if len(np.unique(y)) < len(self.classes):
+                # Trees must share one class layout to be merged
+                skipped += 1
+                continue
+            seed = int(self.rng.integers(2**31 - 1))
+            forest = RandomForestClassifier(n_estimators=self.trees_per_chunk, max_depth=self.max_depth,
+                                            random_state=seed, n_jobs=-1).fit(X, y)
+            for tree in forest.estimators_:
+                seen += 1
+                if len(reservoir) < self.max_trees:
+                    reservoir.append(tree)
+                else:
+                    slot = int(self.rng.integers(seen))
+                    if slot < self.max_trees:
+                        reservoir[slot] = tree
+            del forest
+        if skipped:
+            print(f"  [!] Skipped {skipped} chunk(s) missing a class")
+        if not reservoir:
+            raise ValueError("No chunk contained every class; increase the chunk size")
+        return merge_trees(reservoir, self.classes, len(self.feature_columns), self.max_depth)
+
+    def fit(self):
+        started = time.perf_counter()
+        self.fit_scaler()
+        model = self.fit_sgd() if self.model_kind == "sgd" else self.fit_forest()
+        self.fit_seconds = time.perf_counter() - started
+        return model
+
+    def evaluate(self, model, threshold=0.5):
+        """Streaming metrics over the holdout rows, read chunk by chunk like training"""
+        metrics = StreamingMetrics(threshold)
+        positive = list(model.classes_).index(self.classes[-1])
+        for X, y, holdout in self._split_chunks():
+            if holdout.any():
+                scores = model.predict_proba(self.scaler.transform(X[holdout]))[:, positive]
+                metrics.update(y[holdout] == self.classes[-1], scores)
+        return metrics.result()
+
+
+def merge_trees(trees, classes, n_features, max_depth=None):
+    """One RandomForestClassifier from fitted decision trees sharing the same classes"""
+    forest = RandomForestClassifier(n_estimators=len(trees), max_depth=max_depth)
+    forest.estimator_ = trees[0]
+    forest.estimators_ = list(trees)
+    forest.classes_ = np.asarray(classes)
+    forest.n_classes_ = len(classes)
+    forest.n_outputs_ = 1
+    forest.n_features_in_ = n_features
+    return forest
@@ -1,5 +1,7 @@
 import os
+import sys
 import json
+import argparse
 import numpy as np
 import pandas as pd
 from pathlib import Path
@@ -9,11 +11,35 @@ from sklearn.preprocessing import StandardScaler
 from sklearn.metrics import accuracy_score, mean_squared_error
 import joblib
 
+# features.py lives in the ml-service directory, one level up
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from drift import REFERENCE_FILE, reference_profile, save_references  # noqa: E402
+from features import extract_features, load_image  # noqa: E402
+from feature_store import FeatureStore  # noqa: E402
+from image_dataset import ImageDataset, open_sample, prefetch  # noqa: E402
+from model_search import run_search, print_leaderboard  # noqa: E402
+from stream_training import StreamingTrainer  # noqa: E402
+
+# Feature set the OCR model is trained on; the service picks the matching
+# set from the scaler's input width ("pixels" = the first 100 pixels)
+OCR_FEATURE_SET = os.environ.get("ML_OCR_FEATURE_SET", "pixels")
+
 class MLPipeline:
-    def __init__(self):
-        self.models_dir = Path('models')
-        self.models_dir.mkdir(exist_ok=True)
+    def __init__(self, models_dir='models', version=None, search=False, cache_dir=None,
+                 search_options=None):
+        # With a version, artifacts go to models/<version>/ so the running
+        # service can load and swap them in without a restart
+        self.models_dir = Path(models_dir) / version if version else Path(models_dir)
+        self.models_dir.mkdir(parents=True, exist_ok=True)
         self.results = {}
+        # search=True replaces the fixed forest with a cross-validated model
+        # search (model_search.py); search_options are run_search keywords
+        self.search = search
+        self.search_options = search_options or {}
+        # On-disk cache for extracted features (feature store) and scaled CV folds
+        self.cache_dir = cache_dir
+        # Training feature profiles per served model, for the service's drift monitor
+        self.references = {}
     
     def load_data(self, csv_file):
         print(f"Loading: {csv_file}")
@@ -21,6 +47,31 @@ class MLPipeline:
         print(f"  Shape: {df.shape}")
         return df
     
+    def image_features(self, items, feature_set):
+        """
+        Features and labels for (image path, label) pairs
+
+        With a cache directory the features come from the feature store, so
+        only new or changed images are decoded; otherwise all are extracted.
+        Returns (X, labels, image shapes) for the images that could be read.
+        """
+        if self.cache_dir:
+            store = FeatureStore(Path(self.cache_dir) / "features", feature_set)
+            stats, stored = store.ensure(items)
+            print(f"  Feature store: {stats['reused']} reused, {stats['extracted']} extracted")
+            X, labels = store.get(stored)
+            return X, labels, store.shapes(stored)
+        def load(item):
+            try:
+                return load_image(open_sample(item[0])), item[1]
+            except Exception as e:
+                print(f"    Error processing image {item[0]}: {e}")
+                return None
+        
+        decoded = [result for result in prefetch(items, load) if result is not None]
+        images = [image for image, _ in decoded]
+        return extract_features(images, feature_set), [label for _, label in decoded], [image.shape for image in images]
+    
     def train_classifier(self, X, y):
         print("Training Classifier...")
         
@@ -29,10 +80,13 @@ class MLPipeline:
             print("[!] Need at least 2 classes")
             return
         
-        min_class_size = min(np.bincount(y))
+        min_class_size = np.unique(y, return_counts=True)[1].min()
         stratify = y if min_class_size >= 2 else None
         
         X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42, stratify=stratify)
+        if self.search:
+            self._search_and_save("classifier", "classification", X_train, y_train, X_test, y_test)
+            return
         scaler = StandardScaler()
         X_tr = scaler.fit_transform(X_train)
         X_te = scaler.transform(X_test)
@@ -48,6 +102,9 @@ class MLPipeline:
     def train_regressor(self, X, y):
         print("Training Regressor...")
         X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+        if self.search:
+            self._search_and_save("regressor", "regression", X_train, y_train, X_test, y_test)
+            return
         scaler = StandardScaler()
         X_tr = scaler.fit_transform(X_train)
         X_te = scaler.transform(X_test)
@@ -60,11 +117,63 @@ class MLPipeline:
         joblib.dump(scaler, self.models_dir / "regressor_scaler.pkl")
         self.results["regressor"] = {"rmse": float(rmse)}
     
+    def _search_and_save(self, name, task, X_train, y_train, X_test, y_test):
+        cache_dir = str(Path(self.cache_dir) / "folds") if self.cache_dir else None
+        pipeline, leaderboard = run_search(
+            X_train, y_train, X_test, y_test, task=task, cache_dir=cache_dir, **self.search_options
+        )
+        print_leaderboard(leaderboard)
+        selected = next(e for e in leaderboard["entries"] if e["selected"])
+        metric = leaderboard["metric"]
+        print(f"[+] Selected {selected['family']}: {metric} {selected['holdout'][metric]:.4f}, "
+              f"p99 {selected['latency']['p99_ms']:.3f} ms/row")
+        # The service loads the model and its scaler as separate artifacts
+        joblib.dump(pipeline.named_steps["model"], self.models_dir / f"{name}.pkl")
+        joblib.dump(pipeline.named_steps["scaler"], self.models_dir / f"{name}_scaler.pkl")
+        path = self.models_dir / f"{name}_leaderboard.json"
+        with open(path, "w") as f:
+            json.dump(leaderboard, f, indent=2)
+        print(f"[+] Leaderboard: {path}")
+        self.results[name] = {
+            metric: selected["holdout"][metric],
+            "family": selected["family"],
+            "params": selected["params"],
+            "latency_p99_ms": selected["latency"]["p99_ms"],
+        }
+    
+    def train_classifier_streaming(self, path, label_column, prefix="fraud", **options):
+        """Out-of-core training on a CSV/Parquet file, read in chunks (stream_training.py)"""
+        print(f"Training Classifier (streaming {path})...")
+        trainer = StreamingTrainer(path, label_column, **options)
+        model = trainer.fit()
+        metrics = trainer.evaluate(model)
+        print(f"[+] {trainer.model_kind}: {trainer.chunks_read} chunks read over all passes, {sum(trainer.class_counts)} training rows, "
+              f"{trainer.fit_seconds:.1f}s")
+        print(f"[+] Holdout ({metrics['rows']} rows): accuracy {metrics['accuracy']:.4f}, "
+              f"f1 {metrics['f1_score']:.4f}, roc_auc {metrics['roc_auc']}")
+        joblib.dump(model, self.models_dir / f"{prefix}_classifier.pkl")
+        joblib.dump(trainer.scaler, self.models_dir / f"{prefix}_scaler.pkl")
+        self.results[f"{prefix}_classifier"] = {"model": trainer.model_kind, **metrics}
+        self.add_reference(prefix, trainer.sketch, names=trainer.feature_columns)
+    
+    def add_reference(self, name, source, names=None, **meta):
+        """Drift reference for the served model `name` from its raw (unscaled) training features"""
+        if hasattr(source, "columns"):
+            names = source.columns if names is None else names
+            source = source.to_numpy(dtype=np.float64)
+        self.references[name] = reference_profile(source, names=names, **meta)
+        print(f"[+] Drift reference for '{name}': {self.references[name]['rows']} rows, "
+              f"{self.references[name]['n_features']} features")
+    
     def save_results(self):
         path = self.models_dir / "results.json"
         with open(path, "w") as f:
             json.dump(self.results, f, indent=2)
         print(f"[+] Results: {path}")
+        if self.references:
+            path = self.models_dir / REFERENCE_FILE
+            save_references(path, self.references)
+            print(f"[+] Drift references: {path}")
 
 def find_csv_files(folder_path):
     """Find all CSV files in a folder"""
@@ -81,13 +190,49 @@ def get_base_path():
     script_dir = Path(__file__).parent.parent.parent
     return script_dir
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="Train the ML service models")
+    parser.add_argument("--search", action="store_true",
+                        help="Cross-validated model/hyperparameter search instead of the fixed random forest")
+    parser.add_argument("--families", nargs="+", default=None,
+                        help="Model families to search (default: all for the task)")
+    parser.add_argument("--candidates", type=int, default=40, help="Configurations sampled by the search")
+    parser.add_argument("--cv", type=int, default=5, help="Cross-validation folds")
+    parser.add_argument("--latency-budget-ms", type=float, default=None,
+                        help="Pick the most accurate model whose per-row p99 latency fits this budget")
+    parser.add_argument("--n-jobs", type=int, default=-1, help="Parallel fits (-1 = all cores)")
+    parser.add_argument("--cache-dir", default=os.environ.get("ML_TRAIN_CACHE_DIR", ".cache/training"),
+                        help="On-disk cache for extracted features and scaled folds")
+    parser.add_argument("--no-cache", action="store_true", help="Disable the on-disk cache")
+    parser.add_argument("--ocr-per-class", type=int, default=20,
+                        help="OCR images sampled per character class (0 = all)")
+    parser.add_argument("--fraud-data", default=os.environ.get("ML_FRAUD_DATA"),
+                        help="Labelled fraud CSV/Parquet file, trained out of core (default: synthetic data)")
+    parser.add_argument("--fraud-label", default="is_fraudulent", help="Label column of --fraud-data")
+    parser.add_argument("--fraud-id-column", default=None,
+                        help="Column hashed for the train/holdout split (default: row number)")
+    parser.add_argument("--chunk-size", type=int, default=100_000, help="Rows read per chunk when streaming")
+    parser.add_argument("--stream-model", choices=["forest", "sgd"], default="forest",
+                        help="forest: merged per-chunk forests, sgd: incremental logistic regression")
+    return parser.parse_args()
+
 def main():
+    args = parse_args()
     print("="*60)
-    print("Random Forest Training")
+    print("Model Search Training" if args.search else "Random Forest Training")
     print("="*60)
     
     base_path = get_base_path()
-    pipeline = MLPipeline()
+    search_options = {
+        "families": args.families,
+        "n_candidates": args.candidates,
+        "cv": args.cv,
+        "n_jobs": args.n_jobs,
+        "latency_budget_ms": args.latency_budget_ms,
+    }
+    pipeline = MLPipeline(version=os.environ.get("ML_MODEL_VERSION"), search=args.search,
+                          cache_dir=None if args.no_cache else args.cache_dir, search_options=search_options)
+    print(f"Writing models to: {pipeline.models_dir}")
     count = 0
     
     print("\n[1] Coursera Dataset")
@@ -133,50 +278,53 @@ def main():
     
     print("\n[3] OCR Dataset")
     ocr_dir = base_path / "Datasets" / "standard OCR dataset"
-    if os.path.exists(str(ocr_dir)):
+    # The folder and/or its ZIP archive, indexed once and read lazily
+    ocr_sources = [p for p in (ocr_dir, ocr_dir.with_name(ocr_dir.name + ".zip")) if p.exists()]
+    if ocr_sources:
         print("  Processing OCR images...")
         try:
-            from PIL import Image
-            ocr_features = []
-            ocr_labels = []
+            index_cache = Path(args.cache_dir) / "datasets" if not args.no_cache else None
+            dataset = ImageDataset(ocr_sources, cache_dir=index_cache)
+            sample = dataset.sample(per_class=args.ocr_per_class or None, seed=42)
+            print(f"  Indexed {len(dataset)} images in {len(dataset.classes)} classes, sampled {len(sample)}")
+            ocr_items = dataset.items(sample)
             
-            for root, dirs, files in os.walk(str(ocr_dir)):
-                for file in files:
-                    if file.endswith(('.png', '.jpg', '.jpeg')):
-                        img_path = os.path.join(root, file)
-                        try:
-                            img = Image.open(img_path).convert('L')
-                            img_array = np.array(img).flatten()[:100]
-                            if len(img_array) == 100:
-                                ocr_features.append(img_array)
-                                label = os.path.basename(root)
-                                ocr_labels.append(label)
-                        except Exception as e:
-                            print(f"    Error processing image {img_path}: {e}")
-                    if len(ocr_features) >= 200:
-                        break
-                if len(ocr_features) >= 200:
-                    break
+            X, labels, shapes = pipeline.image_features(ocr_items, OCR_FEATURE_SET)
+            if OCR_FEATURE_SET == "pixels":
+                # The pixel features need at least 100 pixels per image
+                keep = [i for i, (h, w) in enumerate(shapes) if h * w >= 100]
+                X, labels = X[keep], [labels[i] for i in keep]
             
-            if len(ocr_features) > 10:
-                X = pd.DataFrame(ocr_features)
-                y = pd.Series(ocr_labels)
-                print(f"  Found {len(ocr_features)} images")
+            if len(labels) > 10:
+                X = pd.DataFrame(X)
+                y = pd.Series(labels)
+                print(f"  Found {len(labels)} images ({OCR_FEATURE_SET} features: {X.shape[1]})")
                 pipeline.train_classifier(X, y)
+                pipeline.add_reference("ocr", X, feature_set=OCR_FEATURE_SET)
                 count += 1
             else:
-                print(f"  Not enough images: {len(ocr_features)}")
+                print(f"  Not enough images: {len(labels)}")
         except Exception as e:
             print(f"  Error: {e}")
     else:
         print(f"  OCR directory not found")
     
-    print("\n[4] Synthetic Fraud Data")
-    X = np.random.randn(1000, 10)
-    y = ((X[:, 0] > 0.5) & (X[:, 1] < -0.5)).astype(int)
-    X = pd.DataFrame(X, columns=[f"f{i}" for i in range(10)])
-    pipeline.train_classifier(X, y)
-    count += 1
+    if args.fraud_data:
+        print("\n[4] Fraud Data (streaming)")
+        try:
+            pipeline.train_classifier_streaming(args.fraud_data, args.fraud_label, id_column=args.fraud_id_column,
+                                                chunk_size=args.chunk_size, model=args.stream_model)
+            count += 1
+        except Exception as e:
+            print(f"  Error: {e}")
+    else:
+        print("\n[4] Synthetic Fraud Data")
+        X = np.random.randn(1000, 10)
+        y = ((X[:, 0] > 0.5) & (X[:, 1] < -0.5)).astype(int)
+        X = pd.DataFrame(X, columns=[f"f{i}" for i in range(10)])
+        pipeline.train_classifier(X, y)
+        pipeline.add_reference("fraud", X)
+        count += 1
     
     pipeline.save_results()
     print("\n" + "="*60)
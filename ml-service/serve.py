@@ -0,0 +1,121 @@
+"""
+Multi-process ML service launcher
+
+Loads every model once in the parent process, then forks N uvicorn workers
+that accept connections on one shared listening socket. The forests'
+read-only tree arrays stay in pages shared copy-on-write between the
+parent and all workers, so adding workers does not multiply model memory
+the way `uvicorn --workers N` (which re-imports and reloads per worker)
+does.
+
+Usage (from the ml-service directory):
+    python serve.py --workers 4 --port 8000
+"""
+
+import argparse
+import gc
+import logging
+import os
+import signal
+import socket
+import sys
+import time
+
+import uvicorn
+
+import app as service
+
+logger = logging.getLogger("serve")
+
+
+def bind_socket(host, port, backlog=2048):
+    """Create the listening socket shared by every worker"""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+def run_worker(sock, log_level):
+    """Child process: serve the already-loaded app on the shared socket"""
+    # Let uvicorn install its own graceful-shutdown handlers
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+
+    config = uvicorn.Config(service.app, log_level=log_level)
+    server = uvicorn.Server(config)
+    try:
+        server.run(sockets=[sock])
+    finally:
+        os._exit(0)
+
+
+def spawn_worker(sock, log_level):
+    pid = os.fork()
+    if pid == 0:
+        run_worker(sock, log_level)
+    return pid
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the ML service with pre-forked workers")
+    parser.add_argument("--host", default=os.getenv("ML_HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("ML_PORT", "8000")))
+    parser.add_argument("--workers", type=int, default=int(os.getenv("ML_WORKERS", "0")) or os.cpu_count())
+    parser.add_argument("--log-level", default=os.getenv("ML_LOG_LEVEL", "info"))
+    args = parser.parse_args()
+
+    if not hasattr(os, "fork"):
+        logger.error("❌ Pre-fork serving requires os.fork(); use `uvicorn app:app` on this platform")
+        sys.exit(1)
+
+    logger.info(f"🚀 Loading models once in parent (pid {os.getpid()})...")
+    if not service.load_models():
+        logger.error("❌ Failed to load models")
+        sys.exit(1)
+
+    # Move every object allocated so far into the permanent generation so
+    # the cyclic GC in the workers never writes to (and un-shares) them
+    gc.collect()
+    gc.freeze()
+
+    sock = bind_socket(args.host, args.port)
+    logger.info(f"✅ Listening on {args.host}:{args.port}, forking {args.workers} workers")
+
+    workers = {spawn_worker(sock, args.log_level) for _ in range(args.workers)}
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in workers:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+
+    # Supervise: restart workers that die unexpectedly
+    while workers:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        workers.discard(pid)
+        if not stopping:
+            logger.warning(f"Worker {pid} exited with status {status}, restarting")
+            time.sleep(0.5)
+            workers.add(spawn_worker(sock, args.log_level))
+
+    sock.close()
+    logger.info("👋 All workers stopped")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+"""
+Shadow and canary evaluation for fraud scoring
+
+A candidate model version scores a sample of live requests in the
+background after the primary response has been sent, and the two
+results are compared: score deltas and threshold-crossing disagreements
+(one model flags the certificate, the other does not).
+
+Shadow work runs on its own bounded queue and worker threads, never on
+the inference pool used by the primary path. When the queue is full a
+sample is dropped (put_nowait) rather than waited for, so a slow or
+overloaded candidate cannot add latency to live traffic. On Linux the
+shadow threads also run at the lowest scheduling priority, so on a busy
+host they only use CPU the primary path leaves idle.
+
+Canary mode is separate: a percentage of requests is answered by the
+candidate itself.
+"""
+
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+
+def _percentile(values, q):
+    if not values:
+        return 0.0
+    return round(values[min(len(values) - 1, int(q * len(values)))], 3)
+
+
+class ShadowEvaluator:
+    """Compares a candidate fraud model against the primary on sampled traffic"""
+
+    def __init__(self, registry, score_batch, sample_rate=1.0, canary_percent=0.0,
+                 max_queue=256, workers=1, stats_window=4096):
+        """
+        registry: ModelRegistry of the candidate version
+        score_batch: callable(rows) -> list of result dicts scored by the candidate
+        sample_rate: fraction of primary requests scored in shadow (0..1)
+        canary_percent: percentage of requests answered by the candidate (0..100)
+        max_queue: pending shadow samples; further samples are dropped
+        """
+        self.registry = registry
+        self.version = registry.model_version
+        self.score_batch = score_batch
+        self.sample_rate = float(sample_rate)
+        self.canary_percent = float(canary_percent)
+        self.max_queue = int(max_queue)
+
+        self._queue = queue.Queue(maxsize=self.max_queue)
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._deltas = deque(maxlen=stats_window)
+        self._latencies = deque(maxlen=stats_window)
+        self.sampled = 0
+        self.scored = 0
+        self.dropped = 0
+        self.errors = 0
+        self.canary_requests = 0
+        self.max_depth = 0
+        self.flagged_by_primary_only = 0
+        self.flagged_by_candidate_only = 0
+        self.delta_sum = 0.0
+        self.max_abs_delta = 0.0
+        self.started_at = time.time()
+
+        self._workers = [
+            threading.Thread(target=self._run, name=f"shadow-{i}", daemon=True) for i in range(max(1, int(workers)))
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    def route_to_canary(self):
+        """Whether this request should be answered by the candidate"""
+        if self.canary_percent > 0 and random.random() * 100 < self.canary_percent:
+            with self._lock:
+                self.canary_requests += 1
+            return True
+        return False
+
+    def submit(self, features, primary):
+        """Queue a shadow comparison for a primary result; never blocks"""
+        if self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+            return False
+        if self._stopping.is_set():
+            return False
+        try:
+            self._queue.put_nowait((features, primary))
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+            return False
+        with self._lock:
+            self.sampled += 1
+            self.max_depth = max(self.max_depth, self._queue.qsize())
+        return True
+
+    def _run(self):
+        try:
+            # Linux applies priorities per thread: nice 19 for this worker only
+            os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), 19)
+        except (AttributeError, OSError):
+            pass
+        while True:
+            item = self._queue.get()
+            if item is None or self._stopping.is_set():
+                return
+            features, primary = item
+            started = time.perf_counter()
+            try:
+                candidate = self.score_batch([features])[0]
+            except Exception as e:
+                with self._lock:
+                    self.errors += 1
+                logger.error(f"Shadow scoring failed ({self.version}): {e}")
+                continue
+            self._record(primary, candidate, time.perf_counter() - started)
+
+    def _record(self, primary, candidate, seconds):
+        delta = candidate["fraud_score"] - primary["fraud_score"]
+        with self._lock:
+            self.scored += 1
+            self.delta_sum += delta
+            self.max_abs_delta = max(self.max_abs_delta, abs(delta))
+            self._deltas.append(abs(delta))
+            self._latencies.append(seconds * 1000)
+            if primary["is_fraudulent"] and not candidate["is_fraudulent"]:
+                self.flagged_by_primary_only += 1
+            elif candidate["is_fraudulent"] and not primary["is_fraudulent"]:
+                self.flagged_by_candidate_only += 1
+
+    def stop(self):
+        """
+        Stop the workers, discarding queued samples; never blocks
+
+        Called from the event loop, so it must not wait for a slow
+        candidate to drain a full queue.
+        """
+        self._stopping.set()
+        discarded = 0
+        while True:
+            try:
+                self._queue.get_nowait()
+            except queue.Empty:
+                break
+            discarded += 1
+        with self._lock:
+            self.dropped += discarded
+        for _ in self._workers:
+            try:
+                # Wakes a worker blocked on an empty queue; busy ones see _stopping
+                self._queue.put_nowait(None)
+            except queue.Full:
+                break
+
+    def stats(self):
+        with self._lock:
+            deltas = sorted(self._deltas)
+            latencies = sorted(self._latencies)
+            disagreements = self.flagged_by_primary_only + self.flagged_by_candidate_only
+            return {
+                "candidate_version": self.version,
+                "sample_rate": self.sample_rate,
+                "canary_percent": self.canary_percent,
+                "canary_requests": self.canary_requests,
+                "sampled": self.sampled,
+                "scored": self.scored,
+                "dropped": self.dropped,
+                "errors": self.errors,
+                "queue_depth": self._queue.qsize(),
+                "max_queue": self.max_queue,
+                "max_depth": self.max_depth,
+                "mean_delta": round(self.delta_sum / self.scored, 4) if self.scored else 0.0,
+                "abs_delta": {
+                    "p50": _percentile(deltas, 0.50),
+                    "p95": _percentile(deltas, 0.95),
+                    "p99": _percentile(deltas, 0.99),
+                    "max": round(self.max_abs_delta, 3),
+                },
+                "disagreements": disagreements,
+                "disagreement_rate": round(disagreements / self.scored, 4) if self.scored else 0.0,
+                "flagged_by_primary_only": self.flagged_by_primary_only,
+                "flagged_by_candidate_only": self.flagged_by_candidate_only,
+                "candidate_latency_ms": {
+                    "p50": _percentile(latencies, 0.50),
+                    "p99": _percentile(latencies, 0.99),
+                },
+                "started_at": self.started_at,
+            }
@@ -0,0 +1,318 @@
+"""
+Persistent-stream scoring over WebSocket
+
+One connection carries any number of scoring requests. Each WebSocket
+message is one request object, or a list of them, encoded as JSON (text
+message) or msgpack (binary message, see codec.py):
+
+    {"id": 17, "model": "fraud", "features": [...], "certificate_id": "abc"}
+
+Requests are scored concurrently as they arrive, so a client can pipeline
+thousands of them without waiting, and every response is sent on its own
+as soon as it completes - not in request order - in the encoding of the
+message that carried the request:
+
+    {"id": 17, "result": {...}}
+    {"id": 18, "error": "Inference queue is full, retry later", "status": 503}
+
+"id" is echoed back untouched and is how clients match responses to
+requests. At most max_in_flight requests per connection are being scored
+or waiting for their response to be written; beyond that the server stops
+reading, so a client that sends faster than it reads is slowed down by
+ordinary TCP flow control instead of growing server memory.
+
+StreamClient is the matching pipelining client. It talks to a real server
+through the websockets package, or to the ASGI app directly through
+InProcessConnection (no network or server process), e.g. for tests and
+benchmarks.
+"""
+
+import asyncio
+import itertools
+import json
+import logging
+
+from codec import CodecError, decode_msgpack, encode_msgpack
+
+logger = logging.getLogger(__name__)
+
+
+def decode_message(message):
+    """Request objects from a websocket.receive message (text = JSON, bytes = msgpack)"""
+    if message.get("text") is not None:
+        try:
+            payload = json.loads(message["text"])
+        except ValueError as e:
+            raise CodecError(f"Invalid JSON message: {e}") from e
+    else:
+        payload = decode_msgpack(message.get("bytes") or b"", allow_list=True)
+    requests = payload if isinstance(payload, list) else [payload]
+    if not all(isinstance(request, dict) for request in requests):
+        raise CodecError("A message must be a request object or a list of them")
+    return requests
+
+
+def encode_message(payload, binary):
+    if binary:
+        return encode_msgpack(payload)
+    return json.dumps(payload, separators=(",", ":"))
+
+
+class ScoringStream:
+    """Serve one accepted WebSocket: read requests, score them concurrently, write responses"""
+
+    def __init__(self, websocket, score, max_in_flight=256, on_error=None):
+        """
+        score: coroutine function score(request) -> JSON-serializable result
+        on_error: function(exception, request) -> (status, detail); exceptions
+                  are reported as status 500 with their message when omitted
+        """
+        self.websocket = websocket
+        self.score = score
+        self.on_error = on_error or (lambda error, request: (500, str(error)))
+        self.max_in_flight = max(1, int(max_in_flight))
+
+        self._slots = asyncio.Semaphore(self.max_in_flight)
+        self._outbox = asyncio.Queue()
+        self._tasks = set()
+        self._closing = False
+        self.write_error = None
+
+        # Stats
+        self.messages = 0
+        self.requests = 0
+        self.errors = 0
+
+    async def run(self):
+        """Serve until the client disconnects or a send fails; pending requests are cancelled"""
+        writer = asyncio.create_task(self._write(asyncio.current_task()))
+        try:
+            while True:
+                message = await self.websocket.receive()
+                if message["type"] == "websocket.disconnect":
+                    break
+                self.messages += 1
+                binary = message.get("text") is None
+                try:
+                    requests = decode_message(message)
+                except CodecError as e:
+                    self.errors += 1
+                    # Error frames hold a slot too, so unread ones are bounded as well
+                    await self._slots.acquire()
+                    self._outbox.put_nowait(encode_message({"id": None, "error": str(e), "status": 400}, binary))
+                    continue
+                for request in requests:
+                    # Backpressure: stop reading while max_in_flight responses are pending
+                    await self._slots.acquire()
+                    task = asyncio.create_task(self._handle(request, binary))
+                    self._tasks.add(task)
+                    task.add_done_callback(self._tasks.discard)
+        except asyncio.CancelledError:
+            # The writer cancels the read loop when a send fails: no slot will be freed again
+            if self.write_error is None:
+                raise
+            asyncio.current_task().uncancel()
+            logger.info("Closing scoring stream, sending a response failed: %r", self.write_error)
+        finally:
+            self._closing = True
+            for task in list(self._tasks):
+                task.cancel()
+            writer.cancel()
+            await asyncio.gather(writer, *self._tasks, return_exceptions=True)
+
+    async def _handle(self, request, binary):
+        """Score one request and queue its response; the writer frees its slot once sent"""
+        self.requests += 1
+        try:
+            response = {"id": request.get("id"), "result": await self.score(request)}
+        except asyncio.CancelledError:
+            self._slots.release()
+            raise
+        except Exception as e:
+            self.errors += 1
+            status, detail = self.on_error(e, request)
+            response = {"id": request.get("id"), "error": detail, "status": status}
+        try:
+            data = encode_message(response, binary)
+        except Exception:
+            self._slots.release()
+            raise
+        self._outbox.put_nowait(data)
+
+    async def _write(self, reader):
+        """Single writer, so concurrent responses never interleave on the socket"""
+        while True:
+            data = await self._outbox.get()
+            try:
+                if isinstance(data, str):
+                    await self.websocket.send_text(data)
+                else:
+                    await self.websocket.send_bytes(data)
+            except Exception as e:
+                # The reader may be waiting for a slot this writer will never free
+                self.write_error = e
+                if not self._closing:
+                    reader.cancel()
+                return
+            self._slots.release()
+
+
+class StreamError(Exception):
+    """Error response to a streamed scoring request"""
+
+    def __init__(self, status, detail):
+        super().__init__(f"{status}: {detail}")
+        self.status = status
+        self.detail = detail
+
+
+class InProcessConnection:
+    """
+    WebSocket connection to an ASGI app in the same event loop (no network)
+
+    Exposes the send()/recv()/close() subset of a websockets client
+    connection that StreamClient uses.
+    """
+
+    def __init__(self, app, path="/ws/score"):
+        self.app = app
+        self.path = path
+        self._to_app = asyncio.Queue()
+        self._from_app = asyncio.Queue()
+        self._task = None
+
+    async def connect(self):
+        scope = {
+            "type": "websocket", "asgi": {"version": "3.0"}, "scheme": "ws", "path": self.path,
+            "raw_path": self.path.encode(), "query_string": b"", "root_path": "", "headers": [],
+            "client": ("127.0.0.1", 0), "server": ("testserver", 80), "subprotocols": [],
+        }
+        self._to_app.put_nowait({"type": "websocket.connect"})
+        self._task = asyncio.create_task(self.app(scope, self._to_app.get, self._from_app.put))
+        message = await self._from_app.get()
+        if message["type"] != "websocket.accept":
+            raise ConnectionError(f"WebSocket rejected: {message}")
+        return self
+
+    async def send(self, data):
+        if isinstance(data, str):
+            self._to_app.put_nowait({"type": "websocket.receive", "text": data})
+        else:
+            self._to_app.put_nowait({"type": "websocket.receive", "bytes": bytes(data)})
+
+    async def recv(self):
+        message = await self._from_app.get()
+        if message["type"] == "websocket.close":
+            raise ConnectionError(f"WebSocket closed by server (code {message.get('code')})")
+        return message["text"] if message.get("text") is not None else message["bytes"]
+
+    async def close(self):
+        self._to_app.put_nowait({"type": "websocket.disconnect", "code": 1000})
+        if self._task is not None:
+            await asyncio.gather(self._task, return_exceptions=True)
+
+
+class StreamClient:
+    """
+    Pipelining client for the scoring stream
+
+        async with StreamClient.in_process(app.app) as client:
+            result = await client.score([0.1, ...], certificate_id="abc")
+            results = await client.score_many(rows)
+
+    score() only sends the request; any number of calls can be awaited
+    concurrently and each resolves when its response arrives.
+    """
+
+    def __init__(self, connection, binary=False):
+        self.connection = connection
+        self.binary = binary
+        self._ids = itertools.count()
+        self._waiting = {}
+        self._reader = None
+
+    @classmethod
+    def in_process(cls, app, path="/ws/score", binary=False):
+        return cls(InProcessConnection(app, path), binary)
+
+    @classmethod
+    def connect(cls, url, binary=False):
+        """Client for a running server, e.g. ws://localhost:8000/ws/score"""
+        import websockets  # installed with uvicorn[standard]
+
+        class Connection:
+            async def connect(self):
+                self.socket = await websockets.connect(url, max_size=None)
+                return self
+
+            async def send(self, data):
+                await self.socket.send(data)
+
+            async def recv(self):
+                return await self.socket.recv()
+
+            async def close(self):
+                await self.socket.close()
+
+        return cls(Connection(), binary)
+
+    async def __aenter__(self):
+        await self.connection.connect()
+        self._reader = asyncio.create_task(self._read())
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def close(self):
+        if self._reader is not None:
+            self._reader.cancel()
+            await asyncio.gather(self._reader, return_exceptions=True)
+        await self.connection.close()
+
+    async def _read(self):
+        try:
+            while True:
+                data = await self.connection.recv()
+                response = decode_msgpack(data) if isinstance(data, bytes) else json.loads(data)
+                future = self._waiting.pop(response.get("id"), None)
+                if future is None or future.done():
+                    logger.warning(f"Unmatched stream response: {response}")
+                elif "error" in response:
+                    future.set_exception(StreamError(response.get("status"), response["error"]))
+                else:
+                    future.set_result(response["result"])
+        except Exception as e:
+            for future in self._waiting.values():
+                if not future.done():
+                    future.set_exception(e)
+            self._waiting.clear()
+
+    def _submit(self, requests):
+        futures = []
+        for request in requests:
+            request["id"] = next(self._ids)
+            future = asyncio.get_running_loop().create_future()
+            self._waiting[request["id"]] = future
+            futures.append(future)
+        return futures
+
+    async def score(self, features, model="fraud", **fields):
+        """Score one feature vector; raises StreamError on an error response"""
+        request = {"model": model, "features": list(map(float, features)), **fields}
+        future, = self._submit([request])
+        await self.connection.send(encode_message(request, self.binary))
+        return await future
+
+    async def score_many(self, rows, model="fraud", per_message=1, return_exceptions=False):
+        """
+        Pipeline one request per row and gather the results in row order
+
+        per_message > 1 packs that many requests into each WebSocket message.
+        """
+        requests = [{"model": model, "features": list(map(float, row))} for row in rows]
+        futures = self._submit(requests)
+        for start in range(0, len(requests), per_message):
+            chunk = requests[start:start + per_message]
+            await self.connection.send(encode_message(chunk if per_message > 1 else chunk[0], self.binary))
+        return await asyncio.gather(*futures, return_exceptions=return_exceptions)
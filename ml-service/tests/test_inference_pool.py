@@ -0,0 +1,89 @@
+"""
+Inference pool scheduling tests (inference_pool.py)
+
+Run from the ml-service directory:
+    python -m unittest discover tests
+"""
+
+import sys
+import time
+import asyncio
+import threading
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from inference_pool import DeadlineExceeded, InferencePool, PoolSaturated  # noqa: E402
+
+
+class InferencePoolTest(unittest.TestCase):
+
+    def run_blocked(self, pool, scenario):
+        """Run scenario(release) with the pool's only worker busy until release() is called"""
+        gate = threading.Event()
+
+        async def main():
+            blocker = asyncio.ensure_future(pool.run(gate.wait))
+            await asyncio.sleep(0.01)
+            try:
+                return await scenario(gate.set)
+            finally:
+                gate.set()
+                await blocker
+                pool.shutdown()
+
+        return asyncio.run(main())
+
+    def test_expired_calls_do_not_fill_the_queue(self):
+        pool = InferencePool(workers=1, max_queue=2)
+
+        async def scenario(release):
+            soon = time.monotonic() + 0.02
+            stale = [asyncio.ensure_future(pool.run(time.sleep, 0, deadline=soon)) for _ in range(2)]
+            await asyncio.sleep(0.05)
+            fresh = asyncio.ensure_future(pool.run(lambda: "ran"))
+            await asyncio.sleep(0)
+            release()
+            return await fresh, await asyncio.gather(*stale, return_exceptions=True)
+
+        result, stale = self.run_blocked(pool, scenario)
+        self.assertEqual(result, "ran")
+        self.assertTrue(all(isinstance(error, DeadlineExceeded) for error in stale))
+        self.assertEqual(pool.stats()["expired"], 2)
+        self.assertEqual(pool.stats()["rejected"], 0)
+
+    def test_expired_calls_do_not_shed_batch_work(self):
+        pool = InferencePool(workers=1, max_queue=4, low_priority_queue=1)
+
+        async def scenario(release):
+            stale = asyncio.ensure_future(pool.run(time.sleep, 0, deadline=time.monotonic() + 0.02))
+            await asyncio.sleep(0.05)
+            batch = asyncio.ensure_future(pool.run(lambda: "ran", priority="batch"))
+            await asyncio.sleep(0)
+            release()
+            return await batch, await asyncio.gather(stale, return_exceptions=True)
+
+        result, (stale,) = self.run_blocked(pool, scenario)
+        self.assertEqual(result, "ran")
+        self.assertIsInstance(stale, DeadlineExceeded)
+        self.assertEqual(pool.stats()["by_priority"]["batch"]["shed"], 0)
+
+    def test_full_queue_sheds_batch_before_interactive(self):
+        pool = InferencePool(workers=1, max_queue=1, low_priority_queue=1)
+
+        async def scenario(release):
+            batch = asyncio.ensure_future(pool.run(lambda: "batch", priority="batch"))
+            await asyncio.sleep(0)
+            interactive = asyncio.ensure_future(pool.run(lambda: "interactive"))
+            await asyncio.sleep(0)
+            release()
+            return await interactive, await asyncio.gather(batch, return_exceptions=True)
+
+        result, (batch,) = self.run_blocked(pool, scenario)
+        self.assertEqual(result, "interactive")
+        self.assertIsInstance(batch, PoolSaturated)
+
+
+if __name__ == "__main__":
+    unittest.main()
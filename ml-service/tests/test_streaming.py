@@ -0,0 +1,97 @@
+"""
+Scoring stream tests (streaming.py)
+
+Run from the ml-service directory:
+    python -m unittest discover tests
+"""
+
+import sys
+import asyncio
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from streaming import ScoringStream, StreamClient, encode_message  # noqa: E402
+
+
+async def echo(request):
+    return request.get("features")
+
+
+class BrokenSocket:
+    """Accepted WebSocket whose peer is gone: every send fails, receive keeps delivering queued messages"""
+
+    def __init__(self, messages):
+        self.messages = list(messages)
+
+    async def receive(self):
+        if self.messages:
+            return self.messages.pop(0)
+        await asyncio.Event().wait()  # a vanished peer never sends websocket.disconnect
+
+    async def send_text(self, data):
+        raise ConnectionResetError("peer went away")
+
+    async def send_bytes(self, data):
+        raise ConnectionResetError("peer went away")
+
+
+def broken_after_accept(app):
+    """ASGI wrapper: the connection is accepted, then every server send fails"""
+    async def wrapped(scope, receive, send):
+        async def failing_send(message):
+            if message["type"] == "websocket.accept":
+                return await send(message)
+            raise ConnectionResetError("peer went away")
+        await app(scope, receive, failing_send)
+    return wrapped
+
+
+def stream_app(max_in_flight):
+    """Minimal ASGI app serving ScoringStream on /ws/score"""
+    from starlette.applications import Starlette
+    from starlette.routing import WebSocketRoute
+
+    async def endpoint(websocket):
+        await websocket.accept()
+        await ScoringStream(websocket, echo, max_in_flight).run()
+
+    return Starlette(routes=[WebSocketRoute("/ws/score", endpoint)])
+
+
+class ScoringStreamTest(unittest.TestCase):
+
+    def test_round_trip(self):
+        async def scenario():
+            async with StreamClient.in_process(stream_app(max_in_flight=2)) as client:
+                return await asyncio.wait_for(asyncio.gather(*(client.score([i, i]) for i in range(10))), 5)
+
+        self.assertEqual(asyncio.run(scenario()), [[i, i] for i in range(10)])
+
+    def test_send_failure_ends_read_loop(self):
+        # More requests than slots: the reader blocks for a slot the failed writer never frees
+        requests = [{"id": i, "features": [i]} for i in range(5)]
+        stream = ScoringStream(BrokenSocket([{"type": "websocket.receive", "text": encode_message(requests, False)}]),
+                               echo, max_in_flight=2)
+
+        async def scenario():
+            await asyncio.wait_for(stream.run(), 5)
+
+        asyncio.run(scenario())
+        self.assertIsInstance(stream.write_error, ConnectionResetError)
+
+    def test_send_failure_in_process(self):
+        async def scenario():
+            client = StreamClient.in_process(broken_after_accept(stream_app(max_in_flight=2)))
+            async with client:
+                for i in range(5):
+                    asyncio.ensure_future(client.score([i]))
+                # The server side of the connection finishes on its own
+                await asyncio.wait_for(asyncio.shield(client.connection._task), 5)
+
+        asyncio.run(scenario())
+
+
+if __name__ == "__main__":
+    unittest.main()